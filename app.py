@@ -1,62 +1,497 @@
 """Running the Xetra ETL application"""
+import argparse
 import datetime
 import logging
 import logging.config
 
-import yaml
-from yaml.loader import SafeLoader
+from epl.common.constants import (ExecutorTypes, MetaProcessFormat,
+                                  MetricExporters, S3FileTypes)
+from epl.common.metrics import (JsonLogExporter, Metrics,
+                                PrometheusTextfileExporter)
 
-from epl.common.meta_process import MetaProcess
-from epl.common.s3 import S3BucketConnector
-from epl.transfomers.epl_transformer import ETLExecutor
+# the modules of the data libraries, boto3, pandas and pyarrow, are imported
+# inside the functions using them, a run with nothing to do only loads the
+# listing and its startup stays short when a scheduler polls it often
 
 
-def main():
+def _date(value: str):
+    """
+    argparse type of the date options, format: yyyy-mm-dd
+    """
+
+    try:
+        datetime.datetime.strptime(value, MetaProcessFormat.META_DATE_FORMAT.value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value} is not a yyyy-mm-dd date")
+    return value
+
+
+def parse_args(argv: list = None):
+    """
+    Parses the command line options
+
+    :param argv: list of arguments, None reads sys.argv
+
+    returns:
+      args: argparse Namespace
+    """
+
+    parser = argparse.ArgumentParser(description="Run the EPL ETL job")
+    parser.add_argument(
+        "--config", default="config/epl_config.yml", help="path of the YAML config"
+    )
+    parser.add_argument(
+        "--from",
+        dest="from_date",
+        type=_date,
+        help="first folder date to process, yyyy-mm-dd",
+    )
+    parser.add_argument(
+        "--to",
+        dest="to_date",
+        type=_date,
+        help="last folder date to process, yyyy-mm-dd, defaults to today",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="process the dates in the range again, even when already processed",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="print the dates that would run with their objects and bytes and exit",
+    )
+    # compaction and the sharded runs are separate jobs, one per run
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--compact",
+        action="store_true",
+        help="compact the small files of every folder in the range and exit",
+    )
+    mode.add_argument(
+        "--coordinate",
+        action="store_true",
+        help="publish the dates to process as shards for --worker runs and exit",
+    )
+    mode.add_argument(
+        "--worker",
+        action="store_true",
+        help="process the published shards under leases until all are done",
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        help="number of dates per shard, overrides sharding.shard_size",
+    )
+    parser.add_argument(
+        "--parallelism",
+        type=int,
+        help="number of dates processed at the same time, overrides the config",
+    )
+    args = parser.parse_args(argv)
+    if args.from_date and args.to_date and args.from_date > args.to_date:
+        parser.error("--from is after --to")
+    if args.worker and args.plan:
+        # a worker takes its dates from the shards, there is no range to plan
+        parser.error("--plan does not apply to --worker")
+    return args
+
+
+def print_plan(plan: list):
+    """
+    Prints the dates of a run with their number of objects and bytes
+
+    :param plan: list of dicts of the date, number of objects and bytes
+    """
+
+    print(f"{'date':<12}{'objects':>10}{'bytes':>16}")
+    for entry in plan:
+        print(f"{entry['date']:<12}{entry['objects']:>10}{entry['bytes']:>16}")
+    print(
+        f"{len(plan)} dates, {sum(entry['objects'] for entry in plan)} objects, "
+        f"{sum(entry['bytes'] for entry in plan)} bytes"
+    )
+
+
+def load_config(path: str):
+    """
+    Reads the YAML config
+
+    :param path: path of the config file
+
+    returns:
+      config: dict of the config sections
+    """
+
+    import yaml
+    from yaml.loader import SafeLoader
+
+    with open(path) as f:
+        return yaml.load(f, Loader=SafeLoader)
+
+
+def build_metrics(metrics_config: dict):
+    """
+    Builds the metrics of a run with the configured exporters
+
+    :param metrics_config: metrics section of the config
+
+    returns:
+      metrics: Metrics
+    """
+
+    exporters = []
+    for exporter in metrics_config.get("exporters", []):
+        if exporter == MetricExporters.JSON.value:
+            exporters.append(JsonLogExporter())
+        elif exporter == MetricExporters.PROMETHEUS.value:
+            exporters.append(PrometheusTextfileExporter(metrics_config["textfile"]))
+        else:
+            raise ValueError(f"Unsupported metrics exporter {exporter}")
+    return Metrics(exporters)
+
+
+def pending_dates(config: dict, args: argparse.Namespace, metrics: Metrics = None):
+    """
+    Lightweight check of what a run has to do, from the folder listing and
+    the meta data of the source bucket only, without the data libraries
+
+    :param config: dict of the config sections
+    :param args: parsed command line options
+    :param metrics: Metrics of the run
+
+    returns:
+      execution: MetaProcess over an S3Listing of the source bucket
+      execution_dates: list of the dates the run would process
+    """
+
+    from epl.common.listing import S3Listing
+    from epl.common.meta_process import MetaProcess
+
+    s3_config = config["s3"]
+    listing = S3Listing(
+        s3_config["access_key"],
+        s3_config["secret_key"],
+        s3_config["src_bucket"],
+        endpoint_url=s3_config.get("src_endpoint_url"),
+        max_pool_connections=s3_config.get("max_pool_connections", 10),
+        retry_mode=s3_config.get("retry_mode", "adaptive"),
+        max_attempts=s3_config.get("max_attempts", 5),
+        tcp_keepalive=s3_config.get("tcp_keepalive", True),
+        metrics=metrics,
+    )
+    execution = MetaProcess(listing)
+    execution_dates = execution.execution_list(
+        tgr_date=args.to_date,
+        from_date=args.from_date,
+        force=args.force or args.compact,
+    )
+    return execution, execution_dates
+
+
+def main(argv: list = None):
     """
     entry point to run the xetra ETL job
+
+    :param argv: list of command line arguments, None reads sys.argv
     """
+    args = parse_args(argv)
+
     # Open and parsing YAML file
-    with open("config/epl_config.yml") as f:
-        config = yaml.load(f, Loader=SafeLoader)
+    config = load_config(args.config)
 
     # configure logging
     log_config = config["logging"]
     logging.config.dictConfig(log_config)
+    logger = logging.getLogger(__name__)
+
+    # stage timings and counters of the run, exported once the job completes
+    metrics = build_metrics(config.get("metrics", {}))
+
+    if args.worker:
+        # the dates come from the shards published by the coordinator
+        return run(config, args, None, metrics)
+
+    # Obtain list of folders requiring processing based on current date processed data status
+    execution, execution_dates = pending_dates(config, args, metrics)
+    if args.plan:
+        # dry run, sized from the listing metadata without reading any object
+        print_plan(execution.plan(execution_dates))
+        return None
+    if not execution_dates:
+        logger.info("No folders require processing")
+        metrics.export()
+        return None
+    return run(config, args, execution_dates, metrics)
+
+
+def run(
+    config: dict, args: argparse.Namespace, execution_dates: list, metrics: Metrics
+):
+    """
+    Processes the dates of a run, or compacts them with --compact
+
+    :param config: dict of the config sections
+    :param args: parsed command line options
+    :param execution_dates: list of the dates to process, None for --worker
+    :param metrics: Metrics of the run
+    """
+
+    import asyncio
+
+    from epl.common.cache import ObjectCache
+    from epl.common.checkpoints import CheckpointStore
+    from epl.common.leases import LeaseStore
+    from epl.common.s3 import S3BucketConnector
+    from epl.transfomers.aggregates import TeamAggregates
+    from epl.transfomers.async_executor import run_async
+    from epl.transfomers.compaction import Compactor
+    from epl.transfomers.epl_transformer import ETLExecutor
+    from epl.transfomers.sharding import ShardPlan, ShardWorker
+    from epl.transfomers.validation import QualityGate, SchemaContract
+
     logger = logging.getLogger(__name__)
     # reading s3 configuration
     s3_config = config["s3"]
 
+    # optional on disk cache of parsed source objects
+    cache_config = config.get("cache", {})
+    cache = None
+    if cache_config.get("enabled"):
+        cache = ObjectCache(
+            cache_dir=cache_config["directory"],
+            max_bytes=cache_config.get("max_bytes", 1024**3),
+        )
+    # settings shared by the source and target connectors, connectors with
+    # the same settings share one pooled client
+    connector_options = {
+        "access_key": s3_config["access_key"],
+        "secret_key": s3_config["secret_key"],
+        "max_workers": s3_config.get("max_workers", 1),
+        "retries": s3_config.get("retries", 3),
+        "backoff": s3_config.get("backoff", 0.5),
+        "part_size": s3_config.get("part_size", 8388608),
+        "upload_workers": s3_config.get("upload_workers", 1),
+        "max_pool_connections": s3_config.get("max_pool_connections", 10),
+        "retry_mode": s3_config.get("retry_mode", "adaptive"),
+        "max_attempts": s3_config.get("max_attempts", 5),
+        "tcp_keepalive": s3_config.get("tcp_keepalive", True),
+        "metrics": metrics,
+    }
+
+    # reading execution configuration, defaults to one date at a time
+    exec_config = config.get("execution", {})
+    parallelism = args.parallelism or exec_config.get("parallelism", 1)
+    executor_type = exec_config.get("executor", "thread")
+    # the async executor reads and writes whole dates only, features it
+    # would skip are rejected instead of silently left out
+    if executor_type == ExecutorTypes.ASYNC.value and not (
+        args.compact or args.coordinate
+    ):
+        skipped = [
+            section
+            for section in ("validation", "checkpoints", "compaction")
+            if config.get(section, {}).get("enabled")
+        ]
+        if skipped:
+            raise ValueError(
+                f"{', '.join(skipped)} run with the thread or process executor, "
+                "disable them to use the async executor"
+            )
+
     # creating the S3BucketConnector class instances for source and target
 
     s3_bucket_src = S3BucketConnector(
-        access_key=s3_config["access_key"],
-        secret_key=s3_config["secret_key"],
         bucket=s3_config["src_bucket"],
+        endpoint_url=s3_config.get("src_endpoint_url"),
+        engine=config.get("input", {}).get("engine", "pandas-c"),
+        schema=config.get("schema"),
+        cache=cache,
+        parse_workers=exec_config.get("parse_workers", 0),
+        **connector_options,
     )
 
     s3_bucket_trg = S3BucketConnector(
-        access_key=s3_config["access_key"],
-        secret_key=s3_config["secret_key"],
         bucket=s3_config["trg_bucket"],
+        endpoint_url=s3_config.get("trg_endpoint_url"),
+        **connector_options,
     )
 
     logger.debug("S3 Bucket Connection establised")
 
-    # create execution list object
-    execution = MetaProcess(s3_bucket_src)
-    # Obtain list of folders requiring processing based on current date processed data status
-    execution_dates = execution.execution_list()
+    # optional per team season statistics kept in the target bucket
+    aggregates_config = config.get("aggregates", {})
+    aggregates = None
+    if aggregates_config.get("enabled"):
+        aggregates = TeamAggregates(
+            s3_bucket_trg,
+            prefix=aggregates_config.get("prefix", "aggregates"),
+            form_length=aggregates_config.get("form_length", 5),
+            season_start_month=aggregates_config.get("season_start_month", 7),
+        )
+
+    # optional per object checkpoints of the dates in progress, target bucket
+    checkpoints_config = config.get("checkpoints", {})
+    checkpoints = None
+    if checkpoints_config.get("enabled"):
+        checkpoints = CheckpointStore(
+            s3_bucket_trg, prefix=checkpoints_config.get("prefix", "checkpoints")
+        )
+
+    # optional schema contract checked on every source file before combining
+    validation_config = config.get("validation", {})
+    quality_gate = None
+    if validation_config.get("enabled"):
+        quality_gate = QualityGate(
+            s3_bucket_src,
+            s3_bucket_trg,
+            SchemaContract.from_config(validation_config, config.get("schema")),
+            quarantine_prefix=validation_config.get("quarantine_prefix", "quarantine"),
+            report_prefix=validation_config.get("report_prefix", "validation"),
+        )
+
+    # reading output configuration, defaults to csv files
+    output_config = config.get("output", {})
+    file_format = output_config.get("file_format", "csv")
+
+    # compaction of the small source files of a date into large parquet files
+    compaction_config = config.get("compaction", {})
+    compaction_options = {
+        "prefix": compaction_config.get("prefix", "compacted"),
+        "target_bytes": compaction_config.get("target_bytes", 134217728),
+        "min_files": compaction_config.get("min_files", 2),
+        "schema": config.get("schema"),
+    }
+    if args.compact:
+        # compaction job over every folder of the range, processed or not,
+        # source files failing validation are quarantined and not compacted
+        src_compactor = Compactor(
+            s3_bucket_src, quality_gate=quality_gate, **compaction_options
+        )
+        trg_compactor = Compactor(s3_bucket_trg, **compaction_options)
+        for day in execution_dates:
+            src_compactor.compact_source(day)
+            if file_format == S3FileTypes.PARQUET.value:
+                trg_compactor.compact_partition(f"data/date={day}")
+        s3_bucket_src.close()
+        metrics.export()
+        return None
+    compactor = None
+    if compaction_config.get("enabled"):
+        compactor = Compactor(s3_bucket_src, **compaction_options)
+
+    executor_options = {
+        "file_format": file_format,
+        "schema": config.get("schema"),
+        "parquet_options": output_config.get("parquet"),
+        "metrics": metrics,
+        "transforms": config.get("transforms"),
+        "aggregates": aggregates,
+    }
+    etl_executor = None
+    if executor_type != ExecutorTypes.ASYNC.value:
+        etl_executor = ETLExecutor(
+            s3_bucket_src,
+            s3_bucket_trg,
+            chunksize=exec_config.get("chunksize"),
+            checkpoints=checkpoints,
+            compactor=compactor,
+            quality_gate=quality_gate,
+            **executor_options,
+        )
+
+    # sharded runs, the coordinator publishes the execution list as shards in
+    # the source bucket and workers on any number of machines process them
+    sharding_config = config.get("sharding", {})
+    if args.coordinate or args.worker:
+        plan = ShardPlan(s3_bucket_src, prefix=sharding_config.get("prefix", "leases"))
+        if args.coordinate:
+            plan.publish(
+                execution_dates,
+                args.shard_size or sharding_config.get("shard_size", 7),
+            )
+        elif etl_executor is None:
+            raise ValueError("Sharded workers run the thread or process executor")
+        else:
+            leases = LeaseStore(
+                s3_bucket_src,
+                prefix=sharding_config.get("prefix", "leases"),
+                lease_seconds=sharding_config.get("lease_seconds", 300),
+            )
+            ShardWorker(
+                plan,
+                leases,
+                etl_executor,
+                aggregates=aggregates,
+                max_workers=parallelism,
+                executor_type=executor_type,
+                heartbeat_seconds=sharding_config.get("heartbeat_seconds"),
+                poll_seconds=sharding_config.get("poll_seconds", 10),
+            ).run()
+        s3_bucket_src.close()
+        metrics.export()
+        return None
 
     # apply transformer operation to source and target buckets for data
-    # before and including date
+    # before and including date, independent dates run on a worker pool
+    if executor_type == ExecutorTypes.ASYNC.value:
+        # one event loop overlaps the requests of parallelism dates, the
+        # cache, chunksize and parse_workers settings do not apply
+        async_options = {
+            key: value
+            for key, value in connector_options.items()
+            if key not in ("retries", "backoff")
+        }
+        results = asyncio.run(
+            run_async(
+                {
+                    **async_options,
+                    "bucket": s3_config["src_bucket"],
+                    "endpoint_url": s3_config.get("src_endpoint_url"),
+                    "engine": config.get("input", {}).get("engine", "pandas-c"),
+                    "schema": config.get("schema"),
+                },
+                {
+                    **async_options,
+                    "bucket": s3_config["trg_bucket"],
+                    "endpoint_url": s3_config.get("trg_endpoint_url"),
+                },
+                execution_dates,
+                max_dates=parallelism,
+                **executor_options,
+            )
+        )
+    else:
+        results = etl_executor.transform_dates(
+            execution_dates,
+            max_workers=parallelism,
+            executor_type=executor_type,
+        )
+
+    # only dates that finished are recorded in the meta file
     date_list = []
-    for date in execution_dates:
-        ETLExecutor(s3_bucket_src, s3_bucket_trg).transform(date)
-        logger.debug(f"{date} Processed")
-        date_list.append([date, datetime.datetime.now().strftime("%Y-%m-%d")])
+    for date, processed in results.items():
+        if processed:
+            logger.debug(f"{date} Processed")
+            date_list.append([date, datetime.datetime.now().strftime("%Y-%m-%d")])
+        else:
+            logger.error(f"{date} Failed and will be retried on the next run")
+    # merge the new dates into the season statistics, a failed merge does not
+    # stop the dates being recorded, their partials are kept and merged by
+    # the next merge of their season
+    if aggregates is not None:
+        try:
+            aggregates.merge([date for date, _ in date_list])
+        except Exception:
+            logger.exception("Team aggregates not merged, the next run merges them")
     # create meta file for stored data
     s3_bucket_src.update_meta_file_to_s3(date_list)
 
+    if cache is not None:
+        logger.info(f"Cache statistics {s3_bucket_src.cache_stats()}")
+    s3_bucket_src.close()
+    metrics.export()
     logger.info(f"Job Completed-{datetime.datetime.now().strftime('%Y-%m-%d-%h%m')}")
 
 
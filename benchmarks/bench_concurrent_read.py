@@ -0,0 +1,80 @@
+"""
+Benchmark sequential against concurrent reads in
+S3BucketConnector.read_csv_list_combine_convert_to_df
+
+moto answers in process without any network round trip, so a fixed delay
+is added to every GetObject call to stand in for S3 request latency.
+
+Command
+- python -m benchmarks.bench_concurrent_read --files 10 50 200 --latency 0.02
+"""
+import argparse
+import os
+import time
+
+import boto3
+from moto import mock_s3
+
+from epl.common.s3 import S3BucketConnector
+
+BUCKET = "bench-bucket"
+
+
+def add_latency(connector: S3BucketConnector, latency: float):
+    """
+    Sleeps before every GetObject call made by the connector client
+    """
+
+    def _sleep(**kwargs):
+        time.sleep(latency)
+
+    connector._client.meta.events.register("before-call.s3.GetObject", _sleep)
+
+
+def run(file_counts: list, latency: float, workers: int, rows: int):
+    """
+    Uploads the csv files and times both read paths for every file count
+    """
+
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "KEY1")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "KEY2")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+    body = "home,away,home_goals,away_goals\n" + "A,B,1,2\n" * rows
+
+    with mock_s3():
+        s3 = boto3.resource(service_name="s3")
+        bucket = s3.create_bucket(Bucket=BUCKET)
+        connector = S3BucketConnector(
+            "AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", BUCKET
+        )
+        add_latency(connector, latency)
+
+        print(f"{'files':>6} {'sequential s':>13} {'concurrent s':>13} {'speedup':>8}")
+        for count in file_counts:
+            keys = [f"football-2023-03-18/match-{i}.csv" for i in range(count)]
+            for key in keys:
+                bucket.put_object(Body=body, Key=key)
+
+            start = time.perf_counter()
+            connector.read_csv_list_combine_convert_to_df(keys, max_workers=1)
+            sequential = time.perf_counter() - start
+
+            start = time.perf_counter()
+            connector.read_csv_list_combine_convert_to_df(keys, max_workers=workers)
+            concurrent = time.perf_counter() - start
+
+            print(
+                f"{count:>6} {sequential:>13.3f} {concurrent:>13.3f}"
+                f" {sequential / concurrent:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--rows", type=int, default=40)
+    args = parser.parse_args()
+    run(args.files, args.latency, args.workers, args.rows)
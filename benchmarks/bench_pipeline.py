@@ -0,0 +1,251 @@
+"""
+Benchmark the stages of a full ETL run against a local S3 stand-in
+
+The source bucket is filled with N date folders of M csv files of R rows
+of synthetic match data, then every stage is timed on its own. Results
+are printed and saved as JSON so runs of different commits can be compared.
+Without --endpoint-url the buckets live in moto inside this process, with
+it any S3 compatible server can be used, e.g. `moto_server -p 5000`.
+
+Command
+- python -m benchmarks.bench_pipeline --dates 5 --files 20 --rows 2000 --output bench.json
+- python -m benchmarks.bench_pipeline --compare old.json new.json
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import boto3
+from moto import mock_s3
+
+from benchmarks.synthetic import load_schema, match_csv
+from epl.common.meta_process import MetaProcess
+from epl.common.s3 import S3BucketConnector
+from epl.transfomers.epl_transformer import ETLExecutor
+
+SRC_BUCKET = "bench-src"
+TRG_BUCKET = "bench-trg"
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of the process in MB
+    """
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on linux
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def git_commit():
+    """
+    Returns the commit the benchmark runs on
+    """
+
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class StageTimer:
+    """
+    Collects the duration, throughput and peak memory of each stage
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str, rows: int = 0, size: int = 0):
+        """
+        Times the block and adds it to the totals of the stage
+        """
+
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        totals = self.stages.setdefault(
+            name, {"seconds": 0.0, "calls": 0, "rows": 0, "bytes": 0}
+        )
+        totals["seconds"] += elapsed
+        totals["calls"] += 1
+        totals["rows"] += rows
+        totals["bytes"] += size
+        totals["peak_rss_mb"] = peak_rss_mb()
+
+    def report(self):
+        """
+        Returns the stages with rows/s and MB/s added
+        """
+
+        for totals in self.stages.values():
+            seconds = totals["seconds"] or float("nan")
+            totals["rows_per_s"] = totals["rows"] / seconds if totals["rows"] else None
+            totals["mb_per_s"] = (
+                totals["bytes"] / 1024**2 / seconds if totals["bytes"] else None
+            )
+        return self.stages
+
+
+def fill_source(s3, dates: int, files: int, rows: int):
+    """
+    Uploads the synthetic date folders
+
+    returns:
+      size: bytes uploaded
+    """
+
+    bucket = s3.Bucket(SRC_BUCKET)
+    start = datetime.date(2023, 3, 1)
+    size = 0
+    for day_offset in range(dates):
+        day = start + datetime.timedelta(days=day_offset)
+        prefix = f"football-{day.isoformat()}/"
+        bucket.put_object(Key=prefix)
+        for file_number in range(files):
+            body = match_csv(rows, day.strftime("%d/%m/%Y"), seed=file_number)
+            bucket.put_object(Body=body, Key=f"{prefix}match-{file_number}.csv")
+            size += len(body)
+    return size
+
+
+def run(args):
+    """
+    Fills the source bucket and times every stage
+
+    returns:
+      results: dict of parameters, environment and stage timings
+    """
+
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "KEY1")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "KEY2")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+    mock = contextlib.nullcontext() if args.endpoint_url else mock_s3()
+    timer = StageTimer()
+    with mock:
+        s3 = boto3.resource(service_name="s3", endpoint_url=args.endpoint_url)
+        for bucket in [SRC_BUCKET, TRG_BUCKET]:
+            s3.create_bucket(Bucket=bucket)
+        source_bytes = fill_source(s3, args.dates, args.files, args.rows)
+
+        options = {
+            "access_key": "AWS_ACCESS_KEY_ID",
+            "secret_key": "AWS_SECRET_ACCESS_KEY",
+            "endpoint_url": args.endpoint_url,
+            "max_workers": args.workers,
+            "upload_workers": args.workers,
+            "max_pool_connections": max(args.workers * 2, 10),
+        }
+        src = S3BucketConnector(
+            bucket=SRC_BUCKET,
+            engine=args.engine,
+            schema=load_schema() if args.schema else None,
+            **options,
+        )
+        trg = S3BucketConnector(bucket=TRG_BUCKET, **options)
+        executor = ETLExecutor(src, trg)
+
+        with timer.stage("execution_list"):
+            dates = MetaProcess(src).execution_list("2100-01-01")
+
+        for day in dates:
+            with timer.stage("list_files_in_prefix"):
+                keys = src.list_files_in_prefix(day)
+            day_bytes = sum(
+                obj["Size"]
+                for page in src._paginate(Prefix=f"football-{day}/")
+                for obj in page.get("Contents", [])
+            )
+            with timer.stage("read_csv_list_combine_convert_to_df", size=day_bytes):
+                df = src.read_csv_list_combine_convert_to_df(keys)
+            with timer.stage("transformer", rows=len(df)):
+                df = executor.transformer(df)
+            with timer.stage("write_df_to_s3", rows=len(df)):
+                trg.write_df_to_s3(df, f"data/processed-data-{day}", args.file_format)
+
+        with timer.stage("update_meta_file_to_s3", rows=len(dates)):
+            src.update_meta_file_to_s3([[day, day] for day in dates])
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "parameters": {**vars(args), "source_bytes": source_bytes},
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": timer.report(),
+    }
+
+
+def print_results(results: dict):
+    """
+    Prints the stage timings as a table
+    """
+
+    print(
+        f"commit {results['commit']}, "
+        f"{results['parameters']['source_bytes'] / 1024**2:.1f} MB source data"
+    )
+    print(f"{'stage':>36} {'seconds':>9} {'rows/s':>11} {'MB/s':>8} {'RSS MB':>8}")
+    for name, totals in results["stages"].items():
+        rows = f"{totals['rows_per_s']:.0f}" if totals["rows_per_s"] else "-"
+        mb = f"{totals['mb_per_s']:.1f}" if totals["mb_per_s"] else "-"
+        print(
+            f"{name:>36} {totals['seconds']:>9.3f} {rows:>11} {mb:>8}"
+            f" {totals['peak_rss_mb']:>8.0f}"
+        )
+
+
+def compare(old_path: str, new_path: str):
+    """
+    Prints the change of every stage duration between two result files
+    """
+
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{'stage':>36} {old['commit']:>9} {new['commit']:>9} {'change':>8}")
+    for name, totals in new["stages"].items():
+        if name not in old["stages"]:
+            continue
+        before = old["stages"][name]["seconds"]
+        after = totals["seconds"]
+        print(
+            f"{name:>36} {before:>9.3f} {after:>9.3f}"
+            f" {(after - before) / before * 100:>+7.1f}%"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dates", type=int, default=5)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--engine", default="pandas-c")
+    parser.add_argument("--schema", action="store_true", help="use declared schema")
+    parser.add_argument("--file-format", default="csv", choices=["csv", "parquet"])
+    parser.add_argument("--endpoint-url", default=None)
+    parser.add_argument("--output", default=None, help="JSON file for the results")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        results = run(args)
+        print_results(results)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
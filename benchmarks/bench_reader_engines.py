@@ -0,0 +1,54 @@
+"""
+Benchmark the csv reader engines on synthetic match data
+
+Every file is parsed from memory so only the parse and combine cost is
+measured, with and without the column schema declared in epl_config.yml.
+
+Command
+- python -m benchmarks.bench_reader_engines --files 50 --rows 20000
+"""
+import argparse
+import time
+
+from benchmarks.synthetic import load_schema, match_csv
+from epl.common.constants import ReaderEngines
+from epl.common.readers import combine, read_csv_bytes
+
+
+def run(files: int, rows: int, repeat: int):
+    """
+    Times parsing and combining the files with every engine
+    """
+
+    bodies = [match_csv(rows, seed=i).encode("utf-8") for i in range(files)]
+    size_mb = sum(len(body) for body in bodies) / 1024**2
+    schema = load_schema()
+
+    print(f"{files} files, {files * rows} rows, {size_mb:.1f} MB")
+    print(f"{'engine':>15} {'schema':>7} {'best s':>8} {'MB/s':>8}")
+    for engine in ReaderEngines:
+        for declared in [None, schema]:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                combine(
+                    [
+                        read_csv_bytes(body, engine.value, schema=declared)
+                        for body in bodies
+                    ]
+                )
+                timings.append(time.perf_counter() - start)
+            best = min(timings)
+            print(
+                f"{engine.value:>15} {'yes' if declared else 'no':>7}"
+                f" {best:>8.3f} {size_mb / best:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.files, args.rows, args.repeat)
@@ -0,0 +1,78 @@
+"""
+Benchmark the startup of the app entry point
+
+Every timing starts a fresh interpreter, so the import cost of the entry
+point is compared with importing the modules of a full run. A no-op run,
+with nothing to process, should only pay for the first row.
+
+Command
+- python -m benchmarks.bench_startup --repeat 5
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+# statements timed in a fresh interpreter, from the entry point alone to the
+# modules a run with work to do imports
+STATEMENTS = {
+    "import app": "import app",
+    "+ listing probe": "import app, epl.common.meta_process",
+    "+ full run": "import app, epl.transfomers.epl_transformer",
+}
+
+# modules a no-op run must not import
+HEAVY_MODULES = ("boto3", "pandas", "pyarrow")
+
+
+def time_statement(statement: str, repeat: int):
+    """
+    Returns the best wall time of running a statement in a fresh interpreter
+    """
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], check=True)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def loaded_heavy_modules(statement: str):
+    """
+    Returns the heavy modules loaded after running a statement
+    """
+
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"{statement}; import sys; "
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+    return output.split(",") if output else []
+
+
+def run(repeat: int):
+    """
+    Times every statement and lists the heavy modules it loads
+    """
+
+    baseline = time_statement("pass", repeat)
+    print(f"interpreter startup {baseline:.3f}s")
+    print(f"{'statement':>16} {'best s':>8} {'over startup s':>15}  heavy modules")
+    for name, statement in STATEMENTS.items():
+        best = time_statement(statement, repeat)
+        heavy = ", ".join(loaded_heavy_modules(statement)) or "-"
+        print(f"{name:>16} {best:>8.3f} {best - baseline:>15.3f}  {heavy}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.repeat)
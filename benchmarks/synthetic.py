@@ -0,0 +1,68 @@
+"""
+Synthetic match data shaped like the football-YYYY-MM-DD source files
+"""
+import random
+
+import yaml
+from yaml.loader import SafeLoader
+
+TEAMS = [
+    "Arsenal",
+    "Aston Villa",
+    "Bournemouth",
+    "Brentford",
+    "Brighton",
+    "Chelsea",
+    "Crystal Palace",
+    "Everton",
+    "Fulham",
+    "Leeds",
+    "Leicester",
+    "Liverpool",
+    "Man City",
+    "Man United",
+    "Newcastle",
+    "Nott'm Forest",
+    "Southampton",
+    "Tottenham",
+    "West Ham",
+    "Wolves",
+]
+
+REFEREES = ["M Dean", "M Oliver", "A Taylor", "P Tierney", "S Attwell", "C Kavanagh"]
+
+
+def load_schema(path: str = "config/epl_config.yml"):
+    """
+    Returns the declared column schema of the configuration
+    """
+
+    with open(path) as f:
+        return yaml.load(f, Loader=SafeLoader)["schema"]
+
+
+def match_csv(rows: int, day: str = "18/03/2023", seed: int = 0):
+    """
+    Returns csv text with rows random matches of the configured columns
+    :param rows: number of matches
+    :param day: value of the Date column
+    :param seed: random seed so runs are comparable
+    """
+
+    rng = random.Random(seed)
+    lines = [
+        "Div,Date,Time,HomeTeam,AwayTeam,FTHG,FTAG,FTR,HTHG,HTAG,HTR,Referee,"
+        "HS,AS,HST,AST,HF,AF,HC,AC,HY,AY,HR,AR"
+    ]
+    for _ in range(rows):
+        home, away = rng.sample(TEAMS, 2)
+        fthg, ftag = rng.randint(0, 5), rng.randint(0, 5)
+        hthg, htag = rng.randint(0, fthg), rng.randint(0, ftag)
+        ftr = "H" if fthg > ftag else "A" if ftag > fthg else "D"
+        htr = "H" if hthg > htag else "A" if htag > hthg else "D"
+        stats = ",".join(str(rng.randint(0, 25)) for _ in range(12))
+        lines.append(
+            f"E0,{day},15:00,{home},{away},{fthg},{ftag},{ftr},{hthg},{htag},{htr},"
+            f"{rng.choice(REFEREES)},{stats}"
+        )
+    return "\n".join(lines) + "\n"
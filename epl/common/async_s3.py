@@ -0,0 +1,762 @@
+""" Asyncio connector and methods to access S3 resource """
+
+
+import asyncio
+import json
+import logging
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from botocore.exceptions import ClientError
+
+from epl.common.constants import (ManifestFormat, MetaProcessFormat,
+                                  MetricCounters, MetricStages, ReaderEngines,
+                                  S3FileTypes)
+from epl.common.custom_exceptions import WrongFormatException
+from epl.common.listing import DATE_PATTERN, folder_date
+from epl.common.meta_store import MetaStore
+from epl.common.metrics import Metrics
+from epl.common.multipart import MIN_PART_SIZE
+from epl.common.readers import combine, read_csv_bytes
+from epl.common.s3 import S3BucketConnector
+from epl.common.schema import apply_schema
+
+try:
+    from aiobotocore.config import AioConfig
+    from aiobotocore.session import get_session
+except ImportError:  # optional dependency, pip install aiobotocore
+    AioConfig = None
+    get_session = None
+
+# rows serialized at a time by the streamed uploads
+CHUNK_ROWS = 100000
+
+
+class _ChunkSink:
+    """
+    Write only file handing out the bytes written since the last drain,
+    its position counts every byte so a parquet writer can place its footer
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+        self.closed = False
+
+    def write(self, data: bytes):
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        """
+        Returns the bytes written since the last drain
+        """
+
+        data, self._buffer = self._buffer, bytearray()
+        return data
+
+
+def csv_chunks(data_frame: pd.DataFrame):
+    """
+    Yields the csv of a DataFrame CHUNK_ROWS rows at a time, the header
+    with the first chunk
+
+    :data_frame: Pandas DataFrame that should be written
+    """
+
+    for offset in range(0, max(len(data_frame), 1), CHUNK_ROWS):
+        yield data_frame.iloc[offset : offset + CHUNK_ROWS].to_csv(
+            index=False, header=offset == 0
+        ).encode("utf-8")
+
+
+def parquet_chunks(table: pa.Table, row_group_size: int = None, **options):
+    """
+    Yields a parquet file of a table as its row groups are written,
+    CHUNK_ROWS rows at a time, the footer last
+
+    :table: arrow Table that should be written
+    :row_group_size: maximum number of rows per row group
+    :options: keyword arguments of pyarrow.parquet.ParquetWriter
+    """
+
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, table.schema, **options) as writer:
+        for offset in range(0, max(table.num_rows, 1), CHUNK_ROWS):
+            writer.write_table(
+                table.slice(offset, CHUNK_ROWS), row_group_size=row_group_size
+            )
+            yield sink.drain()
+    yield sink.drain()
+
+
+class AsyncS3BucketConnector:
+    """
+    Class for interacting with S3 Buckets on an asyncio event loop, with the
+    methods of S3BucketConnector as coroutines. Requests of every coroutine
+    share one connection pool, downloads and uploads are bounded by
+    max_workers and upload_workers across all the dates running at the
+    same time. Parsing and serializing run in worker threads so they do not
+    block the event loop. The client is opened with async with
+    """
+
+    def __init__(
+        self,
+        access_key: str,
+        secret_key: str,
+        bucket: str,
+        max_workers: int = 1,
+        part_size: int = MIN_PART_SIZE,
+        engine: str = ReaderEngines.PANDAS_C.value,
+        schema: dict = None,
+        upload_workers: int = 1,
+        endpoint_url: str = None,
+        max_pool_connections: int = 10,
+        retry_mode: str = "adaptive",
+        max_attempts: int = 5,
+        tcp_keepalive: bool = True,
+        metrics: Metrics = None,
+    ):
+        """
+        Constructor for AsyncS3BucketConnector
+
+        :param access_key: access key for accessing S3
+        :param secret_key: secret key for accessing S3
+        :param bucket: S3 bucket name
+        :param max_workers: number of objects downloaded at the same time
+        :param part_size: size in bytes of the parts of multipart uploads
+        :param engine: csv reader engine, pandas-c, pandas-pyarrow or pyarrow
+        :param schema: dict of column name to arrow type name of the csv files
+        :param upload_workers: number of parts uploaded at the same time
+        :param endpoint_url: endpoint url to S3, None uses the AWS endpoint
+        :param max_pool_connections: size of the connection pool
+        :param retry_mode: botocore retry mode, legacy, standard or adaptive
+        :param max_attempts: maximum attempts of a request including retries
+        :param tcp_keepalive: keep pooled connections alive
+        :param metrics: Metrics recording stage timings and counters
+        """
+
+        if get_session is None:
+            raise ImportError("AsyncS3BucketConnector requires aiobotocore")
+        self._logger = logging.getLogger(__name__)
+        self._access_key = access_key
+        self._secret_key = secret_key
+        self.bucket_name = bucket
+        self.max_workers = max_workers
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.engine = engine
+        self.schema = schema
+        self.upload_workers = upload_workers
+        self.endpoint_url = endpoint_url
+        self.metrics = metrics or Metrics()
+        self._config = AioConfig(
+            max_pool_connections=max_pool_connections,
+            retries={"mode": retry_mode, "max_attempts": max_attempts},
+            tcp_keepalive=tcp_keepalive,
+        )
+        self._client_context = None
+        self._client = None
+        self._download_slots = asyncio.Semaphore(max(max_workers, 1))
+        self._upload_slots = asyncio.Semaphore(max(upload_workers, 1))
+        # listing cache, reset whenever the connector changes a dated folder
+        self._index_lock = asyncio.Lock()
+        self._prefixes = None
+        self._date_index = {}
+
+    async def __aenter__(self):
+        self._client_context = get_session().create_client(
+            service_name="s3",
+            endpoint_url=self.endpoint_url,
+            aws_access_key_id=os.environ[self._access_key],
+            aws_secret_access_key=os.environ[self._secret_key],
+            config=self._config,
+        )
+        self._client = await self._client_context.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self._client_context.__aexit__(exc_type, exc_value, traceback)
+        self._client = None
+
+    async def list_files_in_prefix(self, tgr_date: str):
+        """
+        listing all files with a prefix on the S3 bucket with target date
+
+        :param tgr date: format: yyyy-mm-dd
+
+        returns:
+          key: list of all the file names of the folder of that date or None
+        """
+
+        files = await self._folder_files(tgr_date)
+        if files is None:
+            self._logger.info("List is empty")
+        return files
+
+    async def list_folders(self):
+        """
+        List the folders that require processing
+
+        returns:
+          files: list of the folder dates
+        """
+
+        state = await self.load_state()
+        return MetaStore.pending_from_state(
+            state, await self.list_all_folders(), await self.committed()
+        )
+
+    async def committed(self):
+        """
+        Returns the set of dates with a commit record
+        """
+
+        return MetaStore.dates_from_commit_keys(
+            await self._list_keys(MetaProcessFormat.META_COMMIT_PREFIX.value)
+        )
+
+    async def list_all_folders(self):
+        """
+        List the date of every dated folder in the bucket
+
+        returns:
+          files: list of all the folder dates, format: yyyy-mm-dd
+        """
+
+        with self.metrics.timer(MetricStages.LIST.value):
+            return list(await self._date_prefixes())
+
+    async def date_index(self, refresh: bool = False):
+        """
+        Index of every dated folder in the bucket and the files inside it,
+        the folders are listed at the same time. Folders are listed when
+        first asked for, see S3Listing.date_index
+
+        :param refresh: list the bucket again even when an index exists
+
+        returns:
+          index: dict of folder date, format: yyyy-mm-dd, to list of file keys
+        """
+
+        if refresh:
+            async with self._index_lock:
+                self._prefixes = None
+                self._date_index = {}
+        days = list(await self._date_prefixes())
+        listings = await asyncio.gather(*(self._folder_files(day) for day in days))
+        return dict(zip(days, listings))
+
+    async def _folder_files(self, day: str):
+        """
+        Helper function returning the files of a dated folder, listed with a
+        single prefix listing the first time the folder is asked for
+
+        returns:
+          keys: list of the file keys or None when there is no such folder
+        """
+
+        async with self._index_lock:
+            if day in self._date_index:
+                return self._date_index[day]
+        prefix = (await self._date_prefixes()).get(day)
+        if prefix is None:
+            return None
+        with self.metrics.timer(MetricStages.LIST.value):
+            files = await self._list_keys(prefix)
+        async with self._index_lock:
+            self._date_index[day] = files
+        return files
+
+    async def _date_prefixes(self, refresh: bool = False):
+        """
+        Helper function listing the top level folders of the bucket
+
+        returns:
+          prefixes: dict of folder date to folder prefix in key order
+        """
+
+        if self._prefixes is None or refresh:
+            prefixes = {}
+            async for page in self._paginate(Prefix="", Delimiter="/"):
+                for common_prefix in page.get("CommonPrefixes", []):
+                    prefix = common_prefix["Prefix"]
+                    match = DATE_PATTERN.search(prefix)
+                    if match and match.group() not in prefixes:
+                        prefixes[match.group()] = prefix
+            self._prefixes = prefixes
+        return self._prefixes
+
+    async def _invalidate(self, key: str):
+        """
+        Helper function resetting the listing of the folder of an object
+        after it was written, only keys of dated folders change the listing,
+        see S3Listing._invalidate
+        """
+
+        day = folder_date(key)
+        if day is not None:
+            async with self._index_lock:
+                if self._prefixes is not None and day not in self._prefixes:
+                    self._prefixes = None
+                self._date_index.pop(day, None)
+
+    async def _list_keys(self, prefix: str):
+        """
+        Helper function listing the file keys below a prefix
+        """
+
+        return [
+            obj["Key"]
+            async for page in self._paginate(Prefix=prefix)
+            for obj in page.get("Contents", [])
+            if obj["Key"] != prefix
+        ]
+
+    def _paginate(self, **kwargs):
+        """
+        Helper function returning the async pages of a list_objects_v2 call
+        """
+
+        paginator = self._client.get_paginator("list_objects_v2")
+        return paginator.paginate(Bucket=self.bucket_name, **kwargs)
+
+    async def read_csv_list_combine_convert_to_df(
+        self,
+        key_list: list,
+        encoding: str = "utf-8",
+        sep: str = ",",
+        engine: str = None,
+    ):
+        """
+        Downloads and parses a list of csv files at the same time and returns
+        them combined in key order
+
+        :key_list: list of keys to combine
+        :encoding: encoding of the data inside the csv file
+        :sep: seperator of the csv file
+        :engine: pandas-c, pandas-pyarrow or pyarrow, defaults to the connector setting
+
+        returns:
+          data_frame: Pandas DataFrame containing the data of the csv files combined
+        """
+
+        engine = engine or self.engine
+
+        async def _read(key):
+            body = await self._download_object(key)
+            return await asyncio.to_thread(self._parse, body, engine, encoding, sep)
+
+        # gather keeps the results in the order of key_list
+        df_list = await asyncio.gather(*(_read(key) for key in key_list or []))
+        if len(df_list) == 0:
+            self._logger.info("Empty Folder")
+        with self.metrics.timer(MetricStages.COMBINE.value):
+            df = await asyncio.to_thread(combine, df_list)
+        self.metrics.incr(MetricCounters.ROWS_READ.value, len(df))
+        return df
+
+    def _parse(self, body: bytes, engine: str, encoding: str, sep: str):
+        """
+        Helper function parsing a downloaded csv file in a worker thread
+        """
+
+        with self.metrics.timer(MetricStages.PARSE.value):
+            return read_csv_bytes(body, engine, encoding, sep, self.schema)
+
+    async def _download_object(self, key: str):
+        """
+        Helper function downloading a single object once a download slot is free
+
+        returns:
+          body: bytes of the object
+        """
+
+        return (await self._get_object(key))[0]
+
+    async def _get_object(self, key: str):
+        """
+        Helper function downloading a single object and its ETag
+
+        returns:
+          body: bytes of the object
+          etag: ETag of the object
+        """
+
+        async with self._download_slots:
+            with self.metrics.timer(MetricStages.DOWNLOAD.value):
+                response = await self._client.get_object(
+                    Bucket=self.bucket_name, Key=key
+                )
+                async with response["Body"] as stream:
+                    body = await stream.read()
+        self.metrics.incr(MetricCounters.OBJECTS_DOWNLOADED.value)
+        self.metrics.incr(MetricCounters.BYTES_DOWNLOADED.value, len(body))
+        return body, response["ETag"]
+
+    async def write_df_to_s3(
+        self, data_frame: pd.DataFrame, key: str, file_format: str
+    ):
+        """
+        writing a Pandas DataFrame to S3
+        supported formats: .csv, .parquet
+
+        :data_frame: Pandas DataFrame that should be written
+        :key: target key of the saved file
+        :file_format: format of the saved file
+        """
+
+        if file_format == S3FileTypes.CSV.value:
+            chunks = csv_chunks(data_frame)
+        elif file_format == S3FileTypes.PARQUET.value:
+            chunks = parquet_chunks(
+                pa.Table.from_pandas(data_frame, preserve_index=False)
+            )
+        else:
+            raise WrongFormatException(f"Unsupported file format {file_format}")
+        await self._upload(chunks, f"{key}.{file_format}")
+        self.metrics.incr(MetricCounters.ROWS_WRITTEN.value, len(data_frame))
+        return True
+
+    async def write_parquet_dataset(
+        self,
+        data_frame: pd.DataFrame,
+        key_prefix: str,
+        schema: dict = None,
+        compression: str = "snappy",
+        row_group_size: int = None,
+        use_dictionary: bool = True,
+        rows_per_file: int = None,
+    ):
+        """
+        writing a Pandas DataFrame to S3 as a partition of a parquet dataset,
+        files are written as key_prefix/part-N.parquet at the same time and
+        part files left over from an earlier write of the partition are removed
+
+        :data_frame: Pandas DataFrame that should be written
+        :key_prefix: partition prefix, e.g. data/date=2023-03-18
+        :schema: dict of column name to arrow type name
+        :compression: parquet compression codec
+        :row_group_size: maximum number of rows per row group
+        :use_dictionary: dictionary encode the columns
+        :rows_per_file: maximum number of rows per part file
+
+        returns:
+          keys: list of the written keys
+        """
+
+        table = apply_schema(
+            pa.Table.from_pandas(data_frame, preserve_index=False), schema
+        )
+        rows_per_file = rows_per_file or max(table.num_rows, 1)
+
+        async def _write(part, offset):
+            key = f"{key_prefix}/part-{part}.{S3FileTypes.PARQUET.value}"
+            await self._upload(
+                parquet_chunks(
+                    table.slice(offset, rows_per_file),
+                    compression=compression,
+                    row_group_size=row_group_size,
+                    use_dictionary=use_dictionary,
+                ),
+                key,
+            )
+            return key
+
+        keys = await asyncio.gather(
+            *(
+                _write(part, offset)
+                for part, offset in enumerate(
+                    range(0, max(table.num_rows, 1), rows_per_file)
+                )
+            )
+        )
+        self.metrics.incr(MetricCounters.ROWS_WRITTEN.value, table.num_rows)
+        await self.commit_parts(key_prefix, keys)
+        return keys
+
+    async def commit_parts(self, key_prefix: str, keys: list):
+        """
+        Writes the manifest of a partition once its parts exist, then removes
+        the parts of an earlier write, see S3BucketConnector.commit_parts
+
+        :key_prefix: partition prefix, e.g. data/date=2023-03-18
+        :keys: list of the part keys of the partition
+        """
+
+        await self.write_object(
+            json.dumps({ManifestFormat.MANIFEST_FILES.value: list(keys)}),
+            f"{key_prefix}/{ManifestFormat.MANIFEST_FILE.value}",
+        )
+        await self.delete_stale_parts(key_prefix, keys)
+
+    async def delete_stale_parts(self, key_prefix: str, keys: list):
+        """
+        Removes part files of a partition that are not in the given keys
+
+        :key_prefix: partition prefix, e.g. data/date=2023-03-18
+        :keys: list of the part keys to keep
+        """
+
+        stale = [
+            {"Key": key}
+            for key in await self._list_keys(f"{key_prefix}/part-")
+            if key not in keys
+        ]
+        if stale:
+            self._logger.info(f"Removing {len(stale)} stale parts of {key_prefix}")
+            await self._client.delete_objects(
+                Bucket=self.bucket_name, Delete={"Objects": stale}
+            )
+
+    async def delete_keys(self, keys):
+        """
+        Removes objects with batched requests of up to 1000 keys, missing keys
+        are not an error
+
+        :keys: iterable of the keys to remove
+        """
+
+        keys = list(keys)
+        for offset in range(0, len(keys), 1000):
+            await self._client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={
+                    "Objects": [{"Key": key} for key in keys[offset : offset + 1000]],
+                    "Quiet": True,
+                },
+            )
+        for key in keys:
+            await self._invalidate(key)
+
+    async def _upload(self, chunks, key: str):
+        """
+        Helper function uploading serialized chunks as they are produced.
+        Chunks are serialized in a worker thread and collected until they
+        fill a part, which is uploaded while the next chunks are serialized.
+        Serializing waits for a free upload slot, so memory is bounded by
+        (upload_workers + 1) parts instead of the whole body. Outputs smaller
+        than one part are written with a single put_object. A failed part
+        aborts the upload
+
+        :chunks: iterator of bytes, e.g. from csv_chunks or parquet_chunks
+        :key: target key of the saved file
+        """
+
+        buffer = bytearray()
+        upload_id = None
+        uploads = []
+        size = 0
+
+        async def _upload_part(part_number, body):
+            try:
+                with self.metrics.timer(MetricStages.UPLOAD.value):
+                    response = await self._client.upload_part(
+                        Body=body,
+                        Bucket=self.bucket_name,
+                        Key=key,
+                        PartNumber=part_number,
+                        UploadId=upload_id,
+                    )
+            finally:
+                self._upload_slots.release()
+            return {"ETag": response["ETag"], "PartNumber": part_number}
+
+        try:
+            while True:
+                with self.metrics.timer(MetricStages.SERIALIZE.value):
+                    chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
+                buffer += chunk
+                size += len(chunk)
+                if len(buffer) < self.part_size:
+                    continue
+                if upload_id is None:
+                    self._logger.info(
+                        f"Writing multipart file to {self.bucket_name}/{key}"
+                    )
+                    upload_id = (
+                        await self._client.create_multipart_upload(
+                            Bucket=self.bucket_name, Key=key
+                        )
+                    )["UploadId"]
+                # the full buffer is uploaded as is and a new one is started
+                await self._upload_slots.acquire()
+                uploads.append(
+                    asyncio.ensure_future(_upload_part(len(uploads) + 1, buffer))
+                )
+                buffer = bytearray()
+
+            if upload_id is None:
+                await self.write_object(bytes(buffer), key)
+                return
+            if buffer:
+                await self._upload_slots.acquire()
+                uploads.append(
+                    asyncio.ensure_future(_upload_part(len(uploads) + 1, buffer))
+                )
+            parts = await asyncio.gather(*uploads)
+            with self.metrics.timer(MetricStages.UPLOAD.value):
+                await self._client.complete_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=key,
+                    UploadId=upload_id,
+                    MultipartUpload={"Parts": parts},
+                )
+        except Exception:
+            for upload in uploads:
+                upload.cancel()
+            await asyncio.gather(*uploads, return_exceptions=True)
+            if upload_id is not None:
+                self._logger.warning(f"Aborting upload of {self.bucket_name}/{key}")
+                await self._client.abort_multipart_upload(
+                    Bucket=self.bucket_name, Key=key, UploadId=upload_id
+                )
+            raise
+        self.metrics.incr(MetricCounters.BYTES_UPLOADED.value, size)
+        self.metrics.incr(MetricCounters.OBJECTS_UPLOADED.value)
+        await self._invalidate(key)
+
+    async def write_object(
+        self,
+        body: str or bytes,
+        key: str,
+        if_match: str = None,
+        if_none_match: bool = False,
+    ):
+        """
+        Writes a body to the bucket as a single object
+
+        :body: content of the object
+        :key: target key of the saved file
+        :if_match: ETag the object must still have, the write fails with
+        PreconditionFailed otherwise
+        :if_none_match: True fails the write when the object already exists
+        """
+
+        self._logger.info(f"Writing file to {self.bucket_name}/{key}")
+        async with self._upload_slots:
+            with self.metrics.timer(MetricStages.UPLOAD.value):
+                await self._client.put_object(
+                    Body=body,
+                    Bucket=self.bucket_name,
+                    Key=key,
+                    **S3BucketConnector.write_conditions(if_match, if_none_match),
+                )
+        self.metrics.incr(MetricCounters.BYTES_UPLOADED.value, len(body))
+        self.metrics.incr(MetricCounters.OBJECTS_UPLOADED.value)
+        await self._invalidate(key)
+        return True
+
+    async def read_object(self, key: str):
+        """
+        Reads a whole object from the bucket
+
+        :key: key of the object
+
+        returns:
+          body: bytes of the object or None when the key does not exist
+        """
+
+        return (await self.read_object_with_etag(key))[0]
+
+    async def read_object_with_etag(self, key: str):
+        """
+        Reads a whole object from the bucket with its ETag
+
+        :key: key of the object
+
+        returns:
+          body: bytes of the object or None when the key does not exist
+          etag: ETag of the object or None when the key does not exist
+        """
+
+        try:
+            return await self._get_object(key)
+        except ClientError as error:
+            if error.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None, None
+            raise
+
+    async def load_state(self):
+        """
+        Reads the meta state, bootstrapped from processed_data.csv when missing
+
+        returns:
+          state: dict with the watermark date or None and the list of gap dates
+        """
+
+        return (await self._load_state_with_etag())[0]
+
+    async def _load_state_with_etag(self):
+        """
+        Helper function reading the state and the ETag of the state object,
+        None when the state has not been written yet
+        """
+
+        body, etag = await self.read_object_with_etag(
+            MetaProcessFormat.META_STATE_KEY.value
+        )
+        if body is not None:
+            return json.loads(body), etag
+        body = await self.read_object(MetaProcessFormat.META_LEGACY_KEY.value)
+        if body is None:
+            return {"watermark": None, "gaps": []}, None
+        return MetaStore.state_from_legacy(body, await self.list_all_folders()), None
+
+    async def update_meta_file_to_s3(self, date_list: list, max_attempts: int = 5):
+        """
+        Record processed folders in the meta store, the commit records and
+        the log of the run are written before the state, which is merged
+        with MetaStore.merge_state, written conditioned on its ETag and
+        retried on a conflict, see MetaStore.commit
+        :param: list of lists of processed dates
+        :param max_attempts: number of tries of a conflicting state write
+        """
+
+        with self.metrics.timer(MetricStages.META_UPDATE.value):
+            if not date_list:
+                self._logger.info("No processed folders to record")
+                return True
+            await asyncio.gather(
+                *(
+                    self.write_object(*MetaStore.commit_record(day, processed_at))
+                    for day, processed_at in date_list
+                )
+            )
+            await self.write_object(*MetaStore.run_log(date_list))
+
+            folders = await self.list_all_folders()
+            for attempt in range(1, max_attempts + 1):
+                state, etag = await self._load_state_with_etag()
+                body, folded = MetaStore.merge_state(
+                    state, await self.committed(), date_list, folders
+                )
+                try:
+                    await self.write_object(
+                        body,
+                        MetaProcessFormat.META_STATE_KEY.value,
+                        if_match=etag,
+                        if_none_match=etag is None,
+                    )
+                except ClientError as error:
+                    await asyncio.sleep(MetaStore.retry_delay(error, attempt))
+                    continue
+                await self.delete_keys(
+                    MetaStore.commit_key(day) for day in sorted(folded)
+                )
+                return True
+            self._logger.warning("Meta state not updated, commit records were written")
+            return False
@@ -0,0 +1,124 @@
+"""
+On disk cache of parsed source objects
+"""
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+class ObjectCache:
+    """
+    Keeps parsed source objects as parquet files keyed by S3 key and ETag,
+    so an unchanged object is neither downloaded nor parsed again. The least
+    recently used entries are evicted once the cache grows past max_bytes
+    :param cache_dir: directory holding the cached files
+    :param max_bytes: maximum size of the cache on disk
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 1024**3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        # entries from earlier runs, least recently used first
+        entries = [
+            entry
+            for entry in os.scandir(cache_dir)
+            if entry.is_file() and entry.name.endswith(".parquet")
+        ]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        self._entries = OrderedDict(
+            (entry.path, entry.stat().st_size) for entry in entries
+        )
+        self._size = sum(self._entries.values())
+
+    def __getstate__(self):
+        """
+        Only the settings are pickled, the entries are read again from disk
+        """
+
+        return {"cache_dir": self.cache_dir, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state: dict):
+        self.__init__(**state)
+
+    def path(self, key: str, etag: str, signature: str = ""):
+        """
+        Returns the file of a cache entry
+        :param key: S3 key of the source object
+        :param etag: ETag of the source object
+        :param signature: parse settings the entry depends on
+        """
+
+        digest = hashlib.sha256(f"{key}\0{etag}\0{signature}".encode("utf-8"))
+        return os.path.join(self.cache_dir, f"{digest.hexdigest()}.parquet")
+
+    def get(self, key: str, etag: str, signature: str = ""):
+        """
+        Returns the cached object or None when it is not cached
+        :param key: S3 key of the source object
+        :param etag: ETag of the source object
+        :param signature: parse settings the entry depends on
+
+        returns:
+          table: pyarrow Table or None
+        """
+
+        path = self.path(key, etag, signature)
+        with self._lock:
+            if path not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(path)
+        os.utime(path)
+        return pq.read_table(path)
+
+    def put(self, key: str, etag: str, table: pa.Table, signature: str = ""):
+        """
+        Stores a parsed object and evicts the least recently used entries
+        :param key: S3 key of the source object
+        :param etag: ETag of the source object
+        :param table: parsed object as a pyarrow Table
+        :param signature: parse settings the entry depends on
+        """
+
+        path = self.path(key, etag, signature)
+        # write to a temporary file first so readers never see a partial entry
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            self._size += size - self._entries.pop(path, 0)
+            self._entries[path] = size
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                evicted, evicted_size = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                try:
+                    os.remove(evicted)
+                except FileNotFoundError:
+                    pass
+                self._logger.debug(f"Evicted {evicted} from cache")
+
+    def stats(self):
+        """
+        Returns the hit and miss counts and the size of the cache
+        """
+
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
@@ -0,0 +1,101 @@
+"""
+Per object checkpoints of the dates being processed
+"""
+import hashlib
+import json
+import logging
+
+from epl.common.constants import CheckpointFormat, S3FileTypes
+
+
+class CheckpointStore:
+    """
+    Records which source objects of a date have been transformed and written,
+    so a restarted run only redoes the unfinished objects. Every source
+    object is written to its own part, the manifest of a date maps the
+    source keys to their part, row count and the ETag of the object when it
+    was read, so a replaced object is not taken as done. The manifest and staged parts
+    only exist while a date is in progress and are removed once its output
+    is complete, so a date processed again later starts from scratch
+    :param s3_bucket: S3BucketConnector of the bucket holding the checkpoints
+    :param prefix: prefix of the checkpoint keys
+    """
+
+    def __init__(self, s3_bucket, prefix: str = "checkpoints"):
+        self.s3_bucket = s3_bucket
+        self.prefix = prefix
+        self._logger = logging.getLogger(__name__)
+
+    def date_prefix(self, day: str):
+        """
+        Prefix of the checkpoints of a date
+        """
+
+        return f"{self.prefix}/date={day}"
+
+    def manifest_key(self, day: str):
+        """
+        Key of the manifest of a date
+        """
+
+        return f"{self.date_prefix(day)}/{CheckpointFormat.CHECKPOINT_MANIFEST.value}"
+
+    @staticmethod
+    def part_name(source_key: str):
+        """
+        Returns the part file name of a source object, stable across runs so a
+        rewritten part replaces the earlier one
+        :param source_key: key of the source object
+        """
+
+        digest = hashlib.sha1(source_key.encode("utf-8")).hexdigest()[:16]
+        return f"part-{digest}.{S3FileTypes.PARQUET.value}"
+
+    def staged_part_key(self, day: str, source_key: str):
+        """
+        Key a transformed source object is staged under until the output of
+        the date is assembled
+        """
+
+        return f"{self.date_prefix(day)}/{self.part_name(source_key)}"
+
+    def load(self, day: str):
+        """
+        Reads the manifest of a date
+
+        :param day: date, format: yyyy-mm-dd
+
+        returns:
+          manifest: dict of source key to dict of the part key, row count and
+          ETag, empty when the date has no checkpoints
+        """
+
+        body = self.s3_bucket.read_object(self.manifest_key(day))
+        if body is None:
+            return {}
+        manifest = json.loads(body)[CheckpointFormat.CHECKPOINT_SOURCES.value]
+        self._logger.info(f"Resuming {day}, {len(manifest)} objects already done")
+        return manifest
+
+    def save(self, day: str, manifest: dict):
+        """
+        Writes the manifest of a date, after each finished source object
+
+        :param day: date, format: yyyy-mm-dd
+        :param manifest: dict of source key to dict of the part key, row count and ETag
+        """
+
+        return self.s3_bucket.write_object(
+            json.dumps({CheckpointFormat.CHECKPOINT_SOURCES.value: manifest}),
+            self.manifest_key(day),
+        )
+
+    def clear(self, day: str):
+        """
+        Removes the staged parts and the manifest of a completed date
+
+        :param day: date, format: yyyy-mm-dd
+        """
+
+        self.s3_bucket.delete_stale_parts(self.date_prefix(day), [])
+        self.s3_bucket.delete_object(self.manifest_key(day))
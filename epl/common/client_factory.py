@@ -0,0 +1,75 @@
+"""
+Shared S3 clients with pooled connections
+"""
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+_lock = threading.Lock()
+_clients = {}
+
+
+def get_s3_client(
+    access_key: str,
+    secret_key: str,
+    endpoint_url: str = None,
+    max_pool_connections: int = 10,
+    retry_mode: str = "adaptive",
+    max_attempts: int = 5,
+    tcp_keepalive: bool = True,
+):
+    """
+    Returns the S3 client for the credentials and settings, built once per
+    process, forked children included, and shared by every S3BucketConnector
+    asking for the same settings. Low level clients are thread safe, so one connection pool
+    serves the source and target buckets and all worker threads
+    :param access_key: environment variable holding the access key
+    :param secret_key: environment variable holding the secret key
+    :param endpoint_url: custom endpoint url to S3, None uses the AWS endpoint
+    :param max_pool_connections: maximum number of pooled connections
+    :param retry_mode: botocore retry mode, legacy, standard or adaptive
+    :param max_attempts: maximum attempts of a request including retries
+    :param tcp_keepalive: keep pooled connections alive
+
+    returns:
+      client: boto3 S3 client
+    """
+
+    # a forked child must not reuse the sockets of its parent
+    key = (
+        os.getpid(),
+        os.environ[access_key],
+        os.environ[secret_key],
+        endpoint_url,
+        max_pool_connections,
+        retry_mode,
+        max_attempts,
+        tcp_keepalive,
+    )
+    with _lock:
+        if key not in _clients:
+            session = boto3.Session(
+                aws_access_key_id=os.environ[access_key],
+                aws_secret_access_key=os.environ[secret_key],
+            )
+            _clients[key] = session.client(
+                service_name="s3",
+                endpoint_url=endpoint_url,
+                config=Config(
+                    max_pool_connections=max_pool_connections,
+                    retries={"mode": retry_mode, "max_attempts": max_attempts},
+                    tcp_keepalive=tcp_keepalive,
+                ),
+            )
+        return _clients[key]
+
+
+def clear_clients():
+    """
+    Drops the shared clients, the next connector builds new ones
+    """
+
+    with _lock:
+        _clients.clear()
@@ -23,3 +23,178 @@ class MetaProcessFormat(Enum):
     META_SOURCE_DATE_COL = "source_date"
     META_PROCESS_COL = "datetime_of_processing"
     META_FILE_FORMAT = "csv"
+    META_FOLDER_COL = "folder"
+    META_STATE_KEY = "meta/state.json"
+    META_LOG_PREFIX = "meta/processed/"
+    META_COMMIT_PREFIX = "meta/commits/"
+    META_LEGACY_KEY = "processed_data.csv"
+
+
+class ExecutorTypes(Enum):
+    """
+    supported worker pool types for running dates in parallel
+    """
+
+    THREAD = "thread"
+    PROCESS = "process"
+    ASYNC = "async"
+
+
+class ReaderEngines(Enum):
+    """
+    supported csv reader engines for S3BucketConnector
+    """
+
+    PANDAS_C = "pandas-c"
+    PANDAS_PYARROW = "pandas-pyarrow"
+    PYARROW = "pyarrow"
+
+
+class MetricStages(Enum):
+    """
+    timed stages of a run recorded by Metrics
+    """
+
+    LIST = "list"
+    DOWNLOAD = "download"
+    PARSE = "parse"
+    COMBINE = "combine"
+    TRANSFORM = "transform"
+    SERIALIZE = "serialize"
+    UPLOAD = "upload"
+    META_UPDATE = "meta_update"
+    AGGREGATE = "aggregate"
+    COMPACT = "compact"
+
+
+class MetricCounters(Enum):
+    """
+    counters of a run recorded by Metrics
+    """
+
+    BYTES_DOWNLOADED = "bytes_downloaded"
+    BYTES_UPLOADED = "bytes_uploaded"
+    ROWS_READ = "rows_read"
+    ROWS_WRITTEN = "rows_written"
+    OBJECTS_DOWNLOADED = "objects_downloaded"
+    OBJECTS_UPLOADED = "objects_uploaded"
+    RETRIES = "retries"
+    MEMORY_SAVED = "memory_saved_bytes"
+
+
+class MetricExporters(Enum):
+    """
+    supported exporters of the run metrics
+    """
+
+    JSON = "json"
+    PROMETHEUS = "prometheus"
+
+
+class TransformStageTypes(Enum):
+    """
+    supported stage types of the transform pipeline
+    """
+
+    CAST = "cast"
+    DERIVE = "derive"
+    FILTER = "filter"
+    DEDUP = "dedup"
+    RENAME = "rename"
+    COMPACT = "compact"
+
+
+class AggregateFormat(Enum):
+    """
+    formation of the team aggregates in the target bucket
+    """
+
+    AGG_PARTIALS_DIR = "partials"
+    AGG_SEASON_DIR = "season"
+    AGG_TOTALS_FILE = "team_stats.parquet"
+    AGG_METADATA_KEY = "epl_aggregates"
+    AGG_HOME_TEAM_COL = "HomeTeam"
+    AGG_AWAY_TEAM_COL = "AwayTeam"
+    AGG_HOME_GOALS_COL = "FTHG"
+    AGG_AWAY_GOALS_COL = "FTAG"
+    AGG_RESULT_COL = "FTR"
+
+
+class CheckpointFormat(Enum):
+    """
+    formation of the per object checkpoints in the target bucket
+    """
+
+    CHECKPOINT_MANIFEST = "manifest.json"
+    CHECKPOINT_SOURCES = "sources"
+    CHECKPOINT_PART = "part"
+    CHECKPOINT_ROWS = "rows"
+    CHECKPOINT_ETAG = "etag"
+
+
+class ManifestFormat(Enum):
+    """
+    formation of the manifests of parquet partitions and compacted folders
+    """
+
+    MANIFEST_FILE = "_manifest.json"
+    MANIFEST_FILES = "files"
+    MANIFEST_SOURCES = "sources"
+    MANIFEST_ROWS = "rows"
+    MANIFEST_VALIDATION = "validation"
+
+
+class ValidationChecks(Enum):
+    """
+    checks of the schema contract of the source files
+    """
+
+    PARSE = "parse"
+    MISSING_COLUMN = "missing_column"
+    EXTRA_COLUMN = "extra_column"
+    DTYPE = "dtype"
+    NULL_RATIO = "null_ratio"
+    RANGE = "range"
+    VALUES = "values"
+    DUPLICATE_KEY = "duplicate_key"
+
+
+class DtypeKinds(Enum):
+    """
+    kinds of the memory efficient dtypes of DtypeCompaction
+    """
+
+    CATEGORY = "category"
+    STRING = "string"
+    DOWNCAST = "downcast"
+
+
+class FilterOperators(Enum):
+    """
+    Operators of the row filters of targeted reads
+    """
+
+    EQ = "="
+    EQ_ALIAS = "=="
+    NE = "!="
+    LT = "<"
+    LE = "<="
+    GT = ">"
+    GE = ">="
+    IN = "in"
+    NOT_IN = "not in"
+
+
+class LeaseFormat(Enum):
+    """
+    Keys and fields of the leases and shards of sharded runs
+    """
+
+    LEASE_LOCKS_DIR = "locks"
+    LEASE_SHARDS_DIR = "shards"
+    LEASE_DONE_DIR = "done"
+    LEASE_OWNER = "owner"
+    LEASE_EXPIRES = "expires_at"
+    SHARD_DATES = "dates"
+    SHARD_RESULTS = "results"
+    AGGREGATES_LEASE = "aggregates"
@@ -0,0 +1,119 @@
+"""
+Memory efficient dtypes of the combined DataFrames
+"""
+import logging
+
+import pandas as pd
+
+from epl.common.constants import DtypeKinds
+
+
+class DtypeCompaction:
+    """
+    Converts columns to smaller dtypes without changing their values, so
+    the csv and parquet writers produce the same output from less memory.
+    Repeated strings such as team and referee names become categoricals,
+    other strings arrow backed strings, integers are downcast to the
+    smallest type holding them and floats to float32 when no value changes.
+    Columns are configured one by one or chosen automatically
+    :param columns: dict of column to kind, see DtypeKinds
+    :param auto: choose the kind of the columns that are not configured
+    :param max_category_ratio: highest share of distinct values of a string
+    column made categorical
+    """
+
+    def __init__(
+        self, columns: dict = None, auto: bool = True, max_category_ratio: float = 0.5
+    ):
+        self.columns = columns or {}
+        self.auto = auto
+        self.max_category_ratio = max_category_ratio
+        kinds = {kind.value for kind in DtypeKinds}
+        for column, kind in self.columns.items():
+            if kind not in kinds:
+                raise ValueError(f"Unsupported dtype kind {kind} of column {column}")
+        self._logger = logging.getLogger(__name__)
+
+    def apply(self, df: pd.DataFrame):
+        """
+        Converts the columns of a DataFrame
+
+        :param df: input dataframe
+
+        returns:
+          df: dataframe with the converted columns
+          report: dict of bytes before and after and the converted columns
+        """
+
+        converted = {}
+        for column in df.columns:
+            kind = self.columns.get(column)
+            if kind is None and self.auto:
+                kind = self._choose(df[column])
+            if kind is None:
+                continue
+            series = self._convert(df[column], kind)
+            if series.dtype != df[column].dtype:
+                converted[column] = series
+
+        before = int(df[list(converted)].memory_usage(index=False, deep=True).sum())
+        after = sum(
+            int(series.memory_usage(index=False, deep=True))
+            for series in converted.values()
+        )
+        if converted:
+            df = df.assign(**converted)
+            self._logger.info(
+                f"Compacted dtypes of {len(converted)} columns, "
+                f"{before} to {after} bytes"
+            )
+        report = {
+            "bytes_before": before,
+            "bytes_after": after,
+            "columns": {
+                column: str(series.dtype) for column, series in converted.items()
+            },
+        }
+        return df, report
+
+    def _choose(self, series: pd.Series):
+        """
+        Helper function choosing the kind of a column that is not configured
+        """
+
+        if pd.api.types.is_bool_dtype(series) or isinstance(
+            series.dtype, pd.CategoricalDtype
+        ):
+            return None
+        if pd.api.types.is_integer_dtype(series) or pd.api.types.is_float_dtype(series):
+            return DtypeKinds.DOWNCAST.value
+        # object columns count as strings when every value is a string
+        if pd.api.types.is_string_dtype(series):
+            distinct = series.nunique()
+            if len(series) and distinct <= self.max_category_ratio * len(series):
+                return DtypeKinds.CATEGORY.value
+            if series.dtype == object:
+                return DtypeKinds.STRING.value
+        return None
+
+    @staticmethod
+    def _convert(series: pd.Series, kind: str):
+        """
+        Helper function converting a column to the smaller dtype of its kind,
+        the column is returned unchanged when its values would change
+        """
+
+        if kind == DtypeKinds.CATEGORY.value:
+            return series.astype("category")
+        if kind == DtypeKinds.STRING.value:
+            if not pd.api.types.is_string_dtype(series):
+                return series
+            return series.astype(pd.StringDtype("pyarrow"))
+        if pd.api.types.is_integer_dtype(series):
+            return pd.to_numeric(series, downcast="integer")
+        if pd.api.types.is_float_dtype(series) and series.dtype.itemsize > 4:
+            smaller = series.astype("float32")
+            # float32 holds fewer digits, only lossless conversions are kept
+            if (smaller.astype(series.dtype) == series)[series.notna()].all():
+                return smaller
+        return series
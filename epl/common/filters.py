@@ -0,0 +1,156 @@
+"""
+Row filters of targeted reads of the processed outputs
+"""
+import pandas as pd
+
+from epl.common.constants import FilterOperators
+
+
+def normalize_filters(filters: list = None):
+    """
+    Returns filters in disjunctive normal form, a list of conjunctions of
+    (column, operator, value) tuples as taken by pandas.read_parquet
+    :param filters: list of tuples, all must hold, or list of lists of
+    tuples, one of the lists must hold
+
+    returns:
+      filters: list of lists of tuples, empty without filters
+    """
+
+    if not filters:
+        return []
+    if isinstance(filters[0], tuple):
+        filters = [filters]
+    operators = {operator.value for operator in FilterOperators}
+    for conjunction in filters:
+        for column, operator, _ in conjunction:
+            if operator not in operators:
+                raise ValueError(f"Unsupported operator {operator} of column {column}")
+    return [list(conjunction) for conjunction in filters]
+
+
+def filter_columns(filters: list):
+    """
+    Returns the columns used by normalized filters, in first use order
+    """
+
+    return list(
+        dict.fromkeys(column for conjunction in filters for column, _, _ in conjunction)
+    )
+
+
+def filter_mask(df: pd.DataFrame, filters: list):
+    """
+    Evaluates normalized filters on whole columns of a DataFrame
+
+    :param df: DataFrame holding the filter columns
+    :param filters: filters returned by normalize_filters
+
+    returns:
+      mask: boolean Series of the matching rows
+    """
+
+    mask = pd.Series(not filters, index=df.index)
+    for conjunction in filters:
+        matches = pd.Series(True, index=df.index)
+        for column, operator, value in conjunction:
+            matches &= _compare(df[column], operator, value)
+        mask |= matches
+    return mask.fillna(False).astype(bool)
+
+
+def _compare(series: pd.Series, operator: str, value):
+    """
+    Helper function for filter_mask() comparing a column with a value
+    """
+
+    if operator in (FilterOperators.EQ.value, FilterOperators.EQ_ALIAS.value):
+        return series == value
+    if operator == FilterOperators.NE.value:
+        # nulls match no filter, as in pyarrow, so statistics can prune them
+        return series.notna() & (series != value)
+    if operator == FilterOperators.LT.value:
+        return series < value
+    if operator == FilterOperators.LE.value:
+        return series <= value
+    if operator == FilterOperators.GT.value:
+        return series > value
+    if operator == FilterOperators.GE.value:
+        return series >= value
+    if operator == FilterOperators.IN.value:
+        return series.isin(value)
+    return series.notna() & ~series.isin(value)
+
+
+def row_group_statistics(row_group):
+    """
+    Returns the min and max of the columns of a parquet row group
+
+    :param row_group: pyarrow.parquet RowGroupMetaData
+
+    returns:
+      statistics: dict of column to (min, max) of the columns with statistics
+    """
+
+    statistics = {}
+    for index in range(row_group.num_columns):
+        chunk = row_group.column(index)
+        if chunk.statistics is not None and chunk.statistics.has_min_max:
+            statistics[chunk.path_in_schema] = (
+                chunk.statistics.min,
+                chunk.statistics.max,
+            )
+    return statistics
+
+
+def may_match(statistics: dict, filters: list):
+    """
+    Tells from the min and max of the columns of a parquet row group whether
+    any of its rows can match, row groups that can not are never downloaded
+
+    :param statistics: dict of column to (min, max), columns without
+    statistics are left out
+    :param filters: filters returned by normalize_filters
+
+    returns:
+      match: False when no row of the row group can match
+    """
+
+    if not filters:
+        return True
+    return any(
+        all(
+            _in_range(statistics.get(column), operator, value)
+            for column, operator, value in conjunction
+        )
+        for conjunction in filters
+    )
+
+
+def _in_range(bounds: tuple, operator: str, value):
+    """
+    Helper function for may_match() checking one filter against the min and
+    max of a column, unknown or incomparable bounds may always match
+    """
+
+    if bounds is None:
+        return True
+    low, high = bounds
+    try:
+        if operator in (FilterOperators.EQ.value, FilterOperators.EQ_ALIAS.value):
+            return low <= value <= high
+        if operator == FilterOperators.NE.value:
+            return not low == high == value
+        if operator == FilterOperators.LT.value:
+            return low < value
+        if operator == FilterOperators.LE.value:
+            return low <= value
+        if operator == FilterOperators.GT.value:
+            return high > value
+        if operator == FilterOperators.GE.value:
+            return high >= value
+        if operator == FilterOperators.IN.value:
+            return any(low <= item <= high for item in value)
+        return not (low == high and low in value)
+    except TypeError:
+        return True
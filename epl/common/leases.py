@@ -0,0 +1,203 @@
+"""
+Leases on shared work kept as objects in a bucket
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from botocore.exceptions import ClientError
+
+from epl.common.constants import LeaseFormat
+from epl.common.meta_store import MetaStore
+
+
+class LeaseStore:
+    """
+    Hands out named leases, e.g. on a shard of dates, to one owner at a time.
+    A lease is an object holding its owner and expiry time. It is taken with
+    a write conditioned on the ETag it was read with, kept alive by
+    heartbeats renewing the expiry and released by deleting it. A lease not
+    renewed in time expires and can be taken by another owner, so the work
+    of a crashed worker is picked up again.
+
+    Every write is read back, so on stores ignoring conditional writes only
+    the last writer keeps the lease. Two owners may still both hold a lease
+    for a moment there, the leased work must be safe to repeat
+    :param s3_bucket: S3BucketConnector of the bucket holding the leases
+    :param prefix: prefix of the lease objects
+    :param lease_seconds: seconds a lease is held without a heartbeat
+    :param owner: name of the owner, defaults to host, process and a random id
+    """
+
+    def __init__(
+        self,
+        s3_bucket,
+        prefix: str = "leases",
+        lease_seconds: float = 300,
+        owner: str = None,
+    ):
+        self.s3_bucket = s3_bucket
+        self.prefix = prefix
+        self.lease_seconds = lease_seconds
+        self.owner = owner or (
+            f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        )
+        self._logger = logging.getLogger(__name__)
+
+    def lease_key(self, name: str):
+        """
+        Key of the lease object of a name
+        """
+
+        return f"{self.prefix}/{LeaseFormat.LEASE_LOCKS_DIR.value}/{name}.json"
+
+    def holder(self, name: str):
+        """
+        Returns the lease of a name
+
+        :param name: name of the lease
+
+        returns:
+          lease: dict of the owner and expiry or None when nobody holds it
+          etag: ETag of the lease object or None
+        """
+
+        body, etag = self.s3_bucket.read_object_with_etag(self.lease_key(name))
+        if body is None:
+            return None, None
+        return json.loads(body), etag
+
+    def acquire(self, name: str):
+        """
+        Takes a lease that is free, expired or already held by this owner
+
+        :param name: name of the lease
+
+        returns:
+          acquired: True when this owner holds the lease
+        """
+
+        lease, etag = self.holder(name)
+        if lease is not None and not self._is_mine(lease) and not self.expired(lease):
+            return False
+        if lease is not None and not self._is_mine(lease):
+            self._logger.info(
+                f"Lease {name} of {lease[LeaseFormat.LEASE_OWNER.value]} expired"
+            )
+        return self._write(name, etag)
+
+    def renew(self, name: str):
+        """
+        Moves the expiry of a lease held by this owner forward
+
+        :param name: name of the lease
+
+        returns:
+          renewed: False when the lease was lost to another owner
+        """
+
+        lease, etag = self.holder(name)
+        if lease is None or not self._is_mine(lease):
+            self._logger.warning(f"Lease {name} was lost")
+            return False
+        return self._write(name, etag)
+
+    def release(self, name: str):
+        """
+        Gives up a lease held by this owner
+
+        :param name: name of the lease
+        """
+
+        lease, _ = self.holder(name)
+        if lease is not None and self._is_mine(lease):
+            self.s3_bucket.delete_object(self.lease_key(name))
+
+    def wait(self, name: str, poll_seconds: float = 1):
+        """
+        Takes a lease, waiting while another owner holds it
+
+        :param name: name of the lease
+        :param poll_seconds: seconds between two tries
+        """
+
+        while not self.acquire(name):
+            time.sleep(poll_seconds)
+
+    @contextmanager
+    def heartbeat(self, name: str, interval: float = None):
+        """
+        Renews a held lease in the background until the block exits
+
+        :param name: name of the lease
+        :param interval: seconds between renewals, defaults to a third of
+        the lease time
+
+        returns:
+          lost: threading.Event set when a renewal found the lease lost
+        """
+
+        interval = interval or self.lease_seconds / 3
+        stop = threading.Event()
+        lost = threading.Event()
+
+        def _beat():
+            while not stop.wait(interval):
+                try:
+                    if not self.renew(name):
+                        lost.set()
+                        return
+                except ClientError:
+                    # a failed renewal is retried on the next beat
+                    self._logger.exception(f"Heartbeat of lease {name} failed")
+
+        thread = threading.Thread(target=_beat, name=f"lease-{name}", daemon=True)
+        thread.start()
+        try:
+            yield lost
+        finally:
+            stop.set()
+            thread.join()
+
+    def expired(self, lease: dict):
+        """
+        Returns True when a lease was not renewed in time
+        """
+
+        return lease[LeaseFormat.LEASE_EXPIRES.value] <= time.time()
+
+    def _is_mine(self, lease: dict):
+        """
+        Helper function telling whether this owner holds a lease
+        """
+
+        return lease[LeaseFormat.LEASE_OWNER.value] == self.owner
+
+    def _write(self, name: str, etag: str):
+        """
+        Helper function writing the lease of this owner in place of the lease
+        read with etag and reading it back
+        """
+
+        lease = {
+            LeaseFormat.LEASE_OWNER.value: self.owner,
+            LeaseFormat.LEASE_EXPIRES.value: time.time() + self.lease_seconds,
+        }
+        try:
+            self.s3_bucket.write_object(
+                json.dumps(lease),
+                self.lease_key(name),
+                if_match=etag,
+                if_none_match=etag is None,
+            )
+        except ClientError as error:
+            if not MetaStore.is_conflict(error):
+                raise
+            return False
+        current, _ = self.holder(name)
+        return current is not None and self._is_mine(current)
@@ -0,0 +1,312 @@
+"""
+Listing and meta data reads of a bucket, without pandas or pyarrow
+"""
+import logging
+import re
+import threading
+
+from botocore.exceptions import ClientError
+
+from epl.common.client_factory import get_s3_client
+from epl.common.constants import MetricStages
+from epl.common.meta_store import MetaStore
+from epl.common.metrics import Metrics
+
+# folder names carry the date they hold, e.g. football-2023-03-18/
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def folder_date(key: str):
+    """
+    Returns the date of the top level dated folder holding a key, the
+    folders listed by the date index, None for meta data, leases and outputs
+    :param key: object key
+    """
+
+    folder, separator, _ = key.partition("/")
+    match = DATE_PATTERN.search(folder) if separator else None
+    return match.group() if match else None
+
+
+class S3Listing:
+    """
+    Lists the dated folders of a bucket and reads the meta data recording
+    which of them were processed. Only needs boto3, so a scheduler poll can
+    ask whether there is anything to do before the data libraries are
+    imported. S3BucketConnector extends it with the reads and writes of the
+    data files
+    """
+
+    def __init__(
+        self,
+        access_key: str,
+        secret_key: str,
+        bucket: str,
+        endpoint_url: str = None,
+        max_pool_connections: int = 10,
+        retry_mode: str = "adaptive",
+        max_attempts: int = 5,
+        tcp_keepalive: bool = True,
+        metrics: Metrics = None,
+    ):
+        """
+        Constructor for S3Listing
+
+        :param access_key: access key for accessing S3
+        :param secret_key: secret key for accessing S3
+        :param bucket: S3 bucket name
+        :param endpoint_url: endpoint url to S3
+        :param max_pool_connections: size of the shared connection pool
+        :param retry_mode: botocore retry mode, legacy, standard or adaptive
+        :param max_attempts: maximum attempts of a request including retries
+        :param tcp_keepalive: keep pooled connections alive
+        :param metrics: Metrics recording stage timings and counters
+        """
+
+        self._logger = logging.getLogger(__name__)
+        self._access_key = access_key
+        self._secret_key = secret_key
+        self.metrics = metrics or Metrics()
+        self._client_config = {
+            "endpoint_url": endpoint_url,
+            "max_pool_connections": max_pool_connections,
+            "retry_mode": retry_mode,
+            "max_attempts": max_attempts,
+            "tcp_keepalive": tcp_keepalive,
+        }
+        # connectors with the same settings share one pooled client
+        self._client = get_s3_client(access_key, secret_key, **self._client_config)
+        self.bucket_name = bucket
+        # listing cache, reset whenever a connector changes a dated folder
+        self._index_lock = threading.Lock()
+        self._prefixes = None
+        self._date_index = {}
+        self._etags = {}
+        self._sizes = {}
+
+    def list_folders(self):
+        """
+        List all folder in src bucket and check which folders require proccesing
+
+        returns:
+          files: list of all the folder names
+        """
+
+        # the meta store compares the folders against the watermark and gaps
+        return MetaStore(self).pending(self.list_all_folders())
+
+    def list_all_folders(self):
+        """
+        List the date of every dated folder in the bucket
+
+        returns:
+          files: list of all the folder dates, format: yyyy-mm-dd
+        """
+
+        with self.metrics.timer(MetricStages.LIST.value):
+            return list(self._date_prefixes())
+
+    def list_files_in_prefix(self, tgr_date: str):
+        """
+        listing all files with a prefix on the S3 bucket with target date
+
+        :param tgr date: will obtain prefix on the S3 bucket filtered with tgr date, format: yyyy-mm-dd
+
+        returns:
+          key: absolute path to files, list of all the file names containing the prefix in the key for that date
+        """
+
+        files = self._folder_files(tgr_date)
+        if files is None:
+            self._logger.info("List is empty")
+        return files
+
+    def date_index(self, refresh: bool = False):
+        """
+        Index of every dated folder in the bucket and the files inside it.
+        Folders are listed one by one when first asked for and reused until
+        the connector writes to them or refresh is requested, so a run only
+        lists the folders of the dates it processes
+
+        :param refresh: list the bucket again even when an index exists
+
+        returns:
+          index: dict of folder date, format: yyyy-mm-dd, to list of file keys
+        """
+
+        if refresh:
+            with self._index_lock:
+                self._prefixes = None
+                self._date_index = {}
+        return {day: self._folder_files(day) for day in self._date_prefixes()}
+
+    def folder_sizes(self, days: list):
+        """
+        Number of objects and bytes of dated folders, from the listing
+        metadata so no object is read
+
+        :param days: list of folder dates, format: yyyy-mm-dd
+
+        returns:
+          sizes: dict of folder date to dict of objects and bytes
+        """
+
+        sizes = {}
+        for day in days:
+            files = self._folder_files(day) or []
+            sizes[day] = {
+                "objects": len(files),
+                "bytes": sum(self._sizes.get(key, 0) for key in files),
+            }
+        return sizes
+
+    def _folder_files(self, day: str):
+        """
+        Helper function returning the files of a dated folder, listed with a
+        single prefix listing the first time the folder is asked for
+
+        :param day: folder date, format: yyyy-mm-dd
+
+        returns:
+          keys: list of the file keys or None when there is no such folder
+        """
+
+        with self._index_lock:
+            if day in self._date_index:
+                return self._date_index[day]
+        prefix = self._date_prefixes().get(day)
+        if prefix is None:
+            return None
+        # listed outside the lock, dates running at the same time list
+        # their folders at the same time
+        files = []
+        with self.metrics.timer(MetricStages.LIST.value):
+            for page in self._paginate(Prefix=prefix):
+                for obj in page.get("Contents", []):
+                    if obj["Key"] != prefix:
+                        files.append(obj["Key"])
+                        # kept so cached objects need no request at all
+                        self._etags[obj["Key"]] = obj["ETag"]
+                        self._sizes[obj["Key"]] = obj["Size"]
+        with self._index_lock:
+            self._date_index[day] = files
+        return files
+
+    def _date_prefixes(self, refresh: bool = False):
+        """
+        Helper function listing the top level folders of the bucket with a
+        single delimiter listing, folders without a date in the name are skipped
+
+        returns:
+          prefixes: dict of folder date to folder prefix in key order
+        """
+
+        if self._prefixes is None or refresh:
+            prefixes = {}
+            for page in self._paginate(Prefix="", Delimiter="/"):
+                for common_prefix in page.get("CommonPrefixes", []):
+                    prefix = common_prefix["Prefix"]
+                    match = DATE_PATTERN.search(prefix)
+                    if match and match.group() not in prefixes:
+                        prefixes[match.group()] = prefix
+            self._prefixes = prefixes
+        return self._prefixes
+
+    def _invalidate(self, key: str):
+        """
+        Helper function resetting the listing of the folder of an object
+        after it was written or removed, only keys of dated folders change
+        the listing
+        :param key: key of the changed object
+        """
+
+        day = folder_date(key)
+        if day is None:
+            return
+        with self._index_lock:
+            # only the changed folder is listed again, or the folders when
+            # the key started a new one
+            if self._prefixes is not None and day not in self._prefixes:
+                self._prefixes = None
+            self._date_index.pop(day, None)
+            self._etags.pop(key, None)
+            self._sizes.pop(key, None)
+
+    def list_keys(self, prefix: str):
+        """
+        Lists the keys of every object under a prefix
+
+        :param prefix: key prefix, e.g. meta/commits/
+
+        returns:
+          keys: list of the object keys in key order
+        """
+
+        return [
+            obj["Key"]
+            for page in self._paginate(Prefix=prefix)
+            for obj in page.get("Contents", [])
+        ]
+
+    def etag(self, key: str):
+        """
+        Returns the ETag of an object, from the date index for the files of
+        the dated folders and with a HEAD request for other keys
+
+        :param key: key of the object
+
+        returns:
+          etag: ETag of the object or None when the key does not exist
+        """
+
+        day = folder_date(key)
+        if day is not None:
+            self._folder_files(day)
+        if key in self._etags:
+            return self._etags[key]
+        try:
+            return self._client.head_object(Bucket=self.bucket_name, Key=key)["ETag"]
+        except ClientError as error:
+            if error.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+
+    def _paginate(self, **kwargs):
+        """
+        Helper function yielding the pages of a list_objects_v2 call
+        """
+
+        paginator = self._client.get_paginator("list_objects_v2")
+        return paginator.paginate(Bucket=self.bucket_name, **kwargs)
+
+    def read_object(self, key: str):
+        """
+        Reads a whole object from the bucket
+
+        :key: key of the object
+
+        returns:
+          body: bytes of the object or None when the key does not exist
+        """
+
+        return self.read_object_with_etag(key)[0]
+
+    def read_object_with_etag(self, key: str):
+        """
+        Reads a whole object from the bucket with its ETag, used to write it
+        back only when no other writer changed it in between
+
+        :key: key of the object
+
+        returns:
+          body: bytes of the object or None when the key does not exist
+          etag: ETag of the object or None when the key does not exist
+        """
+
+        try:
+            response = self._client.get_object(Bucket=self.bucket_name, Key=key)
+            return response["Body"].read(), response["ETag"]
+        except ClientError as error:
+            if error.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None, None
+            raise
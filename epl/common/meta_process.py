@@ -5,33 +5,65 @@ Class to dermine which folder needs to be processed
 import datetime
 import logging
 
-from epl.common.constants import S3FileTypes
-from epl.common.s3 import S3BucketConnector
+from epl.common.constants import MetaProcessFormat
+from epl.common.listing import S3Listing
 
 
 class MetaProcess:
     """
     Takes an input date and returns list of folders requiring processing
-    :param src_dataframe: source dataframe object
+    :param s3_bucket_src: S3BucketConnector, or S3Listing when only the
+    execution list is needed
     """
 
-    def __init__(self, s3_bucket_src: S3BucketConnector):
+    def __init__(self, s3_bucket_src: S3Listing):
         self.s3_bucket_src = s3_bucket_src
         self._logger = logging.getLogger(__name__)
 
-    def execution_list(self, tgr_date=datetime.datetime.now().strftime("%Y-%m-%d")):
+    def execution_list(
+        self, tgr_date: str = None, from_date: str = None, force: bool = False
+    ):
         """
         Returns a list of dates requiring processing
-        :param date, optional: selected date to be processed
+        :param tgr_date, optional: last date to be processed, defaults to today
+        :param from_date, optional: first date to be processed
+        :param force: include dates that have already been processed
         """
 
-        all_folders = self.s3_bucket_src.list_folders()
+        # evaluated on every call, a default argument would keep the import date
+        tgr_date = tgr_date or datetime.datetime.now().strftime(
+            MetaProcessFormat.META_DATE_FORMAT.value
+        )
+        if force:
+            all_folders = self.s3_bucket_src.list_all_folders()
+        else:
+            all_folders = self.s3_bucket_src.list_folders()
 
         execution_list = [
             day
             for day in all_folders
-            if datetime.datetime.strptime(day, "%Y-%m-%d")
-            <= datetime.datetime.strptime(tgr_date, "%Y-%m-%d")
+            if self._to_date(day) <= self._to_date(tgr_date)
+            and (from_date is None or self._to_date(day) >= self._to_date(from_date))
         ]
 
         return execution_list
+
+    def plan(self, execution_list: list):
+        """
+        Returns the estimated size of the dates to be processed
+        :param execution_list: list of dates to be processed
+
+        returns:
+          plan: list of dicts of the date, number of objects and bytes
+        """
+
+        sizes = self.s3_bucket_src.folder_sizes(execution_list)
+        return [{"date": day, **sizes[day]} for day in execution_list]
+
+    @staticmethod
+    def _to_date(day: str):
+        """
+        Helper function parsing a folder date
+        """
+
+        return datetime.datetime.strptime(day, MetaProcessFormat.META_DATE_FORMAT.value)
@@ -0,0 +1,358 @@
+"""
+Compact store of the folders that have been processed
+"""
+import datetime
+import json
+import logging
+import random
+import time
+from io import StringIO
+
+from botocore.exceptions import ClientError
+
+from epl.common.constants import MetaProcessFormat
+
+# error codes of a conditional write that lost against another writer
+CONFLICT_CODES = ("PreconditionFailed", "ConditionalRequestConflict", "412", "409")
+
+
+class MetaStore:
+    """
+    Keeps the processed state of the source folders as a high watermark date
+    and a list of gaps, folders dated on or before the watermark that have not
+    been processed. Each run appends its own log file instead of rewriting
+    the history, so planning and updating cost the same after years of runs.
+
+    Runs may commit at the same time. Every processed date first gets its
+    own commit record, which no other date writes, then the state is
+    rewritten with a write conditioned on the ETag it was read with and
+    retried on a conflict. The state folds in every commit record, so a
+    state write lost on a store ignoring the condition is repaired by the
+    next commit, and pending dates are checked against the records as well.
+    Records already folded into the state a commit read are removed by it,
+    so only the records of the latest commits are listed
+    :param s3_bucket: S3BucketConnector of the bucket holding the meta data
+    :param max_attempts: number of tries of a conflicting state write
+    """
+
+    def __init__(self, s3_bucket, max_attempts: int = 5):
+        self.s3_bucket = s3_bucket
+        self.max_attempts = max_attempts
+        self._logger = logging.getLogger(__name__)
+
+    def load_state(self):
+        """
+        Reads the meta state, the first run bootstraps it from processed_data.csv
+
+        returns:
+          state: dict with the watermark date or None and the list of gap dates
+        """
+
+        return self._load_state_with_etag()[0]
+
+    def _load_state_with_etag(self):
+        """
+        Helper function reading the state and the ETag of the state object,
+        None when the state has not been written yet
+        """
+
+        body, etag = self.s3_bucket.read_object_with_etag(
+            MetaProcessFormat.META_STATE_KEY.value
+        )
+        if body is not None:
+            return json.loads(body), etag
+        return self._bootstrap_state(), None
+
+    def committed(self):
+        """
+        Returns the set of dates with a commit record
+        """
+
+        return self.dates_from_commit_keys(
+            self.s3_bucket.list_keys(MetaProcessFormat.META_COMMIT_PREFIX.value)
+        )
+
+    def pending(self, folders: list):
+        """
+        Returns the folders that still require processing
+        :param folders: list of folder dates, format: yyyy-mm-dd
+        """
+
+        return self.pending_from_state(self.load_state(), folders, self.committed())
+
+    @staticmethod
+    def pending_from_state(state: dict, folders: list, committed: set = ()):
+        """
+        Returns the folders that are past the watermark or in the gaps and
+        have no commit record
+        :param state: dict with the watermark date or None and the list of gap dates
+        :param folders: list of folder dates, format: yyyy-mm-dd
+        :param committed: set of dates with a commit record
+        """
+
+        watermark = state["watermark"]
+        gaps = set(state["gaps"])
+        committed = set(committed)
+
+        return [
+            day
+            for day in folders
+            if (watermark is None or day > watermark or day in gaps)
+            and day not in committed
+        ]
+
+    def commit(self, date_list: list):
+        """
+        Records processed folders, appends a log file for this run and moves
+        the watermark forward. Folders passed by the watermark without being
+        processed are kept as gaps
+        :param date_list: list of lists of processed dates and processing dates
+        """
+
+        if not date_list:
+            self._logger.info("No processed folders to record")
+            return True
+
+        # one record per date, a concurrent run never writes the same keys
+        for day, processed_at in date_list:
+            self.s3_bucket.write_object(*self.commit_record(day, processed_at))
+
+        # append only log of this run, never rewritten
+        self.s3_bucket.write_object(*self.run_log(date_list))
+
+        # the state is written last, a failure before it only replans the dates
+        folders = self.s3_bucket.list_all_folders()
+        for attempt in range(1, self.max_attempts + 1):
+            state, etag = self._load_state_with_etag()
+            body, folded = self.merge_state(state, self.committed(), date_list, folders)
+            try:
+                self.s3_bucket.write_object(
+                    body,
+                    MetaProcessFormat.META_STATE_KEY.value,
+                    if_match=etag,
+                    if_none_match=etag is None,
+                )
+            except ClientError as error:
+                time.sleep(self.retry_delay(error, attempt))
+                continue
+            self.prune(folded)
+            return True
+
+        # the commit records keep the progress, the next commit folds them in
+        self._logger.warning("Meta state not updated, commit records were written")
+        return False
+
+    def prune(self, dates: set):
+        """
+        Removes the commit records of dates the state records as processed
+        :param dates: set of dates, format: yyyy-mm-dd
+        """
+
+        if dates:
+            self._logger.info(f"Removing {len(dates)} folded commit records")
+            self.s3_bucket.delete_keys(self.commit_key(day) for day in sorted(dates))
+
+    @staticmethod
+    def merge_state(state: dict, committed: set, date_list: list, folders: list):
+        """
+        Returns the state to write after a commit, shared by the connectors
+        so every commit merges the state the same way
+        :param state: state read from the bucket
+        :param committed: set of dates with a commit record
+        :param date_list: list of lists of processed dates and processing dates
+        :param folders: list of every folder date in the bucket
+
+        returns:
+          body: json of the next state
+          folded: set of the dates whose commit records can be removed once
+          the state is written
+        """
+
+        processed = set(committed) | {str(day) for day, _ in date_list}
+        return (
+            json.dumps(MetaStore.next_state(state, processed, folders)),
+            MetaStore.folded(state, committed),
+        )
+
+    @staticmethod
+    def retry_delay(error: ClientError, attempt: int):
+        """
+        Returns the seconds to wait before retrying a conditional write that
+        lost against another writer, other errors are raised
+        :param error: ClientError of the write
+        :param attempt: number of the failed try
+        """
+
+        if not MetaStore.is_conflict(error):
+            raise error
+        logging.getLogger(__name__).info(
+            f"Meta state changed by another run, try {attempt}"
+        )
+        return MetaStore.backoff(attempt)
+
+    @staticmethod
+    def folded(state: dict, committed: set):
+        """
+        Returns the committed dates a written state already records as
+        processed, on or before its watermark and not in its gaps. Their
+        records are only removed once a later commit read that state, so a
+        state write lost right after it was made is still repaired
+        :param state: state read from the bucket
+        :param committed: set of dates with a commit record
+        """
+
+        watermark = state["watermark"]
+        if watermark is None:
+            return set()
+        gaps = set(state["gaps"])
+        return {day for day in committed if day <= watermark and day not in gaps}
+
+    @staticmethod
+    def is_conflict(error: ClientError):
+        """
+        Returns True when a conditional write failed because the object changed
+        :param error: ClientError of the write
+        """
+
+        return error.response.get("Error", {}).get("Code") in CONFLICT_CODES
+
+    @staticmethod
+    def backoff(attempt: int):
+        """
+        Returns the seconds to wait before the next try of a conflicting write,
+        randomized so the conflicting runs do not retry in step
+        :param attempt: number of the failed try
+        """
+
+        return random.uniform(0, 0.1 * 2**attempt)
+
+    @staticmethod
+    def commit_record(day: str, processed_at: str):
+        """
+        Returns the commit record of a processed date
+        :param day: processed date, format: yyyy-mm-dd
+        :param processed_at: processing date
+
+        returns:
+          body: json of the date and the processing date
+          key: key of the commit record
+        """
+
+        return (
+            json.dumps(
+                {
+                    MetaProcessFormat.META_FOLDER_COL.value: str(day),
+                    MetaProcessFormat.META_PROCESS_COL.value: str(processed_at),
+                }
+            ),
+            MetaStore.commit_key(day),
+        )
+
+    @staticmethod
+    def commit_key(day: str):
+        """
+        Returns the key of the commit record of a date
+        :param day: processed date, format: yyyy-mm-dd
+        """
+
+        return f"{MetaProcessFormat.META_COMMIT_PREFIX.value}date={day}.json"
+
+    @staticmethod
+    def dates_from_commit_keys(keys):
+        """
+        Returns the set of dates of commit record keys
+        :param keys: iterable of keys under META_COMMIT_PREFIX
+        """
+
+        prefix = f"{MetaProcessFormat.META_COMMIT_PREFIX.value}date="
+        return {
+            key[len(prefix) : -len(".json")]
+            for key in keys
+            if key.startswith(prefix) and key.endswith(".json")
+        }
+
+    @staticmethod
+    def next_state(state: dict, processed: set, folders: list):
+        """
+        Returns the state after recording processed folders
+        :param state: current state
+        :param processed: set of processed dates, format: yyyy-mm-dd
+        :param folders: list of every folder date in the bucket
+
+        returns:
+          state: dict with the new watermark and the list of gap dates
+        """
+
+        watermark = state["watermark"]
+        processed = set(processed)
+        new_watermark = max(processed | ({watermark} if watermark else set()))
+
+        gaps = {day for day in state["gaps"] if day not in processed}
+        gaps.update(
+            day
+            for day in folders
+            if (watermark is None or day > watermark)
+            and day <= new_watermark
+            and day not in processed
+        )
+        return {"watermark": new_watermark, "gaps": sorted(gaps)}
+
+    @staticmethod
+    def run_log(date_list: list):
+        """
+        Returns the log file of a run
+        :param date_list: list of lists of processed dates and processing dates
+
+        returns:
+          body: csv of the processed folders and processing dates
+          key: key of the log file
+        """
+
+        # pandas is imported on use, planning a run does not need it
+        import pandas as pd
+
+        out_buffer = StringIO()
+        pd.DataFrame(
+            date_list,
+            columns=[
+                MetaProcessFormat.META_FOLDER_COL.value,
+                MetaProcessFormat.META_PROCESS_COL.value,
+            ],
+        ).to_csv(out_buffer, index=False)
+        run_id = datetime.datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        return (
+            out_buffer.getvalue(),
+            f"{MetaProcessFormat.META_LOG_PREFIX.value}run-{run_id}.csv",
+        )
+
+    def _bootstrap_state(self):
+        """
+        Helper function building the state from the legacy processed_data.csv
+        """
+
+        body = self.s3_bucket.read_object(MetaProcessFormat.META_LEGACY_KEY.value)
+        if body is None:
+            self._logger.info("No meta data found, all folders require processing")
+            return {"watermark": None, "gaps": []}
+
+        self._logger.info("Building meta state from processed_data.csv")
+        return self.state_from_legacy(body, self.s3_bucket.list_all_folders())
+
+    @staticmethod
+    def state_from_legacy(body: bytes, folders: list):
+        """
+        Returns the state recorded by a legacy processed_data.csv
+        :param body: content of processed_data.csv
+        :param folders: list of every folder date in the bucket
+        """
+
+        import pandas as pd
+
+        df = pd.read_csv(StringIO(body.decode("utf-8")))
+        processed = set(df[MetaProcessFormat.META_FOLDER_COL.value].astype(str))
+        if not processed:
+            return {"watermark": None, "gaps": []}
+
+        watermark = max(processed)
+        gaps = [day for day in folders if day <= watermark and day not in processed]
+        return {"watermark": watermark, "gaps": gaps}
@@ -0,0 +1,218 @@
+"""
+Stage timers and counters of a run with pluggable exporters
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Metrics:
+    """
+    Collects the time spent in each stage of a run and counters of the
+    bytes, rows, objects and retries handled. Stages running on worker
+    threads are summed, so a stage can add up to more than the wall clock
+    time of the run. Exporters receive a snapshot once the run completes
+    :param exporters: list of exporters with an export(snapshot) method
+    """
+
+    def __init__(self, exporters: list = None):
+        self.exporters = exporters or []
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._counters = {}
+
+    def __getstate__(self):
+        """
+        Only the exporters are pickled, a process pool worker starts empty
+        """
+
+        return {"exporters": self.exporters}
+
+    def __setstate__(self, state: dict):
+        self.__init__(**state)
+
+    @contextmanager
+    def timer(self, stage: str):
+        """
+        Times the block and adds it to the stage, failed blocks are recorded too
+        :param stage: name of the stage, see MetricStages
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage: str, seconds: float):
+        """
+        Adds a duration to a stage
+        :param stage: name of the stage, see MetricStages
+        :param seconds: duration of one call of the stage
+        """
+
+        with self._lock:
+            totals = self._stages.setdefault(
+                stage, {"seconds": 0.0, "calls": 0, "max_seconds": 0.0}
+            )
+            totals["seconds"] += seconds
+            totals["calls"] += 1
+            totals["max_seconds"] = max(totals["max_seconds"], seconds)
+
+    def incr(self, counter: str, value: int = 1):
+        """
+        Increases a counter
+        :param counter: name of the counter, see MetricCounters
+        :param value: amount added to the counter
+        """
+
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + value
+
+    def snapshot(self):
+        """
+        Returns a copy of the recorded values
+
+        returns:
+          snapshot: dict of stages, dict of stage to seconds, calls and
+          max_seconds, and counters, dict of counter to value
+        """
+
+        with self._lock:
+            return {
+                "stages": {
+                    stage: dict(totals) for stage, totals in self._stages.items()
+                },
+                "counters": dict(self._counters),
+            }
+
+    def merge(self, snapshot: dict):
+        """
+        Adds the values of a snapshot, e.g. recorded in a worker process
+        :param snapshot: dict returned by self.snapshot()
+        """
+
+        with self._lock:
+            for stage, totals in snapshot["stages"].items():
+                current = self._stages.setdefault(
+                    stage, {"seconds": 0.0, "calls": 0, "max_seconds": 0.0}
+                )
+                current["seconds"] += totals["seconds"]
+                current["calls"] += totals["calls"]
+                current["max_seconds"] = max(
+                    current["max_seconds"], totals["max_seconds"]
+                )
+            for counter, value in snapshot["counters"].items():
+                self._counters[counter] = self._counters.get(counter, 0) + value
+
+    def export(self):
+        """
+        Hands a snapshot to every exporter
+
+        returns:
+          snapshot: the exported values
+        """
+
+        snapshot = self.snapshot()
+        for exporter in self.exporters:
+            exporter.export(snapshot)
+        return snapshot
+
+    def reset(self):
+        """
+        Clears the recorded values
+        """
+
+        with self._lock:
+            self._stages = {}
+            self._counters = {}
+
+
+class JsonLogExporter:
+    """
+    Logs one JSON line per stage and one line with the counters
+    :param logger_name: name of the logger the lines are written to
+    """
+
+    def __init__(self, logger_name: str = __name__):
+        self.logger_name = logger_name
+
+    def export(self, snapshot: dict):
+        """
+        Writes the snapshot to the log
+        """
+
+        logger = logging.getLogger(self.logger_name)
+        for stage, totals in snapshot["stages"].items():
+            logger.info(json.dumps({"metric": "stage", "stage": stage, **totals}))
+        logger.info(json.dumps({"metric": "counters", **snapshot["counters"]}))
+
+
+class PrometheusTextfileExporter:
+    """
+    Writes the snapshot in the Prometheus text format, e.g. for the textfile
+    collector of the node exporter. The file is replaced as a whole so the
+    collector never reads a partial file
+    :param path: file the metrics are written to
+    :param prefix: prefix of the metric names
+    """
+
+    def __init__(self, path: str, prefix: str = "epl"):
+        self.path = path
+        self.prefix = prefix
+
+    def export(self, snapshot: dict):
+        """
+        Writes the snapshot to the textfile
+        """
+
+        lines = []
+        for name, field, help_text in [
+            ("stage_seconds", "seconds", "Seconds spent in the stage"),
+            ("stage_calls", "calls", "Number of times the stage ran"),
+            ("stage_max_seconds", "max_seconds", "Longest single call"),
+        ]:
+            lines.append(f"# HELP {self.prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {self.prefix}_{name} gauge")
+            for stage, totals in sorted(snapshot["stages"].items()):
+                lines.append(f'{self.prefix}_{name}{{stage="{stage}"}} {totals[field]}')
+        for counter, value in sorted(snapshot["counters"].items()):
+            lines.append(f"# TYPE {self.prefix}_{counter} gauge")
+            lines.append(f"{self.prefix}_{counter} {value}")
+        lines.append(f"# TYPE {self.prefix}_last_run_timestamp_seconds gauge")
+        lines.append(f"{self.prefix}_last_run_timestamp_seconds {time.time():.0f}")
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.path)
+
+
+class InMemoryRecorder:
+    """
+    Keeps every exported snapshot, used by tests
+    """
+
+    def __init__(self):
+        self.snapshots = []
+
+    def export(self, snapshot: dict):
+        """
+        Stores the snapshot
+        """
+
+        self.snapshots.append(snapshot)
+
+    @property
+    def last(self):
+        """
+        The most recent snapshot or None before the first export
+        """
+
+        return self.snapshots[-1] if self.snapshots else None
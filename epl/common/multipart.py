@@ -0,0 +1,223 @@
+""" Writable file object uploading to S3 with multipart upload """
+
+
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from epl.common.constants import MetricCounters, MetricStages
+from epl.common.metrics import Metrics
+
+# S3 rejects parts smaller than 5 MiB apart from the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class S3MultipartWriter:
+    """
+    Buffers written bytes and uploads them as a multipart part every time
+    part_size bytes are collected. Full parts are handed to the upload
+    without copying and up to max_workers parts are uploaded at the same
+    time, so memory is bounded by (max_workers + 1) * part_size.
+    Outputs smaller than one part are written with a single put_object.
+    A failed part or an error raised inside the context manager aborts the
+    upload so no partial object is left behind
+    """
+
+    def __init__(
+        self,
+        client,
+        bucket: str,
+        key: str,
+        part_size: int = MIN_PART_SIZE,
+        max_workers: int = 1,
+        metrics: Metrics = None,
+    ):
+        """
+        Constructor for S3MultipartWriter
+
+        :param client: boto3 S3 client
+        :param bucket: S3 bucket name
+        :param key: target key of the saved file
+        :param part_size: size of the uploaded parts in bytes
+        :param max_workers: number of parts uploaded at the same time
+        :param metrics: Metrics recording the upload time and bytes
+        """
+
+        self._logger = logging.getLogger(__name__)
+        self._client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.max_workers = max(max_workers, 1)
+        self.metrics = metrics or Metrics()
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+        self._pending = set()
+        self._pool = None
+        self.bytes_written = 0
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def writable(self):
+        """
+        Writer is write only
+        """
+
+        return True
+
+    def write(self, data: bytes or str):
+        """
+        Adds data to the current part and uploads every full part
+
+        :data: bytes to write, strings are utf-8 encoded
+
+        returns:
+          size: number of bytes written
+        """
+
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        view = memoryview(data)
+        size = len(view)
+        while view:
+            space = self.part_size - len(self._buffer)
+            self._buffer += view[:space]
+            view = view[space:]
+            if len(self._buffer) >= self.part_size:
+                # the full buffer is uploaded as is and a new one is started
+                self._submit_part(self._buffer)
+                self._buffer = bytearray()
+        self.bytes_written += size
+        return size
+
+    def tell(self):
+        """
+        Position of the writer, the number of bytes written so far
+        """
+
+        return self.bytes_written
+
+    def flush(self):
+        """
+        Parts are only uploaded once full, nothing to flush
+        """
+
+    def close(self):
+        """
+        Uploads the remaining bytes and completes the upload
+        """
+
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                self._logger.info(f"Writing file to {self.bucket}/{self.key}")
+                with self.metrics.timer(MetricStages.UPLOAD.value):
+                    self._client.put_object(
+                        Body=self._buffer, Bucket=self.bucket, Key=self.key
+                    )
+            else:
+                if self._buffer:
+                    self._submit_part(self._buffer)
+                self._wait(0)
+                with self.metrics.timer(MetricStages.UPLOAD.value):
+                    self._client.complete_multipart_upload(
+                        Bucket=self.bucket,
+                        Key=self.key,
+                        UploadId=self._upload_id,
+                        MultipartUpload={
+                            "Parts": sorted(self._parts, key=lambda p: p["PartNumber"])
+                        },
+                    )
+        except Exception:
+            self.abort()
+            raise
+        self.closed = True
+        self._buffer = bytearray()
+        self._shutdown()
+        self.metrics.incr(MetricCounters.BYTES_UPLOADED.value, self.bytes_written)
+        self.metrics.incr(MetricCounters.OBJECTS_UPLOADED.value)
+
+    def abort(self):
+        """
+        Aborts the upload so no partial object or orphaned parts are left
+        """
+
+        self.closed = True
+        self._buffer = bytearray()
+        self._shutdown()
+        if self._upload_id is not None:
+            self._logger.warning(f"Aborting upload of {self.bucket}/{self.key}")
+            self._client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id
+            )
+
+    def _submit_part(self, body: bytearray):
+        """
+        Helper function starting the upload on the first part and uploading
+        a part, waits for a free worker when max_workers parts are in flight
+        """
+
+        if self._upload_id is None:
+            self._logger.info(f"Writing multipart file to {self.bucket}/{self.key}")
+            self._upload_id = self._client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key
+            )["UploadId"]
+            if self.max_workers > 1:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        part_number = len(self._parts) + len(self._pending) + 1
+
+        if self._pool is None:
+            self._parts.append(self._upload_part(body, part_number))
+            return
+        self._wait(self.max_workers - 1)
+        self._pending.add(self._pool.submit(self._upload_part, body, part_number))
+
+    def _upload_part(self, body: bytearray, part_number: int):
+        """
+        Helper function uploading a single part
+
+        returns:
+          part: dict of the part ETag and number
+        """
+
+        with self.metrics.timer(MetricStages.UPLOAD.value):
+            response = self._client.upload_part(
+                Body=body,
+                Bucket=self.bucket,
+                Key=self.key,
+                PartNumber=part_number,
+                UploadId=self._upload_id,
+            )
+        return {"ETag": response["ETag"], "PartNumber": part_number}
+
+    def _wait(self, max_pending: int):
+        """
+        Helper function collecting finished parts until at most max_pending
+        parts are in flight, the first failed part is raised
+        """
+
+        while len(self._pending) > max_pending:
+            done, self._pending = wait(self._pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                self._parts.append(future.result())
+
+    def _shutdown(self):
+        """
+        Helper function stopping the upload workers
+        """
+
+        if self._pool is not None:
+            for future in self._pending:
+                future.cancel()
+            self._pool.shutdown(wait=True)
+            self._pool = None
+            self._pending = set()
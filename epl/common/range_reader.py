@@ -0,0 +1,103 @@
+""" Seekable file object reading an S3 object with byte range GETs """
+
+
+import io
+import logging
+
+from epl.common.constants import MetricCounters, MetricStages
+from epl.common.metrics import Metrics
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    Read only file object over an S3 object that fetches every read with a
+    ranged get_object, nothing is downloaded until it is read. Handed to
+    pyarrow.parquet the footer, and then only the column chunks of the
+    selected row groups and columns, are downloaded instead of the whole file
+    """
+
+    def __init__(
+        self, client, bucket: str, key: str, size: int, metrics: Metrics = None
+    ):
+        """
+        Constructor for S3RangeReader
+
+        :param client: boto3 S3 client
+        :param bucket: S3 bucket name
+        :param key: key of the object
+        :param size: size of the object in bytes
+        :param metrics: Metrics recording the download time and bytes
+        """
+
+        super().__init__()
+        self._logger = logging.getLogger(__name__)
+        self._client = client
+        self.bucket = bucket
+        self.key = key
+        self.size = size
+        self.metrics = metrics or Metrics()
+        self._position = 0
+        self.requests = 0
+
+    def readable(self):
+        """
+        Reader is read only
+        """
+
+        return True
+
+    def seekable(self):
+        """
+        Reader can be positioned anywhere in the object
+        """
+
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET):
+        """
+        Moves the position of the next read, no request is made
+
+        :offset: offset in bytes relative to whence
+        :whence: io.SEEK_SET, io.SEEK_CUR or io.SEEK_END
+        """
+
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self._position = min(max(offset, 0), self.size)
+        return self._position
+
+    def read(self, size: int = -1):
+        """
+        Reads size bytes from the current position with one ranged GET
+
+        :size: number of bytes, -1 reads to the end of the object
+
+        returns:
+          body: bytes read, empty at the end of the object
+        """
+
+        end = self.size if size is None or size < 0 else self._position + size
+        end = min(end, self.size)
+        if end <= self._position:
+            return b""
+        with self.metrics.timer(MetricStages.DOWNLOAD.value):
+            response = self._client.get_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Range=f"bytes={self._position}-{end - 1}",
+            )
+            body = response["Body"].read()
+        self.requests += 1
+        self.metrics.incr(MetricCounters.BYTES_DOWNLOADED.value, len(body))
+        self._position += len(body)
+        return body
+
+    def readinto(self, buffer):
+        body = self.read(len(buffer))
+        buffer[: len(body)] = body
+        return len(body)
@@ -0,0 +1,168 @@
+"""
+CSV reader engines used to parse the source files
+"""
+from io import BytesIO
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+from epl.common.constants import ReaderEngines
+from epl.common.custom_exceptions import WrongFormatException
+from epl.common.schema import arrow_type
+
+
+def read_csv_bytes(
+    body: bytes,
+    engine: str = ReaderEngines.PANDAS_C.value,
+    encoding: str = "utf-8",
+    sep: str = ",",
+    schema: dict = None,
+):
+    """
+    Parses the content of a csv file with the chosen engine, declared
+    columns are read with their type instead of being inferred
+    :param body: content of the csv file
+    :param engine: pandas-c, pandas-pyarrow or pyarrow
+    :param encoding: encoding of the data inside the csv file
+    :param sep: seperator of the csv file
+    :param schema: dict of column name to arrow type name
+
+    returns:
+      data: Pandas DataFrame, or pyarrow Table for the pyarrow engine
+    """
+
+    schema = schema or {}
+    # blank cells are nulls, rows of blank cells only, e.g. a trailing ,,,,
+    # line, are dropped
+
+    if engine == ReaderEngines.PYARROW.value:
+        return read_csv_table(body, encoding, sep, schema)
+    if engine == ReaderEngines.PANDAS_PYARROW.value:
+        # pandas read_csv with the pyarrow engine infers declared columns
+        # before casting them, e.g. 15:00 to a time, so the table is read
+        # with the declared types and converted
+        return read_csv_table(body, encoding, sep, schema).to_pandas(
+            types_mapper=nullable_types_mapper
+        )
+    if engine == ReaderEngines.PANDAS_C.value:
+        return pd.read_csv(
+            BytesIO(body),
+            encoding=encoding,
+            sep=sep,
+            dtype={
+                name: nullable_dtype(arrow_type(type_name))
+                for name, type_name in schema.items()
+            },
+        ).dropna(how="all", ignore_index=True)
+    raise WrongFormatException(f"Unsupported reader engine {engine}")
+
+
+def read_csv_table(body: bytes, encoding: str, sep: str, schema: dict):
+    """
+    Parses the content of a csv file into a pyarrow Table with the
+    multithreaded pyarrow.csv reader, declared columns are not inferred
+    :param body: content of the csv file
+    :param encoding: encoding of the data inside the csv file
+    :param sep: seperator of the csv file
+    :param schema: dict of column name to arrow type name
+
+    returns:
+      table: pyarrow Table without blank rows
+    """
+
+    table = pacsv.read_csv(
+        BytesIO(body),
+        read_options=pacsv.ReadOptions(encoding=encoding, use_threads=True),
+        parse_options=pacsv.ParseOptions(delimiter=sep),
+        convert_options=pacsv.ConvertOptions(
+            column_types={
+                name: arrow_type(type_name) for name, type_name in schema.items()
+            },
+            # empty cells are nulls as with the pandas engines
+            strings_can_be_null=True,
+        ),
+    )
+    return drop_blank_rows(table)
+
+
+def nullable_dtype(data_type: pa.DataType):
+    """
+    Returns the pandas dtype of an arrow type for the pandas-c engine,
+    integers and booleans use the pandas nullable dtypes so blank cells
+    are read as NA instead of failing the file
+    :param data_type: pyarrow DataType
+
+    returns:
+      dtype: pandas or numpy dtype
+    """
+
+    if pa.types.is_integer(data_type):
+        prefix = "Int" if pa.types.is_signed_integer(data_type) else "UInt"
+        return f"{prefix}{data_type.bit_width}"
+    if pa.types.is_boolean(data_type):
+        return "boolean"
+    return data_type.to_pandas_dtype()
+
+
+def nullable_types_mapper(data_type: pa.DataType):
+    """
+    Types mapper of pyarrow Table.to_pandas keeping integers with nulls as
+    integers, as the pandas-c engine reads them, instead of floats
+    :param data_type: pyarrow DataType
+
+    returns:
+      dtype: pandas nullable dtype or None for the default conversion
+    """
+
+    if pa.types.is_integer(data_type) or pa.types.is_boolean(data_type):
+        return pd.api.types.pandas_dtype(nullable_dtype(data_type))
+    return None
+
+
+def drop_blank_rows(table: pa.Table):
+    """
+    Removes the rows of a pyarrow Table where every column is null
+    :param table: pyarrow Table
+
+    returns:
+      table: pyarrow Table without blank rows
+    """
+
+    if not table.num_columns:
+        return table
+    blank = pc.is_null(table.column(0))
+    for column in table.columns[1:]:
+        blank = pc.and_(blank, pc.is_null(column))
+    if not pc.any(blank).as_py():
+        return table
+    return table.filter(pc.invert(blank))
+
+
+def combine(frames: list):
+    """
+    Combines the parsed files into one Pandas DataFrame, arrow tables are
+    concatenated without copying their columns before the single conversion
+    :param frames: list of Pandas DataFrames or pyarrow Tables
+
+    returns:
+      data_frame: Pandas DataFrame containing the data of all the files
+    """
+
+    if not frames:
+        return pd.DataFrame()
+    if isinstance(frames[0], pa.Table):
+        try:
+            # integer and decimal files of one column are widened to floats
+            # as pandas.concat does
+            return pa.concat_tables(frames, promote_options="permissive").to_pandas(
+                types_mapper=nullable_types_mapper
+            )
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # an undeclared column inferred as numbers in one file and as
+            # strings in another, combined as the pandas engines do
+            frames = [
+                frame.to_pandas(types_mapper=nullable_types_mapper) for frame in frames
+            ]
+    return pd.concat(frames, ignore_index=True)
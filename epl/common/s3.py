@@ -1,22 +1,103 @@
 """ Connector and methods to access S3 resource """
 
 
+import json
 import logging
-import os
-from io import BytesIO, StringIO
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 
-import boto3
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from botocore.exceptions import BotoCoreError, ClientError
+
+from epl.common.cache import ObjectCache
+from epl.common.constants import (ManifestFormat, MetricCounters, MetricStages,
+                                  ReaderEngines, S3FileTypes)
+from epl.common.filters import (filter_columns, filter_mask, may_match,
+                                normalize_filters, row_group_statistics)
+from epl.common.listing import S3Listing
+from epl.common.meta_store import MetaStore
+from epl.common.metrics import Metrics
+from epl.common.multipart import MIN_PART_SIZE, S3MultipartWriter
+from epl.common.range_reader import S3RangeReader
+from epl.common.readers import combine, read_csv_bytes
+from epl.common.schema import apply_schema
+
+# S3 error codes worth retrying, anything else fails straight away
+RETRYABLE_ERROR_CODES = {
+    "InternalError",
+    "RequestTimeout",
+    "ServiceUnavailable",
+    "SlowDown",
+    "Throttling",
+}
+
+# connector of a parse worker process, set once when the worker starts
+_worker_connector = None
+
+
+def _init_parse_worker(connector):
+    """
+    Initializer of the parse worker processes, the connector is sent once
+    per worker instead of with every file
+    """
 
-from epl.common.constants import S3FileTypes
+    global _worker_connector
+    _worker_connector = connector
 
 
-class S3BucketConnector:
+def _parse_in_worker(key: str, engine: str, encoding: str, sep: str, transform):
+    """
+    Downloads, parses and transforms one file in a parse worker process. The
+    data is returned as an Arrow IPC stream, a flat buffer the parent reads
+    without copying instead of a pickled DataFrame
+
+    returns:
+      buffer: Arrow IPC stream of the parsed file
+      snapshot: metrics recorded while reading the file
+    """
+
+    connector = _worker_connector
+    connector.metrics.reset()
+    data = connector._read_object(key, engine, encoding, sep, transform)
+    if not isinstance(data, pa.Table):
+        data = pa.Table.from_pandas(data, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, data.schema) as writer:
+        writer.write_table(data)
+    return sink.getvalue(), connector.metrics.snapshot()
+
+
+class S3BucketConnector(S3Listing):
     """
     Class for interacting with S3 Buckets
     """
 
-    def __init__(self, access_key: str, secret_key: str, bucket: str):
+    def __init__(
+        self,
+        access_key: str,
+        secret_key: str,
+        bucket: str,
+        max_workers: int = 1,
+        retries: int = 3,
+        backoff: float = 0.5,
+        part_size: int = MIN_PART_SIZE,
+        engine: str = ReaderEngines.PANDAS_C.value,
+        schema: dict = None,
+        cache: ObjectCache = None,
+        upload_workers: int = 1,
+        endpoint_url: str = None,
+        max_pool_connections: int = 10,
+        retry_mode: str = "adaptive",
+        max_attempts: int = 5,
+        tcp_keepalive: bool = True,
+        metrics: Metrics = None,
+        parse_workers: int = 0,
+    ):
         """
         Constructor for S3BucketConnector
 
@@ -24,91 +105,501 @@ class S3BucketConnector:
         :param secret_key: secret key for accessing S3
         :param endpoint_url: endpoint url to S3
         :param bucket: S3 bucket name
+        :param max_workers: number of objects downloaded at the same time
+        :param retries: number of retries for a failed download
+        :param backoff: seconds to wait before the first retry, doubled each retry
+        :param part_size: size in bytes of the parts of multipart uploads
+        :param engine: csv reader engine, pandas-c, pandas-pyarrow or pyarrow
+        :param schema: dict of column name to arrow type name of the csv files
+        :param cache: ObjectCache of parsed objects, None downloads every object
+        :param upload_workers: number of multipart parts uploaded at the same time
+        :param max_pool_connections: size of the shared connection pool
+        :param retry_mode: botocore retry mode, legacy, standard or adaptive
+        :param max_attempts: maximum attempts of a request including retries
+        :param tcp_keepalive: keep pooled connections alive
+        :param metrics: Metrics recording stage timings and counters
+        :param parse_workers: number of processes parsing the files of a read,
+        0 or 1 parses in the download threads
         """
 
-        self._logger = logging.getLogger(__name__)
-        self.session = boto3.Session(
-            aws_access_key_id=os.environ[access_key],
-            aws_secret_access_key=os.environ[secret_key],
+        super().__init__(
+            access_key,
+            secret_key,
+            bucket,
+            endpoint_url=endpoint_url,
+            max_pool_connections=max_pool_connections,
+            retry_mode=retry_mode,
+            max_attempts=max_attempts,
+            tcp_keepalive=tcp_keepalive,
+            metrics=metrics,
         )
-        self._s3 = self.session.resource(service_name="s3")
-        self._bucket = self._s3.Bucket(bucket)
+        self._logger = logging.getLogger(__name__)
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.part_size = part_size
+        self.engine = engine
+        self.schema = schema
+        self.cache = cache
+        self.upload_workers = upload_workers
+        self.parse_workers = parse_workers
+        self._parse_pool = None
+        self._pool_lock = threading.Lock()
+
+    def __getstate__(self):
+        """
+        Only the constructor arguments are pickled so the connector can be
+        handed to a process pool, boto3 clients can not be pickled
+        """
 
-    def list_files_in_prefix(self, tgr_date: str):
+        return {
+            **self._client_config,
+            "access_key": self._access_key,
+            "secret_key": self._secret_key,
+            "bucket": self.bucket_name,
+            "max_workers": self.max_workers,
+            "retries": self.retries,
+            "backoff": self.backoff,
+            "part_size": self.part_size,
+            "engine": self.engine,
+            "schema": self.schema,
+            "cache": self.cache,
+            "upload_workers": self.upload_workers,
+            "metrics": self.metrics,
+            "parse_workers": self.parse_workers,
+        }
+
+    def __setstate__(self, state: dict):
+        """
+        Rebuilds the client in the unpickling process
+        """
+
+        self.__init__(**state)
+
+    def read_csv_list_combine_convert_to_df(
+        self,
+        key_list: list,
+        encoding: str = "utf-8",
+        sep: str = ",",
+        max_workers: int = None,
+        engine: str = None,
+        transform=None,
+    ):
         """
-        listing all files with a prefix on the S3 bucket with target date
+        Read a list of keys from the S3 bucket folder and returns a dataframe
 
-        :param tgr date: will obtain prefix on the S3 bucket filtered with tgr date, format: yyyy-mm-dd
+        :key_list: list of keys to combine
+        :encoding: encoding of the data inside the csv file
+        :sep: seperator of the csv file
+        :max_workers: number of concurrent downloads, defaults to the connector setting
+        :engine: pandas-c, pandas-pyarrow or pyarrow, defaults to the connector setting
+        :transform: TransformPipeline applied to each file before combining,
+        in the parse worker processes when parse_workers is above 1
 
         returns:
-          key: absolute path to files, list of all the file names containing the prefix in the key for that date
+          data_frame: Pandas DataFrame containing the data of the csv files combined
         """
 
-        try:
-            # return prefix/folder name for the target date
-            prefix = [
-                obj.key
-                for obj in self._bucket.objects.filter(Prefix="")
-                if S3FileTypes.CSV.value not in obj.key and tgr_date in obj.key
-            ]
-            # obtain files with above prefix/folder without root folder
-            files = [obj.key for obj in self._bucket.objects.filter(Prefix=prefix[0])]
+        key_list = key_list or []
+        max_workers = max_workers or self.max_workers
+        engine = engine or self.engine
+
+        def _read(obj):
+            return self._read_object(obj, engine, encoding, sep, transform)
+
+        if self.parse_workers > 1 and len(key_list) > 1:
+            # parsing runs on every core, the files come back as arrow tables
+            df_list = []
+            for buffer, snapshot in self._get_parse_pool().map(
+                partial(
+                    _parse_in_worker,
+                    engine=engine,
+                    encoding=encoding,
+                    sep=sep,
+                    transform=transform,
+                ),
+                key_list,
+            ):
+                self.metrics.merge(snapshot)
+                df_list.append(pa.ipc.open_stream(buffer).read_all())
+        elif max_workers <= 1 or len(key_list) <= 1:
+            df_list = [_read(obj) for obj in key_list]
+        else:
+            # map keeps the dataframes in the same order as key_list
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                df_list = list(pool.map(_read, key_list))
+
+        if len(df_list) == 0:
+            self._logger.info("Empty Folder")
+        with self.metrics.timer(MetricStages.COMBINE.value):
+            df2 = combine(df_list)
+        self.metrics.incr(MetricCounters.ROWS_READ.value, len(df2))
 
-            return files[1:]
-        except IndexError:
-            self._logger.info("List is empty")
-            files = None
+        return df2
 
-    def list_folders(self):
+    def read_parquet_list_combine_convert_to_df(
+        self, key_list: list, max_workers: int = None
+    ):
         """
-        List all folder in src bucket and check which folders require proccesing
+        Read a list of parquet files, e.g. compacted source files, and returns
+        a dataframe
+
+        :key_list: list of keys to combine
+        :max_workers: number of concurrent downloads, defaults to the connector setting
 
         returns:
-          files: list of all the folder names
+          data_frame: Pandas DataFrame containing the data of the parquet files combined
         """
 
-        # load meta data file and obtain list of folder updated
-        load_meta_data = self._bucket.Object(key="processed_data.csv").get().get("Body")
+        key_list = key_list or []
+        max_workers = max_workers or self.max_workers
+
+        def _read(key):
+            body = self._download_object(key)
+            with self.metrics.timer(MetricStages.PARSE.value):
+                return pq.read_table(pa.BufferReader(body))
+
+        if max_workers <= 1 or len(key_list) <= 1:
+            tables = [_read(key) for key in key_list]
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                tables = list(pool.map(_read, key_list))
+
+        with self.metrics.timer(MetricStages.COMBINE.value):
+            df = combine(tables)
+        self.metrics.incr(MetricCounters.ROWS_READ.value, len(df))
+        return df
+
+    def read_filtered(
+        self,
+        key_list: list,
+        columns: list = None,
+        filters: list = None,
+        max_workers: int = None,
+        chunksize: int = 100000,
+        encoding: str = "utf-8",
+        sep: str = ",",
+    ):
+        """
+        Reads only some columns and the matching rows of csv or parquet files,
+        e.g. the processed outputs or the files listed in a partition manifest.
+        Parquet files are read with byte range GETs of the footer and of the
+        column chunks of the row groups whose statistics can match the filters.
+        Csv files are streamed in chunks, keeping only the matching rows
+
+        :key_list: list of keys, parquet files end with .parquet
+        :columns: list of the returned columns, None returns every column
+        :filters: list of (column, operator, value) tuples that must all hold,
+        or list of lists of tuples of which one must hold, see FilterOperators
+        :max_workers: number of files read at the same time, defaults to the connector setting
+        :chunksize: number of rows per chunk of the csv files
+        :encoding: encoding of the data inside the csv files
+        :sep: seperator of the csv files
 
-        df = pd.read_csv(load_meta_data)
+        returns:
+          data_frame: Pandas DataFrame of the matching rows of the files combined
+        """
 
-        processed_list = df["folder"].tolist()
+        key_list = key_list or []
+        max_workers = max_workers or self.max_workers
+        filters = normalize_filters(filters)
+        needed = None
+        if columns is not None:
+            needed = list(dict.fromkeys([*columns, *filter_columns(filters)]))
+
+        def _read(key):
+            if key.endswith(f".{S3FileTypes.PARQUET.value}"):
+                df = self._read_parquet_filtered(key, needed, filters)
+            else:
+                df = self._read_csv_filtered(
+                    key, needed, filters, chunksize, encoding, sep
+                )
+            return df if columns is None else df[columns]
+
+        if max_workers <= 1 or len(key_list) <= 1:
+            df_list = [_read(key) for key in key_list]
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                df_list = list(pool.map(_read, key_list))
+
+        with self.metrics.timer(MetricStages.COMBINE.value):
+            df = combine(df_list)
+        self.metrics.incr(MetricCounters.ROWS_READ.value, len(df))
+        return df
+
+    def _read_parquet_filtered(self, key: str, columns: list, filters: list):
+        """
+        Helper function for self.read_filtered() reading the needed column
+        chunks of the row groups of a parquet file that can match the filters
+        """
 
-        # returns list of folder dates requiring processing
-        all_folders = [
-            obj.key.replace("football-", "").replace("/", "")
-            for obj in self._bucket.objects.filter(Prefix="")
-            if S3FileTypes.CSV.value not in obj.key
-            and obj.key.replace("football-", "").replace("/", "") not in processed_list
+        size = self._client.head_object(Bucket=self.bucket_name, Key=key)[
+            "ContentLength"
         ]
+        reader = S3RangeReader(
+            self._client, self.bucket_name, key, size, metrics=self.metrics
+        )
+        # pre buffering merges the ranges of neighbouring column chunks
+        parquet_file = pq.ParquetFile(reader, pre_buffer=True)
+        metadata = parquet_file.metadata
+        row_groups = [
+            index
+            for index in range(metadata.num_row_groups)
+            if may_match(row_group_statistics(metadata.row_group(index)), filters)
+        ]
+        with self.metrics.timer(MetricStages.PARSE.value):
+            df = parquet_file.read_row_groups(row_groups, columns=columns).to_pandas()
+        self.metrics.incr(MetricCounters.OBJECTS_DOWNLOADED.value)
+        self._logger.info(
+            f"Read {len(row_groups)} of {metadata.num_row_groups} row groups "
+            f"of {key} with {reader.requests} range requests"
+        )
+        return df[filter_mask(df, filters)].reset_index(drop=True)
+
+    def _read_csv_filtered(
+        self,
+        key: str,
+        columns: list,
+        filters: list,
+        chunksize: int,
+        encoding: str,
+        sep: str,
+    ):
+        """
+        Helper function for self.read_filtered() streaming a csv file and
+        keeping the needed columns of the matching rows of every chunk
+        """
+
+        chunks = []
+        for chunk in self.iter_csv_chunks(
+            key, chunksize, encoding=encoding, sep=sep, usecols=columns
+        ):
+            chunk = chunk[filter_mask(chunk, filters)]
+            # types are inferred per chunk, empty chunks would change them
+            if len(chunk) or not chunks:
+                chunks.append(chunk)
+        if len(chunks) > 1 and not len(chunks[0]):
+            chunks = chunks[1:]
+        if not chunks:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(chunks, ignore_index=True)
+
+    def _read_object(
+        self, key: str, engine: str, encoding: str, sep: str, transform=None
+    ):
+        """
+        Helper function for self.read_csv_list_combine_convert_to_df()
+        Reads a single file from the cache or the bucket and transforms it
 
-        return all_folders
+        :key: key of the csv file
+        :transform: TransformPipeline applied to the file, None keeps it as read
+        """
 
-    def read_csv_list_combine_convert_to_df(
-        self, key_list: list, encoding: str = "utf-8", sep: str = ","
+        if self.cache is not None:
+            data = self._read_cached(key, engine, encoding, sep)
+        else:
+            data = self._parse(self._download_object(key), engine, encoding, sep)
+        if transform is None:
+            return data
+        if isinstance(data, pa.Table):
+            data = data.to_pandas()
+        with self.metrics.timer(MetricStages.TRANSFORM.value):
+            return transform.run(data, self.metrics)
+
+    def _get_parse_pool(self):
+        """
+        Helper function starting the parse worker processes on first use, the
+        pool is kept for the following reads until self.close()
+        """
+
+        with self._pool_lock:
+            if self._parse_pool is None:
+                # spawned workers do not inherit the locks of the download threads
+                self._parse_pool = ProcessPoolExecutor(
+                    max_workers=self.parse_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_parse_worker,
+                    initargs=(self,),
+                )
+            return self._parse_pool
+
+    def close(self):
+        """
+        Stops the parse worker processes
+        """
+
+        with self._pool_lock:
+            if self._parse_pool is not None:
+                self._parse_pool.shutdown(wait=True)
+                self._parse_pool = None
+
+    def _read_cached(self, key: str, engine: str, encoding: str, sep: str):
+        """
+        Helper function for self.read_csv_list_combine_convert_to_df()
+        Returns the parsed object from the cache when its ETag is unchanged,
+        otherwise downloads, parses and caches it
+
+        :key: key of the csv file
+        """
+
+        signature = json.dumps([engine, encoding, sep, self.schema], sort_keys=True)
+        etag = self._etags.get(key)
+        if etag is None:
+            response = self._client.head_object(Bucket=self.bucket_name, Key=key)
+            etag = response["ETag"]
+
+        table = self.cache.get(key, etag, signature)
+        if table is not None:
+            if engine == ReaderEngines.PYARROW.value:
+                return table
+            return table.to_pandas()
+
+        try:
+            body = self._download_object(key, if_match=etag)
+        except ClientError as error:
+            code = error.response.get("Error", {}).get("Code")
+            if code not in ("PreconditionFailed", "412"):
+                raise
+            # changed since it was listed, read it without caching
+            self._etags.pop(key, None)
+            return self._parse(self._download_object(key), engine, encoding, sep)
+
+        data = self._parse(body, engine, encoding, sep)
+        if isinstance(data, pa.Table):
+            self.cache.put(key, etag, data, signature)
+        else:
+            table = pa.Table.from_pandas(data, preserve_index=False)
+            self.cache.put(key, etag, table, signature)
+        return data
+
+    def _parse(self, body: bytes, engine: str, encoding: str, sep: str):
+        """
+        Helper function parsing a downloaded csv file with the reader engine
+        """
+
+        with self.metrics.timer(MetricStages.PARSE.value):
+            return read_csv_bytes(body, engine, encoding, sep, self.schema)
+
+    def cache_stats(self):
+        """
+        Returns the hit and miss statistics of the object cache
+
+        returns:
+          stats: dict of hits, misses, entries and bytes or None without a cache
+        """
+
+        return None if self.cache is None else self.cache.stats()
+
+    def _download_object(self, key: str, if_match: str = None):
+        """
+        Helper function for self.read_csv_list_combine_convert_to_df()
+        Downloads a single object with retries and exponential backoff,
+        the low level client is used as it is safe to share between threads
+
+        :key: key of the csv file
+        :if_match: only download the object when its ETag matches
+
+        returns:
+          body: bytes of the object
+        """
+
+        conditions = {"IfMatch": if_match} if if_match else {}
+        for attempt in range(self.retries + 1):
+            try:
+                with self.metrics.timer(MetricStages.DOWNLOAD.value):
+                    response = self._client.get_object(
+                        Bucket=self.bucket_name, Key=key, **conditions
+                    )
+                    body = response["Body"].read()
+                self.metrics.incr(MetricCounters.OBJECTS_DOWNLOADED.value)
+                self.metrics.incr(MetricCounters.BYTES_DOWNLOADED.value, len(body))
+                return body
+            except (BotoCoreError, ClientError) as error:
+                if isinstance(error, ClientError):
+                    code = error.response.get("Error", {}).get("Code")
+                    if code not in RETRYABLE_ERROR_CODES:
+                        raise
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2**attempt
+                self.metrics.incr(MetricCounters.RETRIES.value)
+                self._logger.warning(
+                    f"Download of {key} failed, retrying in {delay}s: {error}"
+                )
+                time.sleep(delay)
+
+    def iter_csv_chunks(
+        self,
+        key: str,
+        chunksize: int,
+        encoding: str = "utf-8",
+        sep: str = ",",
+        usecols: list = None,
     ):
         """
-        Read a list of keys from the S3 bucket folder and returns a dataframe
+        Streams a csv file from the bucket in chunks of rows, only one
+        chunk is held in memory at a time
 
-        :key_list: list of keys to combine
+        :key: key of the csv file
+        :chunksize: number of rows per chunk
         :encoding: encoding of the data inside the csv file
         :sep: seperator of the csv file
+        :usecols: list of the parsed columns, None parses every column
 
         returns:
-          data_frame: Pandas DataFrame containing the data of the csv files combined
+          chunks: iterator of Pandas DataFrames
         """
 
-        df_list = [
-            pd.read_csv(self._bucket.Object(key=obj).get().get("Body"))
-            for obj in key_list
-        ]
+        response = self._client.get_object(Bucket=self.bucket_name, Key=key)
+        self.metrics.incr(MetricCounters.OBJECTS_DOWNLOADED.value)
+        self.metrics.incr(
+            MetricCounters.BYTES_DOWNLOADED.value, response["ContentLength"]
+        )
+        with pd.read_csv(
+            response["Body"],
+            chunksize=chunksize,
+            encoding=encoding,
+            sep=sep,
+            usecols=usecols,
+        ) as reader:
+            yield from reader
+
+    def iter_parquet_chunks(self, key: str, chunksize: int):
+        """
+        Reads a parquet file from the bucket in chunks of rows, the file is
+        downloaded as a whole and converted one chunk at a time
 
-        if len(df_list) == 0:
-            self._logger.info("Empty Folder")
-            return pd.DataFrame()
-        df2 = pd.concat(df_list, ignore_index=True)
+        :key: key of the parquet file
+        :chunksize: number of rows per chunk
 
-        return df2
+        returns:
+          chunks: iterator of Pandas DataFrames
+        """
+
+        parquet_file = pq.ParquetFile(pa.BufferReader(self._download_object(key)))
+        for batch in parquet_file.iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+
+    def open_multipart_writer(self, key: str, part_size: int = None):
+        """
+        Opens a writable file object uploading to the bucket in multipart parts
+
+        :key: target key of the saved file
+        :part_size: size of the parts in bytes, defaults to the connector setting
+
+        returns:
+          writer: S3MultipartWriter
+        """
+
+        self._invalidate(key)
+        return S3MultipartWriter(
+            self._client,
+            self.bucket_name,
+            key,
+            part_size=part_size or self.part_size,
+            max_workers=self.upload_workers,
+            metrics=self.metrics,
+        )
 
     def write_df_to_s3(self, data_frame: pd.DataFrame, key: str, file_format: str):
         """
@@ -122,41 +613,198 @@ class S3BucketConnector:
 
         key = f"{key}.{file_format}"
 
+        # serialized bytes are streamed into the upload parts as they are
+        # produced instead of being buffered and copied as a whole
+        # serialize includes the uploads the writer waits for
         if file_format == S3FileTypes.CSV.value:
-            out_buffer = StringIO()
-            data_frame.to_csv(out_buffer, index=False)
-            return self.__put_object(out_buffer, key)
+            with self.open_multipart_writer(key) as writer:
+                with self.metrics.timer(MetricStages.SERIALIZE.value):
+                    data_frame.to_csv(writer, index=False, mode="wb")
+            self.metrics.incr(MetricCounters.ROWS_WRITTEN.value, len(data_frame))
+            return True
         if file_format == S3FileTypes.PARQUET.value:
-            out_buffer = BytesIO()
-            data_frame.to_parquet(out_buffer, index=False)
-            return self.__put_object(out_buffer, key)
+            with self.open_multipart_writer(key) as writer:
+                with self.metrics.timer(MetricStages.SERIALIZE.value):
+                    data_frame.to_parquet(writer, index=False)
+            self.metrics.incr(MetricCounters.ROWS_WRITTEN.value, len(data_frame))
+            return True
+
+    def write_parquet_dataset(
+        self,
+        data_frame: pd.DataFrame,
+        key_prefix: str,
+        schema: dict = None,
+        compression: str = "snappy",
+        row_group_size: int = None,
+        use_dictionary: bool = True,
+        rows_per_file: int = None,
+    ):
+        """
+        writing a Pandas DataFrame to S3 as a partition of a parquet dataset,
+        files are written as key_prefix/part-N.parquet and part files left
+        over from an earlier write of the partition are removed
+
+        :data_frame: Pandas DataFrame that should be written
+        :key_prefix: partition prefix, e.g. data/date=2023-03-18
+        :schema: dict of column name to arrow type name
+        :compression: parquet compression codec
+        :row_group_size: maximum number of rows per row group
+        :use_dictionary: dictionary encode the columns
+        :rows_per_file: maximum number of rows per part file
 
-    def __put_object(self, out_buffer: StringIO or BytesIO, key: str):
+        returns:
+          keys: list of the written keys
         """
-        Helper function for self.write_df_to_s3()
 
-        :key: target key of the saved file
+        with self.metrics.timer(MetricStages.SERIALIZE.value):
+            table = apply_schema(
+                pa.Table.from_pandas(data_frame, preserve_index=False), schema
+            )
+        rows_per_file = rows_per_file or max(table.num_rows, 1)
+
+        keys = []
+        for part, offset in enumerate(range(0, max(table.num_rows, 1), rows_per_file)):
+            key = f"{key_prefix}/part-{part}.{S3FileTypes.PARQUET.value}"
+            with self.open_multipart_writer(key) as writer:
+                with self.metrics.timer(MetricStages.SERIALIZE.value):
+                    pq.write_table(
+                        table.slice(offset, rows_per_file),
+                        writer,
+                        compression=compression,
+                        row_group_size=row_group_size,
+                        use_dictionary=use_dictionary,
+                    )
+            keys.append(key)
+        self.metrics.incr(MetricCounters.ROWS_WRITTEN.value, table.num_rows)
+
+        self.commit_parts(key_prefix, keys)
+        return keys
+
+    def commit_parts(self, key_prefix: str, keys: list, **details):
+        """
+        Makes the given part files the content of a partition. The manifest
+        listing them is written once they all exist and only then are the
+        parts of an earlier write removed, so a reader going by the manifest
+        sees either the earlier or the new files, never a mix
+
+        :key_prefix: partition prefix, e.g. data/date=2023-03-18
+        :keys: list of the part keys of the partition
+        :details: further entries of the manifest
         """
 
-        self._logger.info(f"Writing file to {self._bucket.name}/{key}")
-        self._bucket.put_object(Body=out_buffer.getvalue(), Key=key)
-        return True
+        self.write_object(
+            json.dumps({ManifestFormat.MANIFEST_FILES.value: keys, **details}),
+            f"{key_prefix}/{ManifestFormat.MANIFEST_FILE.value}",
+        )
+        self.delete_stale_parts(key_prefix, keys)
 
-    def update_meta_file_to_s3(self, date_list: list):
+    def read_manifest(self, key_prefix: str):
         """
-        Make csv file of processed folders and save
-        :param: list of lists of processed dates
+        Reads the manifest of a partition
+
+        :key_prefix: partition prefix, e.g. data/date=2023-03-18
+
+        returns:
+          manifest: dict with the files of the partition or None without a manifest
+        """
+
+        body = self.read_object(f"{key_prefix}/{ManifestFormat.MANIFEST_FILE.value}")
+        return None if body is None else json.loads(body)
+
+    def delete_stale_parts(self, key_prefix: str, keys: list):
         """
-        meta_data = self._bucket.Object(key="processed_data.csv").get().get("Body")
+        Removes part files of a partition that are not in the given keys
 
-        df = pd.read_csv(meta_data)
+        :key_prefix: partition prefix, e.g. data/date=2023-03-18
+        :keys: list of the part keys to keep
+        """
 
-        df2 = pd.DataFrame(date_list, columns=["folder", "Processed date"])
+        stale = [
+            {"Key": obj["Key"]}
+            for page in self._paginate(Prefix=f"{key_prefix}/part-")
+            for obj in page.get("Contents", [])
+            if obj["Key"] not in keys
+        ]
+        if stale:
+            self._logger.info(f"Removing {len(stale)} stale parts of {key_prefix}")
+            self._client.delete_objects(
+                Bucket=self.bucket_name, Delete={"Objects": stale}
+            )
 
-        updated_df = pd.concat([df, df2], ignore_index=True)
+    def delete_keys(self, keys: list):
+        """
+        Removes objects with batched requests of up to 1000 keys, missing keys
+        are not an error
+
+        :keys: list of the keys to remove
+        """
+
+        keys = list(keys)
+        for offset in range(0, len(keys), 1000):
+            self._client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={
+                    "Objects": [{"Key": key} for key in keys[offset : offset + 1000]],
+                    "Quiet": True,
+                },
+            )
+        for key in keys:
+            self._invalidate(key)
+
+    def delete_object(self, key: str):
+        """
+        Removes an object, a missing key is not an error
+
+        :key: key of the object
+        """
 
-        out_buffer = StringIO()
+        self._client.delete_object(Bucket=self.bucket_name, Key=key)
+        self._invalidate(key)
 
-        updated_df.to_csv(out_buffer, index=False)
+    def write_object(
+        self,
+        body: str or bytes,
+        key: str,
+        if_match: str = None,
+        if_none_match: bool = False,
+    ):
+        """
+        Writes a body to the bucket as a single object
+
+        :body: content of the object
+        :key: target key of the saved file
+        :if_match: ETag the object must still have, the write fails with
+        PreconditionFailed otherwise
+        :if_none_match: True fails the write when the object already exists
+        """
+
+        self._logger.info(f"Writing file to {self.bucket_name}/{key}")
+        self._client.put_object(
+            Body=body,
+            Bucket=self.bucket_name,
+            Key=key,
+            **self.write_conditions(if_match, if_none_match),
+        )
+        self._invalidate(key)
+        return True
+
+    @staticmethod
+    def write_conditions(if_match: str = None, if_none_match: bool = False):
+        """
+        Returns the put_object arguments of a conditional write
+        """
+
+        if if_match is not None:
+            return {"IfMatch": if_match}
+        if if_none_match:
+            return {"IfNoneMatch": "*"}
+        return {}
+
+    def update_meta_file_to_s3(self, date_list: list):
+        """
+        Record processed folders in the meta store
+        :param: list of lists of processed dates
+        """
 
-        return self.__put_object(out_buffer, "processed_data.csv")
+        with self.metrics.timer(MetricStages.META_UPDATE.value):
+            return MetaStore(self).commit(date_list)
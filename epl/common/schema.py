@@ -0,0 +1,80 @@
+"""
+Column schema declared in the configuration
+"""
+import pyarrow as pa
+
+
+def arrow_type(type_name: str):
+    """
+    Returns the arrow type of a type name from the configuration
+    :param type_name: arrow type alias, e.g. string, int64, float64, bool, date32
+
+    returns:
+      data_type: pyarrow DataType
+    """
+
+    return pa.type_for_alias(type_name)
+
+
+def arrow_schema(columns: dict):
+    """
+    Builds an arrow schema from the declared columns
+    :param columns: dict of column name to type name in column order
+
+    returns:
+      schema: pyarrow Schema
+    """
+
+    return pa.schema(
+        [pa.field(name, arrow_type(type_name)) for name, type_name in columns.items()]
+    )
+
+
+def apply_schema(table: pa.Table, columns: dict = None):
+    """
+    Casts the declared columns of a table to their declared types, columns
+    missing from the declaration keep their inferred type, widened back when
+    they were compacted, see wide_type
+    :param table: pyarrow Table
+    :param columns: dict of column name to type name
+
+    returns:
+      table: pyarrow Table with the declared types
+    """
+
+    columns = columns or {}
+    target = pa.schema(
+        [
+            (
+                pa.field(field.name, arrow_type(columns[field.name]))
+                if field.name in columns
+                else pa.field(field.name, wide_type(field.type))
+            )
+            for field in table.schema
+        ]
+    )
+    if target.equals(table.schema):
+        return table
+    return table.cast(target)
+
+
+def wide_type(data_type: pa.DataType):
+    """
+    Returns the type a column had before dtype compaction, so files written
+    from compacted and plain DataFrames, or from chunks compacted to different
+    widths, share one schema
+    :param data_type: pyarrow DataType
+
+    returns:
+      data_type: value type of dictionaries, int64, float64 or string
+    """
+
+    if pa.types.is_dictionary(data_type):
+        data_type = data_type.value_type
+    if pa.types.is_signed_integer(data_type):
+        return pa.int64()
+    if pa.types.is_floating(data_type):
+        return pa.float64()
+    if pa.types.is_large_string(data_type):
+        return pa.string()
+    return data_type
@@ -0,0 +1,437 @@
+""" Per team season statistics merged incrementally from processed dates """
+import datetime
+import json
+import logging
+import time
+from io import BytesIO
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from botocore.exceptions import ClientError
+
+from epl.common.constants import AggregateFormat, MetricStages, S3FileTypes
+from epl.common.meta_store import MetaStore
+from epl.common.s3 import S3BucketConnector
+
+# additive statistics of a team, summed over the dates
+STAT_COLUMNS = [
+    "played",
+    "won",
+    "drawn",
+    "lost",
+    "goals_for",
+    "goals_against",
+    "points",
+]
+
+# points and result letter of a full time result seen from the home side
+HOME_RESULTS = {"H": ("W", 3), "D": ("D", 1), "A": ("L", 0)}
+AWAY_RESULTS = {"H": ("L", 0), "D": ("D", 1), "A": ("W", 3)}
+
+
+class TeamAggregates:
+    """
+    Keeps per team goals, points and form of every season in the target
+    bucket, the totals of a season under <prefix>/season=YYYY/, YYYY being
+    the year the season starts. Every processed date writes a partial with
+    the statistics of that date only, the totals are then updated by adding
+    the partials of the new dates, so an update costs the size of the new
+    dates, not of the season. A reprocessed date has its earlier partial
+    subtracted first.
+
+    Partials are written to a new key each time and the totals record which
+    partial of each date they contain, so a run failing between the writes
+    never subtracts a partial that was not added. The totals are written
+    conditioned on the ETag they were read with and merged again from a new
+    read when another run changed them in between
+    :param s3_bucket: S3BucketConnector of the bucket holding the aggregates
+    :param prefix: prefix of the aggregate keys
+    :param form_length: number of most recent results kept as form
+    :param season_start_month: month the dates of a new season start in
+    :param max_attempts: number of tries of a conflicting totals write
+    """
+
+    def __init__(
+        self,
+        s3_bucket: S3BucketConnector,
+        prefix: str = "aggregates",
+        form_length: int = 5,
+        season_start_month: int = 7,
+        max_attempts: int = 5,
+    ):
+        self.s3_bucket = s3_bucket
+        self.prefix = prefix
+        self.form_length = form_length
+        self.season_start_month = season_start_month
+        self.max_attempts = max_attempts
+        self._logger = logging.getLogger(__name__)
+
+    def season(self, day: str):
+        """
+        Returns the season of a date, the year it starts in
+
+        :param day: date, format: yyyy-mm-dd
+        """
+
+        year, month = int(day[:4]), int(day[5:7])
+        return str(year if month >= self.season_start_month else year - 1)
+
+    def totals_key(self, season: str):
+        """
+        Key of the totals of a season read by consumers
+
+        :param season: year the season starts in
+        """
+
+        return (
+            f"{self.prefix}/{AggregateFormat.AGG_SEASON_DIR.value}={season}/"
+            f"{AggregateFormat.AGG_TOTALS_FILE.value}"
+        )
+
+    def partial_prefix(self, day: str):
+        """
+        Prefix of the partials of a date
+        """
+
+        return f"{self.prefix}/{AggregateFormat.AGG_PARTIALS_DIR.value}/date={day}"
+
+    def partial(self, df: pd.DataFrame):
+        """
+        Computes the statistics of every team playing in the matches
+
+        :param df: transformed matches with the teams, goals and full time result
+
+        returns:
+          partial: DataFrame indexed by team with STAT_COLUMNS and results,
+          the result letters of the team in match order
+        """
+
+        # matches without a full time result, e.g. postponed, are skipped
+        if not df.empty:
+            df = df[df[AggregateFormat.AGG_RESULT_COL.value].isin(HOME_RESULTS)]
+        if df.empty:
+            return (
+                pd.DataFrame(
+                    {column: pd.Series(dtype="int64") for column in STAT_COLUMNS}
+                )
+                .assign(results=pd.Series(dtype="object"))
+                .rename_axis("team")
+            )
+
+        home_goals = df[AggregateFormat.AGG_HOME_GOALS_COL.value]
+        away_goals = df[AggregateFormat.AGG_AWAY_GOALS_COL.value]
+        result = df[AggregateFormat.AGG_RESULT_COL.value]
+        sides = []
+        for team_col, goals_for, goals_against, outcomes in [
+            (
+                AggregateFormat.AGG_HOME_TEAM_COL.value,
+                home_goals,
+                away_goals,
+                HOME_RESULTS,
+            ),
+            (
+                AggregateFormat.AGG_AWAY_TEAM_COL.value,
+                away_goals,
+                home_goals,
+                AWAY_RESULTS,
+            ),
+        ]:
+            letters = result.map({key: value[0] for key, value in outcomes.items()})
+            sides.append(
+                pd.DataFrame(
+                    {
+                        "team": df[team_col],
+                        "order": range(len(df)),
+                        "goals_for": goals_for,
+                        "goals_against": goals_against,
+                        "points": result.map(
+                            {key: value[1] for key, value in outcomes.items()}
+                        ),
+                        "won": letters == "W",
+                        "drawn": letters == "D",
+                        "lost": letters == "L",
+                        "results": letters,
+                    }
+                )
+            )
+        matches = pd.concat(sides, ignore_index=True).sort_values(
+            "order", kind="stable"
+        )
+        grouped = matches.groupby("team", sort=True)
+        partial = grouped[
+            ["won", "drawn", "lost", "goals_for", "goals_against", "points"]
+        ]
+        partial = partial.sum().astype("int64")
+        partial["played"] = grouped.size()
+        partial["results"] = grouped["results"].agg("".join)
+        return partial[STAT_COLUMNS + ["results"]]
+
+    def combine_partials(self, partials: list):
+        """
+        Combines the partials of the chunks of a date, in chunk order
+
+        :param partials: list of partial DataFrames
+
+        returns:
+          partial: DataFrame indexed by team
+        """
+
+        if not partials:
+            return self.partial(pd.DataFrame())
+        matches = pd.concat(partials)
+        grouped = matches.groupby(level=0, sort=True)
+        partial = grouped[STAT_COLUMNS].sum().astype("int64")
+        partial["results"] = grouped["results"].agg("".join)
+        return partial.rename_axis("team")
+
+    def write_partial(self, day: str, partial: pd.DataFrame):
+        """
+        Writes the partial of a date to a new key
+
+        :param day: processed date, format: yyyy-mm-dd
+        :param partial: partial DataFrame indexed by team
+
+        returns:
+          key: key of the written partial
+        """
+
+        run_id = datetime.datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        key = f"{self.partial_prefix(day)}/part-{run_id}.{S3FileTypes.PARQUET.value}"
+        with self.s3_bucket.open_multipart_writer(key) as writer:
+            pq.write_table(pa.Table.from_pandas(partial, preserve_index=True), writer)
+        return key
+
+    def read_totals(self, season: str):
+        """
+        Reads the totals of a season and the partial of every date they contain
+
+        :param season: year the season starts in
+
+        returns:
+          totals: DataFrame indexed by team with STAT_COLUMNS, form and form_dates
+          partials: dict of date to key of the partial added to the totals
+        """
+
+        return self._read_totals_with_etag(season)[:2]
+
+    def _read_totals_with_etag(self, season: str):
+        """
+        Helper function reading the totals of a season, the partials they
+        contain and the ETag of the totals object, None when not written yet
+        """
+
+        body, etag = self.s3_bucket.read_object_with_etag(self.totals_key(season))
+        if body is None:
+            totals = pd.DataFrame(
+                {column: pd.Series(dtype="int64") for column in STAT_COLUMNS}
+            ).rename_axis("team")
+            totals["form"] = pd.Series(dtype="object")
+            totals["form_dates"] = pd.Series(dtype="object")
+            return totals, {}, None
+
+        table = pq.read_table(BytesIO(body))
+        metadata = json.loads(
+            table.schema.metadata[AggregateFormat.AGG_METADATA_KEY.value.encode()]
+        )
+        totals = table.to_pandas()
+        totals["form_dates"] = totals["form_dates"].map(list)
+        return (
+            totals[STAT_COLUMNS + ["form", "form_dates"]],
+            metadata["partials"],
+            etag,
+        )
+
+    def merge(self, days: list):
+        """
+        Merges the newest partial of every date into the totals of its season
+
+        :param days: list of processed dates, format: yyyy-mm-dd
+
+        returns:
+          totals: dict of season to DataFrame of the written totals or None
+          when nothing changed
+        """
+
+        seasons = {}
+        for day in sorted(days):
+            seasons.setdefault(self.season(day), []).append(day)
+        written = {}
+        with self.s3_bucket.metrics.timer(MetricStages.AGGREGATE.value):
+            for season, season_days in seasons.items():
+                totals = self._merge_season(season, season_days)
+                if totals is not None:
+                    written[season] = totals
+        return written or None
+
+    def _merge_season(self, season: str, days: list):
+        """
+        Helper function for self.merge() updating the totals of one season,
+        read again and merged from the start when the conditional write of
+        the totals finds them changed by another run. Dates of the season
+        whose newest partial is not in the totals yet, e.g. of a run whose
+        merge failed, are merged as well
+        """
+
+        for attempt in range(1, self.max_attempts + 1):
+            totals, applied, etag = self._read_totals_with_etag(season)
+            latest = self._latest_partials(season)
+            days = sorted(
+                set(days)
+                | {day for day, key in latest.items() if key != applied.get(day)}
+            )
+            stats = totals[STAT_COLUMNS]
+            windows = {
+                team: list(zip(dates, form))
+                for team, dates, form in zip(
+                    totals.index, totals["form_dates"], totals["form"]
+                )
+            }
+
+            changed = False
+            for day in days:
+                key = latest.get(day)
+                if key is None or key == applied.get(day):
+                    continue
+                changed = True
+                if day in applied:
+                    old = self._read_partial(applied[day])
+                    stats = stats.sub(old[STAT_COLUMNS], fill_value=0)
+                    for team in old.index:
+                        windows[team] = [
+                            entry for entry in windows.get(team, []) if entry[0] != day
+                        ]
+                new = self._read_partial(key)
+                stats = stats.add(new[STAT_COLUMNS], fill_value=0)
+                for team, results in new["results"].items():
+                    windows[team] = sorted(
+                        windows.get(team, []) + [(day, letter) for letter in results],
+                        key=lambda entry: entry[0],
+                    )[-self.form_length :]
+                applied[day] = key
+
+            if not changed:
+                self._logger.info(f"Team aggregates of season {season} are up to date")
+                return None
+
+            stats = stats.astype("int64")
+            stats = stats[stats["played"] > 0]
+            self._refill_windows(stats, windows, applied)
+            try:
+                totals = self._write_totals(season, stats, windows, applied, etag)
+            except ClientError as error:
+                if not MetaStore.is_conflict(error) or attempt == self.max_attempts:
+                    raise
+                self._logger.info(
+                    f"Team aggregates of season {season} changed by another run, "
+                    f"try {attempt}"
+                )
+                time.sleep(MetaStore.backoff(attempt))
+                continue
+            for day in days:
+                if day in applied:
+                    self.s3_bucket.delete_stale_parts(
+                        self.partial_prefix(day), [applied[day]]
+                    )
+            return totals
+
+    def _refill_windows(self, stats: pd.DataFrame, windows: dict, applied: dict):
+        """
+        Helper function for self.merge() completing the form of teams that lost
+        results of a reprocessed date, from the partials of earlier dates
+        """
+
+        for team in stats.index:
+            window = windows.get(team, [])
+            missing = min(stats.at[team, "played"], self.form_length) - len(window)
+            if missing <= 0:
+                continue
+            oldest = window[0][0] if window else None
+            earlier = sorted(
+                (day for day in applied if oldest is None or day < oldest),
+                reverse=True,
+            )
+            for day in earlier:
+                partial = self._read_partial(applied[day])
+                if team in partial.index:
+                    window = [
+                        (day, letter) for letter in partial.at[team, "results"]
+                    ] + window
+                if len(window) >= self.form_length:
+                    break
+            windows[team] = window[-self.form_length :]
+
+    def _write_totals(
+        self,
+        season: str,
+        stats: pd.DataFrame,
+        windows: dict,
+        applied: dict,
+        etag: str = None,
+    ):
+        """
+        Helper function for self.merge() writing the totals of a season as one
+        object with the applied partials in the parquet metadata, only when
+        the object still has the ETag it was read with
+        """
+
+        totals = stats.copy()
+        totals["goal_difference"] = totals["goals_for"] - totals["goals_against"]
+        totals["form"] = [
+            "".join(letter for _, letter in windows.get(team, []))
+            for team in totals.index
+        ]
+        totals["form_dates"] = [
+            [day for day, _ in windows.get(team, [])] for team in totals.index
+        ]
+        totals = totals.sort_values(
+            ["points", "goal_difference", "goals_for"], ascending=False
+        ).rename_axis("team")
+
+        table = pa.Table.from_pandas(totals, preserve_index=True)
+        table = table.replace_schema_metadata(
+            {
+                **(table.schema.metadata or {}),
+                AggregateFormat.AGG_METADATA_KEY.value: json.dumps(
+                    {"partials": applied}
+                ),
+            }
+        )
+        # a season of totals is small, written in one conditional request
+        out_buffer = BytesIO()
+        pq.write_table(table, out_buffer)
+        self.s3_bucket.write_object(
+            out_buffer.getvalue(),
+            self.totals_key(season),
+            if_match=etag,
+            if_none_match=etag is None,
+        )
+        self._logger.info(
+            f"Team aggregates of season {season} updated to {max(applied)}"
+        )
+        return totals
+
+    def _latest_partials(self, season: str):
+        """
+        Helper function listing the partials of every date of a season with
+        a single listing of the partials prefix
+
+        returns:
+          keys: dict of date to the key of its newest partial
+        """
+
+        latest = {}
+        prefix = f"{self.prefix}/{AggregateFormat.AGG_PARTIALS_DIR.value}/date="
+        # partial keys end with their write time, the newest is listed last
+        for key in self.s3_bucket.list_keys(prefix):
+            day = key[len(prefix) :].split("/", 1)[0]
+            if self.season(day) == season:
+                latest[day] = key
+        return latest
+
+    def _read_partial(self, key: str):
+        """
+        Helper function reading a partial
+        """
+
+        return pq.read_table(BytesIO(self.s3_bucket.read_object(key))).to_pandas()
@@ -0,0 +1,142 @@
+""" File Transfomer running the dates on an asyncio event loop """
+import asyncio
+import logging
+
+from epl.common.async_s3 import AsyncS3BucketConnector
+from epl.common.constants import MetricStages, S3FileTypes
+from epl.common.metrics import Metrics
+from epl.transfomers.stages import TransformPipeline
+
+
+class AsyncETLExecutor:
+    """
+    Runs the ETL of many dates on one event loop, the listing, downloads and
+    uploads of the dates overlap while the connectors bound the number of
+    requests in flight and max_dates bounds the dates held in memory
+    :param src_dataframe: source AsyncS3BucketConnector
+    :param tgr_dataframe: target AsyncS3BucketConnector
+    :param file_format: output format, csv or parquet
+    :param schema: dict of column name to arrow type name of the output
+    :param parquet_options: compression, row_group_size, use_dictionary, rows_per_file
+    :param metrics: Metrics recording the transform time, defaults to the source one
+    :param transforms: list of transform stage configurations, None adds the
+    Is processed column
+    :param aggregates: TeamAggregates receiving a partial of every processed date
+    """
+
+    def __init__(
+        self,
+        src_dataframe: AsyncS3BucketConnector,
+        tgr_dataframe: AsyncS3BucketConnector,
+        file_format: str = S3FileTypes.CSV.value,
+        schema: dict = None,
+        parquet_options: dict = None,
+        metrics: Metrics = None,
+        transforms: list = None,
+        aggregates=None,
+    ):
+        self.src_dataframe = src_dataframe
+        self.tgr_dataframe = tgr_dataframe
+        self.file_format = file_format
+        self.schema = schema
+        self.parquet_options = parquet_options or {}
+        self.metrics = metrics or src_dataframe.metrics
+        self.pipeline = TransformPipeline.from_config(transforms)
+        self.aggregates = aggregates
+        self._logger = logging.getLogger(__name__)
+
+    async def transform(self, day):
+        """
+        Peforms the ETL operation on input file by date and
+        saves to output bucket
+        :param day: chosen date
+        """
+
+        key_list = await self.src_dataframe.list_files_in_prefix(day)
+        df = await self.src_dataframe.read_csv_list_combine_convert_to_df(key_list)
+        if not df.empty:
+            # transforms are cpu bound and run off the event loop
+            with self.metrics.timer(MetricStages.TRANSFORM.value):
+                df = await asyncio.to_thread(self.pipeline.run, df, self.metrics)
+            await self.write(df, day)
+        if self.aggregates is not None:
+            await asyncio.to_thread(self._write_partial, day, df)
+        return None
+
+    def _write_partial(self, day, df):
+        """
+        Helper function writing the team aggregate partial of a date
+        """
+
+        self.aggregates.write_partial(day, self.aggregates.partial(df))
+
+    async def write(self, df, day):
+        """
+        Writes the transformed data of a day in the configured output format
+        :param df: transformed dataframe
+        :param day: chosen date
+        """
+
+        if self.file_format == S3FileTypes.PARQUET.value:
+            return await self.tgr_dataframe.write_parquet_dataset(
+                df,
+                key_prefix=f"data/date={day}",
+                schema=self.schema,
+                **self.parquet_options,
+            )
+        return await self.tgr_dataframe.write_df_to_s3(
+            df,
+            key=f"data/processed-data-{day}",
+            file_format=S3FileTypes.CSV.value,
+        )
+
+    async def transform_dates(self, days: list, max_dates: int = 1):
+        """
+        Runs transform for every date, up to max_dates at the same time.
+        A failing date is logged and does not stop the remaining dates
+        :param days: list of dates to process
+        :param max_dates: number of dates processed at the same time
+
+        returns:
+          results: dict of date to True when processed or False when failed
+        """
+
+        slots = asyncio.Semaphore(max(max_dates, 1))
+
+        async def _run(day):
+            async with slots:
+                try:
+                    await self.transform(day)
+                    return True
+                except Exception:
+                    self._logger.exception(f"{day} Failed")
+                    return False
+
+        results = await asyncio.gather(*(_run(day) for day in days))
+        return dict(zip(days, results))
+
+
+async def run_async(
+    src_options: dict,
+    tgr_options: dict,
+    days: list,
+    max_dates: int = 1,
+    **executor_options,
+):
+    """
+    Opens the source and target connectors and runs the dates
+
+    :param src_options: arguments of the source AsyncS3BucketConnector
+    :param tgr_options: arguments of the target AsyncS3BucketConnector
+    :param days: list of dates to process
+    :param max_dates: number of dates processed at the same time
+    :param executor_options: arguments of AsyncETLExecutor
+
+    returns:
+      results: dict of date to True when processed or False when failed
+    """
+
+    async with AsyncS3BucketConnector(**src_options) as src:
+        async with AsyncS3BucketConnector(**tgr_options) as trg:
+            executor = AsyncETLExecutor(src, trg, **executor_options)
+            return await executor.transform_dates(days, max_dates)
@@ -0,0 +1,209 @@
+""" Compaction of the small files of a date into a few large parquet files """
+import datetime
+import logging
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from epl.common.constants import ManifestFormat, MetricStages, S3FileTypes
+from epl.common.s3 import S3BucketConnector
+from epl.common.schema import apply_schema
+
+
+class Compactor:
+    """
+    Merges the many small objects of a date into a few large parquet files,
+    so later reads of the date cost a few large GETs instead of one per file.
+
+    Source folders are compacted to <prefix>/date=YYYY-MM-DD/ next to the
+    untouched csv files, with a manifest recording the csv files and ETags
+    they were built from. Readers only use the compacted files while the
+    folder still holds exactly those csv files, a changed folder is read
+    from the csv files again. Parquet partitions of the output are compacted
+    in place. The manifest is written after the files and older files are
+    removed after the manifest, so readers switch from one set to the other
+    :param s3_bucket: S3BucketConnector of the bucket to compact
+    :param prefix: prefix of the compacted source folders
+    :param target_bytes: approximate size of the compacted files in memory
+    :param min_files: dates with fewer files are not compacted
+    :param compression: parquet compression codec
+    :param schema: dict of column name to arrow type name of the compacted files
+    :param quality_gate: QualityGate checking every csv file before it is
+    compacted, failing files are quarantined and left out of the compacted
+    files, the report of the checks is kept in the manifest
+    """
+
+    def __init__(
+        self,
+        s3_bucket: S3BucketConnector,
+        prefix: str = "compacted",
+        target_bytes: int = 134217728,
+        min_files: int = 2,
+        compression: str = "snappy",
+        schema: dict = None,
+        quality_gate=None,
+    ):
+        self.s3_bucket = s3_bucket
+        self.prefix = prefix
+        self.target_bytes = target_bytes
+        self.min_files = min_files
+        self.compression = compression
+        self.schema = schema
+        self.quality_gate = quality_gate
+        self._logger = logging.getLogger(__name__)
+
+    def date_prefix(self, day: str):
+        """
+        Prefix of the compacted files of a source folder
+        """
+
+        return f"{self.prefix}/date={day}"
+
+    def compacted_files(self, day: str, key_list: list = None):
+        """
+        Returns the compacted files of a source folder when they are up to date
+
+        :param day: folder date, format: yyyy-mm-dd
+        :param key_list: csv keys of the folder, listed when not given
+
+        returns:
+          keys: list of the compacted parquet keys or None when the folder
+          is not compacted or changed after the compaction
+        """
+
+        manifest = self.compacted_manifest(day, key_list)
+        if manifest is None:
+            return None
+        return manifest[ManifestFormat.MANIFEST_FILES.value]
+
+    def compacted_manifest(self, day: str, key_list: list = None):
+        """
+        Returns the manifest of the compacted files of a source folder when
+        they are up to date, with the files, their sources and the report
+        of the checks run before compacting
+
+        :param day: folder date, format: yyyy-mm-dd
+        :param key_list: csv keys of the folder, listed when not given
+
+        returns:
+          manifest: dict or None when the folder is not compacted or changed
+          after the compaction
+        """
+
+        manifest = self.s3_bucket.read_manifest(self.date_prefix(day))
+        if manifest is None:
+            return None
+        if key_list is None:
+            key_list = self.s3_bucket.list_files_in_prefix(day)
+        if manifest[ManifestFormat.MANIFEST_SOURCES.value] != self._sources(key_list):
+            self._logger.info(f"{day} changed after its compaction, reading csv files")
+            return None
+        return manifest
+
+    def compact_source(self, day: str):
+        """
+        Compacts the csv files of a source folder
+
+        :param day: folder date, format: yyyy-mm-dd
+
+        returns:
+          keys: list of the compacted keys or None when nothing was compacted
+        """
+
+        key_list = self.s3_bucket.list_files_in_prefix(day) or []
+        if len(key_list) < self.min_files:
+            self._logger.info(f"{day} has {len(key_list)} files, not compacted")
+            return None
+        if self.compacted_files(day, key_list) is not None:
+            self._logger.info(f"{day} is already compacted")
+            return None
+
+        details = {}
+        with self.s3_bucket.metrics.timer(MetricStages.COMPACT.value):
+            if self.quality_gate is None:
+                df = self.s3_bucket.read_csv_list_combine_convert_to_df(key_list)
+            else:
+                # checked file by file, a failing file is not compacted
+                report = self.quality_gate.new_report(day)
+                df = self.quality_gate.read(day, key_list, report)
+                details[ManifestFormat.MANIFEST_VALIDATION.value] = report
+            table = apply_schema(
+                pa.Table.from_pandas(df, preserve_index=False), self.schema
+            )
+            keys = self._write_files(table, self.date_prefix(day))
+            self.s3_bucket.commit_parts(
+                self.date_prefix(day),
+                keys,
+                **{
+                    ManifestFormat.MANIFEST_SOURCES.value: self._sources(key_list),
+                    ManifestFormat.MANIFEST_ROWS.value: table.num_rows,
+                },
+                **details,
+            )
+        self._logger.info(f"{day} compacted from {len(key_list)} to {len(keys)} files")
+        return keys
+
+    def compact_partition(self, key_prefix: str):
+        """
+        Compacts the part files of a parquet partition in place
+
+        :param key_prefix: partition prefix, e.g. data/date=2023-03-18
+
+        returns:
+          keys: list of the compacted keys or None when nothing was compacted
+        """
+
+        manifest = self.s3_bucket.read_manifest(key_prefix)
+        if manifest is not None:
+            parts = manifest[ManifestFormat.MANIFEST_FILES.value]
+        else:
+            parts = self.s3_bucket.list_keys(f"{key_prefix}/part-")
+        if len(parts) < self.min_files:
+            self._logger.info(f"{key_prefix} has {len(parts)} parts, not compacted")
+            return None
+
+        with self.s3_bucket.metrics.timer(MetricStages.COMPACT.value):
+            table = pa.concat_tables(
+                [
+                    pq.read_table(pa.BufferReader(self.s3_bucket.read_object(key)))
+                    for key in parts
+                ],
+                promote_options="default",
+            )
+            keys = self._write_files(table, key_prefix)
+            self.s3_bucket.commit_parts(
+                key_prefix, keys, **{ManifestFormat.MANIFEST_ROWS.value: table.num_rows}
+            )
+        self._logger.info(
+            f"{key_prefix} compacted from {len(parts)} to {len(keys)} parts"
+        )
+        return keys
+
+    def _write_files(self, table: pa.Table, key_prefix: str):
+        """
+        Helper function writing a table as files of about target_bytes, under
+        names not used before so the earlier files stay readable meanwhile
+        """
+
+        rows_per_file = max(
+            1, table.num_rows * self.target_bytes // max(table.nbytes, 1)
+        )
+        run_id = datetime.datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        keys = []
+        for part, offset in enumerate(range(0, max(table.num_rows, 1), rows_per_file)):
+            key = f"{key_prefix}/part-{run_id}-{part}.{S3FileTypes.PARQUET.value}"
+            with self.s3_bucket.open_multipart_writer(key) as writer:
+                pq.write_table(
+                    table.slice(offset, rows_per_file),
+                    writer,
+                    compression=self.compression,
+                )
+            keys.append(key)
+        return keys
+
+    def _sources(self, key_list: list):
+        """
+        Helper function returning the ETag of every csv file of a folder
+        """
+
+        return {key: self.s3_bucket.etag(key) for key in sorted(key_list or [])}
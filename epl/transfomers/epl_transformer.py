@@ -1,8 +1,56 @@
 """ File Transfomer """
 import datetime
 import logging
+import multiprocessing
+import threading
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor,
+                                as_completed)
+from io import BytesIO
 
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from epl.common.checkpoints import CheckpointStore
+from epl.common.constants import (CheckpointFormat, ExecutorTypes,
+                                  ManifestFormat, MetricCounters, MetricStages,
+                                  S3FileTypes)
+from epl.common.metrics import Metrics
 from epl.common.s3 import S3BucketConnector
+from epl.common.schema import apply_schema
+from epl.transfomers.compaction import Compactor
+from epl.transfomers.stages import TransformPipeline
+from epl.transfomers.validation import QualityGate
+
+
+def _transform_day(executor, day: str):
+    """
+    Module level helper so a single date can be sent to a process pool
+    """
+
+    return executor.transform(day)
+
+
+def _transform_day_in_process(executor, day: str):
+    """
+    Module level helper running a single date in a worker process, the
+    metrics of the pickled executor start empty there, so the values the
+    process recorded are returned for the parent to add to its own
+    """
+
+    executor.transform(day)
+    recorded = Metrics()
+    distinct = {
+        id(metrics): metrics
+        for metrics in (
+            executor.metrics,
+            executor.src_dataframe.metrics,
+            executor.tgr_dataframe.metrics,
+        )
+    }
+    for metrics in distinct.values():
+        recorded.merge(metrics.snapshot())
+    return recorded.snapshot()
 
 
 class ETLExecutor:
@@ -10,13 +58,49 @@ class ETLExecutor:
     Reads input dataframe, manipulates and then returns updated dataframe
     :param src_dataframe: source dataframe connection
     :param tgr_dataframe: target dataframe connection
+    :param chunksize: rows per chunk to stream source files, None loads the day
+    :param file_format: output format, csv or parquet
+    :param schema: dict of column name to arrow type name of the output
+    :param parquet_options: compression, row_group_size, use_dictionary, rows_per_file
+    :param metrics: Metrics recording the transform time, defaults to the source one
+    :param transforms: list of transform stage configurations, None adds the
+    Is processed column
+    :param aggregates: TeamAggregates receiving a partial of every processed date
+    :param checkpoints: CheckpointStore recording the finished source objects
+    of a date so a restarted run resumes it, None processes a date as a whole
+    :param compactor: Compactor of the source bucket, dates with up to date
+    compacted files are read from those instead of the csv files
+    :param quality_gate: QualityGate checking every source file before it is
+    combined, failing files are quarantined instead of written
     """
 
     def __init__(
-        self, src_dataframe: S3BucketConnector, tgr_dataframe: S3BucketConnector
+        self,
+        src_dataframe: S3BucketConnector,
+        tgr_dataframe: S3BucketConnector,
+        chunksize: int = None,
+        file_format: str = S3FileTypes.CSV.value,
+        schema: dict = None,
+        parquet_options: dict = None,
+        metrics: Metrics = None,
+        transforms: list = None,
+        aggregates=None,
+        checkpoints: CheckpointStore = None,
+        compactor: Compactor = None,
+        quality_gate: QualityGate = None,
     ):
         self.src_dataframe = src_dataframe
         self.tgr_dataframe = tgr_dataframe
+        self.chunksize = chunksize
+        self.file_format = file_format
+        self.schema = schema
+        self.parquet_options = parquet_options or {}
+        self.metrics = metrics or src_dataframe.metrics
+        self.pipeline = TransformPipeline.from_config(transforms)
+        self.aggregates = aggregates
+        self.checkpoints = checkpoints
+        self.compactor = compactor
+        self.quality_gate = quality_gate
         self._logger = logging.getLogger(__name__)
 
     def transform(self, day):
@@ -27,27 +111,455 @@ class ETLExecutor:
         """
 
         key_list = self.src_dataframe.list_files_in_prefix(day)
+        quarantined = {}
+        if self.compactor is not None:
+            manifest = self.compactor.compacted_manifest(day, key_list)
+            if manifest is not None:
+                key_list = manifest[ManifestFormat.MANIFEST_FILES.value]
+                quarantined = self._compacted_quarantine(day, manifest)
         self._logger.debug("Load Completed")
-        df = self.src_dataframe.read_csv_list_combine_convert_to_df(key_list)
+        if self.chunksize:
+            # chunks are checked and transformed on their own, stages such as
+            # dedup, the quality gate and checkpoints need the whole date
+            if self.pipeline.row_local and (
+                self.quality_gate is None and self.checkpoints is None
+            ):
+                return self.transform_streaming(day, key_list)
+            self._logger.info("Date needs the whole data, chunksize not used")
+        if self.checkpoints is not None:
+            if self.pipeline.row_local:
+                return self.transform_checkpointed(day, key_list, quarantined)
+            self._logger.info("Transforms need the whole date, checkpoints not used")
+        # with parse worker processes every file is also transformed there,
+        # unless a stage such as dedup needs the whole day
+        transform_files = (
+            self.src_dataframe.parse_workers > 1 and self.pipeline.row_local
+        )
+        report = self._new_report(day, quarantined)
+        df = self._read_sources(
+            key_list,
+            transform=self.pipeline if transform_files else None,
+            report=report,
+        )
         self._logger.debug("Combining Completed")
-        _df = self.transformer(df)
+        if df.empty:
+            self._write_partial(day, df)
+            self._write_report(report)
+            return None
+        if transform_files:
+            _df = df
+        else:
+            with self.metrics.timer(MetricStages.TRANSFORM.value):
+                _df = self.transformer(df)
         self._logger.debug("Transforming complete")
-        if not df.empty:
-            self.tgr_dataframe.write_df_to_s3(
-                _df,
-                key=f"data/processed-data-{day}",
-                file_format="csv",
+        self.write(_df, day)
+        self._write_partial(day, _df)
+        self._write_report(report)
+        return None
+
+    def transform_streaming(self, day, key_list: list):
+        """
+        Peforms the ETL operation one chunk at a time, each chunk of each
+        source file is transformed and written to a multipart upload so peak
+        memory depends on the chunk and part size, not on the size of the day.
+        The first chunk sets the output columns
+        :param day: chosen date
+        :param key_list: list of source file keys of the day
+        """
+
+        parquet = self.file_format == S3FileTypes.PARQUET.value
+        if parquet:
+            key = f"data/date={day}/part-0.{S3FileTypes.PARQUET.value}"
+        else:
+            key = f"data/processed-data-{day}.{S3FileTypes.CSV.value}"
+        options = self.parquet_options
+
+        parquet_writer = None
+        chunks = []
+        with self.tgr_dataframe.open_multipart_writer(key) as writer:
+            for _chunk in self._iter_transformed_chunks(key_list):
+                if self.aggregates is not None:
+                    chunks.append(self.aggregates.partial(_chunk))
+                self.metrics.incr(MetricCounters.ROWS_WRITTEN.value, len(_chunk))
+                if not parquet:
+                    header = writer.bytes_written == 0
+                    with self.metrics.timer(MetricStages.SERIALIZE.value):
+                        writer.write(_chunk.to_csv(index=False, header=header))
+                    continue
+                with self.metrics.timer(MetricStages.SERIALIZE.value):
+                    table = apply_schema(
+                        pa.Table.from_pandas(_chunk, preserve_index=False),
+                        self.schema,
+                    )
+                    if parquet_writer is None:
+                        parquet_writer = pq.ParquetWriter(
+                            writer,
+                            table.schema,
+                            compression=options.get("compression", "snappy"),
+                            use_dictionary=options.get("use_dictionary", True),
+                        )
+                    parquet_writer.write_table(
+                        table.cast(parquet_writer.schema),
+                        row_group_size=options.get("row_group_size"),
+                    )
+            if parquet_writer is not None:
+                with self.metrics.timer(MetricStages.SERIALIZE.value):
+                    parquet_writer.close()
+            if writer.bytes_written == 0:
+                # nothing to write for an empty day
+                writer.abort()
+        if parquet and writer.bytes_written:
+            self.tgr_dataframe.commit_parts(f"data/date={day}", [key])
+        if self.aggregates is not None:
+            self.aggregates.write_partial(day, self.aggregates.combine_partials(chunks))
+        self._logger.debug("Streaming transform complete")
+        return None
+
+    def transform_checkpointed(self, day, key_list: list, quarantined: dict = None):
+        """
+        Peforms the ETL operation one source object at a time, each object is
+        transformed, written to its own part and recorded in the checkpoint
+        manifest of the date, so a restarted run skips the finished objects.
+        Parquet parts are written to the date partition as one part per
+        source object, csv parts are staged and assembled into the csv file
+        of the date once every object is done. An object replaced since its
+        checkpoint, with another ETag, is done again
+        :param day: chosen date
+        :param key_list: list of source file keys of the day
+        :param quarantined: dict of source key to failures of the files left
+        out of the compacted files read
+        """
+
+        key_list = sorted(key_list or [])
+        etags = {key: self.src_dataframe.etag(key) for key in key_list}
+        manifest = {
+            key: entry
+            for key, entry in self.checkpoints.load(day).items()
+            if key in etags
+            and entry.get(CheckpointFormat.CHECKPOINT_ETAG.value) == etags[key]
+        }
+        partials = {}
+        lock = threading.Lock()
+        report = self._new_report(day, quarantined)
+
+        def _run(key):
+            df = self._read_sources([key], report=report)
+            with self.metrics.timer(MetricStages.TRANSFORM.value):
+                _df = self.transformer(df)
+            part = None
+            if not _df.empty:
+                part = self._part_key(day, key)
+                self._write_part(_df, part)
+            if self.aggregates is not None:
+                partials[key] = self.aggregates.partial(_df)
+            with lock:
+                manifest[key] = {
+                    CheckpointFormat.CHECKPOINT_PART.value: part,
+                    CheckpointFormat.CHECKPOINT_ROWS.value: len(_df),
+                    CheckpointFormat.CHECKPOINT_ETAG.value: etags[key],
+                }
+                self.checkpoints.save(day, manifest)
+
+        todo = [key for key in key_list if key not in manifest]
+        # objects finishing after a failed one are still recorded
+        with ThreadPoolExecutor(max_workers=self.src_dataframe.max_workers) as pool:
+            list(pool.map(_run, todo))
+
+        parts = [
+            manifest[key][CheckpointFormat.CHECKPOINT_PART.value]
+            for key in key_list
+            if manifest[key][CheckpointFormat.CHECKPOINT_PART.value]
+        ]
+        if self.file_format == S3FileTypes.PARQUET.value:
+            self.tgr_dataframe.commit_parts(f"data/date={day}", parts)
+        elif parts:
+            self._assemble_csv(day, parts)
+
+        if self.aggregates is not None:
+            for key in key_list:
+                if key not in partials:
+                    part = manifest[key][CheckpointFormat.CHECKPOINT_PART.value]
+                    partials[key] = self.aggregates.partial(
+                        self._read_part(part) if part else pd.DataFrame()
+                    )
+            self.aggregates.write_partial(
+                day,
+                self.aggregates.combine_partials([partials[key] for key in key_list]),
             )
+        self._write_report(report)
+        self.checkpoints.clear(day)
+        self._logger.debug("Checkpointed transform complete")
+        return None
+
+    @staticmethod
+    def _is_parquet(key: str):
+        """
+        Helper function telling compacted source files from csv files
+        """
+
+        return key.endswith(f".{S3FileTypes.PARQUET.value}")
+
+    def _new_report(self, day, quarantined: dict = None):
+        """
+        Helper function starting the validation report of a date, None
+        without a quality gate. Files quarantined when the compacted files
+        read were built are reported again, they are not in those files
+        """
+
+        if self.quality_gate is None:
             return None
+        report = self.quality_gate.new_report(day)
+        report["files"] += len(quarantined or {})
+        report["quarantined"].update(quarantined or {})
+        return report
 
-    def transformer(self, df):
+    def _compacted_quarantine(self, day, manifest: dict):
         """
-        Transforms data by adding additional coloumn
-        :param df: input dataframe
+        Helper function returning the files left out of the compacted files
+        of a date because they failed the checks, logged on every read
+        """
+
+        validation = manifest.get(ManifestFormat.MANIFEST_VALIDATION.value) or {}
+        quarantined = validation.get("quarantined", {})
+        if quarantined:
+            self._logger.warning(
+                f"{day} read from compacted files without {len(quarantined)} "
+                f"quarantined files: {', '.join(sorted(quarantined))}"
+            )
+        return quarantined
+
+    def _write_report(self, report: dict):
+        """
+        Helper function writing the validation report of a date
+        """
+
+        if report is not None:
+            self.quality_gate.write_report(report)
 
-        returns: dataframe with additional column
+    def _read_sources(self, key_list: list, transform=None, report: dict = None):
+        """
+        Helper function reading the source files of a date, through the
+        quality gate when a validation report is given, file by file or row
+        by row for compacted files
+        :param key_list: list of source file keys
+        :param transform: TransformPipeline applied to the files
+        :param report: validation report of the date
         """
 
-        df["Is processed"] = True
+        if report is None:
+            return self._read_files(key_list, transform)
+        if key_list and all(self._is_parquet(key) for key in key_list):
+            # compacted files hold many source files, checked row by row
+            df = self.quality_gate.read_rows(
+                report["date"], key_list, report, self._read_files
+            )
+        else:
+            df = self.quality_gate.read(
+                report["date"], key_list, report, self._read_files
+            )
+        if transform is not None and not df.empty:
+            with self.metrics.timer(MetricStages.TRANSFORM.value):
+                df = transform.run(df, self.metrics)
+        return df
+
+    def _read_files(self, key_list: list, transform=None):
+        """
+        Helper function reading the csv or compacted parquet files of a date
+        :param key_list: list of source file keys
+        :param transform: TransformPipeline applied to the files
+        """
 
+        if not key_list or not all(self._is_parquet(key) for key in key_list):
+            return self.src_dataframe.read_csv_list_combine_convert_to_df(
+                key_list, transform=transform
+            )
+        df = self.src_dataframe.read_parquet_list_combine_convert_to_df(key_list)
+        if transform is not None:
+            with self.metrics.timer(MetricStages.TRANSFORM.value):
+                df = transform.run(df, self.metrics)
         return df
+
+    def _part_key(self, day, source_key: str):
+        """
+        Helper function returning the part key of a source object, in the
+        date partition for parquet and staged with the checkpoints for csv
+        """
+
+        if self.file_format == S3FileTypes.PARQUET.value:
+            return f"data/date={day}/{CheckpointStore.part_name(source_key)}"
+        return self.checkpoints.staged_part_key(day, source_key)
+
+    def _write_part(self, df, key: str):
+        """
+        Helper function writing the transformed rows of a source object as parquet
+        """
+
+        options = self.parquet_options
+        with self.metrics.timer(MetricStages.SERIALIZE.value):
+            table = apply_schema(
+                pa.Table.from_pandas(df, preserve_index=False), self.schema
+            )
+        with self.tgr_dataframe.open_multipart_writer(key) as writer:
+            with self.metrics.timer(MetricStages.SERIALIZE.value):
+                pq.write_table(
+                    table,
+                    writer,
+                    compression=options.get("compression", "snappy"),
+                    row_group_size=options.get("row_group_size"),
+                    use_dictionary=options.get("use_dictionary", True),
+                )
+        self.metrics.incr(MetricCounters.ROWS_WRITTEN.value, table.num_rows)
+
+    def _read_part(self, key: str):
+        """
+        Helper function reading a written part
+        """
+
+        return pq.read_table(BytesIO(self.tgr_dataframe.read_object(key))).to_pandas()
+
+    def _assemble_csv(self, day, parts: list):
+        """
+        Helper function streaming the staged parts of a date into its csv
+        file, one part in memory at a time, with the columns of the first part
+        """
+
+        key = f"data/processed-data-{day}.{S3FileTypes.CSV.value}"
+        columns = None
+        with self.tgr_dataframe.open_multipart_writer(key) as writer:
+            for part in parts:
+                df = self._read_part(part)
+                if columns is None:
+                    columns = list(df.columns)
+                with self.metrics.timer(MetricStages.SERIALIZE.value):
+                    writer.write(
+                        df.reindex(columns=columns).to_csv(
+                            index=False, header=writer.bytes_written == 0
+                        )
+                    )
+
+    def _write_partial(self, day, df):
+        """
+        Helper function writing the team aggregate partial of a date once its
+        output is written, an empty date writes an empty partial so a
+        reprocessed date that became empty is merged too
+        :param day: chosen date
+        :param df: transformed dataframe of the date
+        """
+
+        if self.aggregates is not None:
+            self.aggregates.write_partial(day, self.aggregates.partial(df))
+
+    def _iter_transformed_chunks(self, key_list: list):
+        """
+        Helper function for self.transform_streaming() yielding the transformed
+        chunks of every source file with the columns of the first chunk
+        """
+
+        columns = None
+        for key in key_list or []:
+            if self._is_parquet(key):
+                chunks = self.src_dataframe.iter_parquet_chunks(key, self.chunksize)
+            else:
+                chunks = self.src_dataframe.iter_csv_chunks(key, self.chunksize)
+            for chunk in chunks:
+                if chunk.empty:
+                    continue
+                self.metrics.incr(MetricCounters.ROWS_READ.value, len(chunk))
+                with self.metrics.timer(MetricStages.TRANSFORM.value):
+                    _chunk = self.transformer(chunk)
+                if columns is None:
+                    columns = list(_chunk.columns)
+                yield _chunk.reindex(columns=columns)
+
+    def write(self, df, day):
+        """
+        Writes the transformed data of a day in the configured output format,
+        csv to data/processed-data-{day}.csv or parquet partitioned as
+        data/date={day}/part-N.parquet
+        :param df: transformed dataframe
+        :param day: chosen date
+        """
+
+        if self.file_format == S3FileTypes.PARQUET.value:
+            return self.tgr_dataframe.write_parquet_dataset(
+                df,
+                key_prefix=f"data/date={day}",
+                schema=self.schema,
+                **self.parquet_options,
+            )
+        return self.tgr_dataframe.write_df_to_s3(
+            df,
+            key=f"data/processed-data-{day}",
+            file_format=S3FileTypes.CSV.value,
+        )
+
+    def transform_dates(
+        self,
+        days: list,
+        max_workers: int = 1,
+        executor_type: str = ExecutorTypes.THREAD.value,
+    ):
+        """
+        Runs transform for every date, independent dates run at the same time
+        on a bounded worker pool. A failing date is logged and does not stop
+        the remaining dates
+        :param days: list of dates to process
+        :param max_workers: size of the worker pool, 1 runs the dates in turn
+        :param executor_type: thread or process pool
+
+        returns:
+          results: dict of date to True when processed or False when failed
+        """
+
+        results = {}
+
+        if max_workers <= 1 or len(days) <= 1:
+            for day in days:
+                try:
+                    self.transform(day)
+                    results[day] = True
+                except Exception:
+                    self._logger.exception(f"{day} Failed")
+                    results[day] = False
+            return results
+
+        run_day = _transform_day
+        if executor_type == ExecutorTypes.THREAD.value:
+            pool = ThreadPoolExecutor(max_workers=max_workers)
+        elif executor_type == ExecutorTypes.PROCESS.value:
+            run_day = _transform_day_in_process
+            # spawned workers build their own clients, forked ones would share
+            # the pooled connections of the parent
+            pool = ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            raise ValueError(f"Unsupported executor type {executor_type}")
+
+        with pool:
+            futures = {pool.submit(run_day, self, day): day for day in days}
+            for future in as_completed(futures):
+                day = futures[future]
+                try:
+                    snapshot = future.result()
+                    if snapshot is not None:
+                        # stage timings and counters of a worker process
+                        self.metrics.merge(snapshot)
+                    results[day] = True
+                except Exception:
+                    self._logger.exception(f"{day} Failed")
+                    results[day] = False
+
+        # keep the results in the order the dates were given
+        return {day: results[day] for day in days}
+
+    def transformer(self, df):
+        """
+        Transforms data with the configured transform stages, by default
+        adding the Is processed column
+        :param df: input dataframe
+
+        returns: transformed dataframe
+        """
+
+        return self.pipeline.run(df, self.metrics)
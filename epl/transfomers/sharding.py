@@ -0,0 +1,273 @@
+""" Sharded runs of the execution list over several workers """
+import datetime
+import json
+import logging
+import time
+
+from epl.common.constants import LeaseFormat, MetaProcessFormat
+from epl.common.leases import LeaseStore
+from epl.common.s3 import S3BucketConnector
+from epl.transfomers.aggregates import TeamAggregates
+from epl.transfomers.epl_transformer import ETLExecutor
+
+
+class ShardPlan:
+    """
+    Splits the execution list into shards of consecutive dates, kept as
+    objects under <prefix>/shards/ of the source bucket, so workers on
+    several machines can take them. A finished shard gets a done marker with
+    the result of every date. Publishing a new plan removes the finished
+    shards of the previous one and keeps the shards still in progress
+    :param s3_bucket: S3BucketConnector of the source bucket
+    :param prefix: prefix of the shard, done and lease objects
+    """
+
+    def __init__(self, s3_bucket: S3BucketConnector, prefix: str = "leases"):
+        self.s3_bucket = s3_bucket
+        self.prefix = prefix
+        self._logger = logging.getLogger(__name__)
+
+    def shard_key(self, name: str):
+        """
+        Key of the object listing the dates of a shard
+        """
+
+        return f"{self.prefix}/{LeaseFormat.LEASE_SHARDS_DIR.value}/{name}.json"
+
+    def done_key(self, name: str):
+        """
+        Key of the done marker of a shard
+        """
+
+        return f"{self.prefix}/{LeaseFormat.LEASE_DONE_DIR.value}/{name}.json"
+
+    @staticmethod
+    def split(days: list, shard_size: int):
+        """
+        Splits dates into shards of up to shard_size consecutive dates
+
+        :param days: list of dates, format: yyyy-mm-dd
+        :param shard_size: number of dates per shard
+
+        returns:
+          shards: dict of shard name, first_last date, to list of dates
+        """
+
+        if shard_size < 1:
+            raise ValueError(f"Unsupported shard size {shard_size}")
+        days = sorted(days)
+        shards = {}
+        for offset in range(0, len(days), shard_size):
+            chunk = days[offset : offset + shard_size]
+            shards[f"{chunk[0]}_{chunk[-1]}"] = chunk
+        return shards
+
+    def publish(self, days: list, shard_size: int):
+        """
+        Publishes the dates to process as shards
+
+        :param days: execution list, format: yyyy-mm-dd
+        :param shard_size: number of dates per shard
+
+        returns:
+          shards: dict of the published shard names to their dates
+        """
+
+        active = set()
+        for name in self.shards():
+            if self.is_done(name):
+                self.s3_bucket.delete_object(self.shard_key(name))
+                self.s3_bucket.delete_object(self.done_key(name))
+            else:
+                active.update(self.dates(name))
+        if active:
+            self._logger.info(f"{len(active)} dates are still in progress")
+
+        shards = self.split([day for day in days if day not in active], shard_size)
+        for name, dates in shards.items():
+            self.s3_bucket.write_object(
+                json.dumps({LeaseFormat.SHARD_DATES.value: dates}),
+                self.shard_key(name),
+            )
+        self._logger.info(f"Published {len(shards)} shards of {len(days)} dates")
+        return shards
+
+    def shards(self):
+        """
+        Returns the names of the published shards in date order
+        """
+
+        prefix = f"{self.prefix}/{LeaseFormat.LEASE_SHARDS_DIR.value}/"
+        return sorted(
+            key[len(prefix) : -len(".json")] for key in self.s3_bucket.list_keys(prefix)
+        )
+
+    def pending(self):
+        """
+        Returns the names of the shards without a done marker
+        """
+
+        prefix = f"{self.prefix}/{LeaseFormat.LEASE_DONE_DIR.value}/"
+        done = {
+            key[len(prefix) : -len(".json")] for key in self.s3_bucket.list_keys(prefix)
+        }
+        return [name for name in self.shards() if name not in done]
+
+    def dates(self, name: str):
+        """
+        Returns the dates of a shard, empty when the shard was removed
+        """
+
+        body = self.s3_bucket.read_object(self.shard_key(name))
+        if body is None:
+            return []
+        return json.loads(body)[LeaseFormat.SHARD_DATES.value]
+
+    def is_done(self, name: str):
+        """
+        Returns True when a shard has a done marker
+        """
+
+        return self.s3_bucket.read_object(self.done_key(name)) is not None
+
+    def finish(self, name: str, owner: str, results: dict):
+        """
+        Writes the done marker of a shard
+
+        :param name: shard name
+        :param owner: owner of the lease the shard was processed under
+        :param results: dict of date to True when processed or False when failed
+        """
+
+        return self.s3_bucket.write_object(
+            json.dumps(
+                {
+                    LeaseFormat.LEASE_OWNER.value: owner,
+                    LeaseFormat.SHARD_RESULTS.value: results,
+                }
+            ),
+            self.done_key(name),
+        )
+
+
+class ShardWorker:
+    """
+    Takes the shards of a plan one lease at a time and processes them. The
+    lease of a shard is renewed by heartbeats while its dates are
+    transformed, and its processed dates are committed to the meta data
+    and the team aggregates by the worker itself, the aggregates under a
+    lease of their own. The worker returns once every shard is done, shards
+    leased by a crashed worker are taken over when their lease expires.
+    A failed date is recorded as failed in the done marker and planned again
+    by the next coordinator run
+    :param plan: ShardPlan of the source bucket
+    :param leases: LeaseStore of the shard and aggregates leases
+    :param executor: ETLExecutor transforming the dates of a shard
+    :param aggregates: TeamAggregates merged with the processed dates
+    :param max_workers: number of dates of a shard processed at the same time
+    :param executor_type: thread or process pool
+    :param heartbeat_seconds: seconds between two renewals of a lease
+    :param poll_seconds: seconds to wait when every pending shard is leased
+    """
+
+    def __init__(
+        self,
+        plan: ShardPlan,
+        leases: LeaseStore,
+        executor: ETLExecutor,
+        aggregates: TeamAggregates = None,
+        max_workers: int = 1,
+        executor_type: str = "thread",
+        heartbeat_seconds: float = None,
+        poll_seconds: float = 10,
+    ):
+        self.plan = plan
+        self.leases = leases
+        self.executor = executor
+        self.aggregates = aggregates
+        self.max_workers = max_workers
+        self.executor_type = executor_type
+        self.heartbeat_seconds = heartbeat_seconds
+        self.poll_seconds = poll_seconds
+        self._logger = logging.getLogger(__name__)
+
+    def run(self):
+        """
+        Processes shards until every shard of the plan is done
+
+        returns:
+          results: dict of date to True when processed or False when failed,
+          of the dates processed by this worker
+        """
+
+        results = {}
+        while True:
+            pending = self.plan.pending()
+            if not pending:
+                break
+            taken = False
+            for name in pending:
+                if not self.leases.acquire(name):
+                    continue
+                taken = True
+                try:
+                    # finished by another worker between listing and leasing
+                    if not self.plan.is_done(name):
+                        results.update(self.process(name))
+                finally:
+                    self.leases.release(name)
+            if not taken:
+                self._logger.info(
+                    f"{len(pending)} shards are leased by other workers, waiting"
+                )
+                time.sleep(self.poll_seconds)
+        self._logger.info(f"Worker {self.leases.owner} done, {len(results)} dates")
+        return results
+
+    def process(self, name: str):
+        """
+        Transforms and commits the dates of a leased shard
+
+        :param name: shard name
+
+        returns:
+          results: dict of date to True when processed or False when failed
+        """
+
+        with self.leases.heartbeat(name, self.heartbeat_seconds) as lost:
+            days = self.plan.dates(name)
+            self._logger.info(f"Processing shard {name}, {len(days)} dates")
+            results = self.executor.transform_dates(
+                days, max_workers=self.max_workers, executor_type=self.executor_type
+            )
+            processed = [day for day, done in results.items() if done]
+            if self.aggregates is not None and processed:
+                # the totals are rewritten as a whole, one merge at a time
+                lease = LeaseFormat.AGGREGATES_LEASE.value
+                self.leases.wait(lease, poll_seconds=1)
+                try:
+                    # renewed like a shard lease, a long merge keeps it
+                    with self.leases.heartbeat(
+                        lease, self.heartbeat_seconds
+                    ) as merge_lost:
+                        self.aggregates.merge(processed)
+                    if merge_lost.is_set():
+                        # the totals are written conditioned on their ETag
+                        self._logger.warning("Aggregates lease was lost while merging")
+                except Exception:
+                    # the dates are still committed, the partials are kept
+                    # and merged by the next merge of their season
+                    self._logger.exception(f"Aggregates of shard {name} not merged")
+                finally:
+                    self.leases.release(lease)
+            processed_at = datetime.datetime.now().strftime(
+                MetaProcessFormat.META_DATE_FORMAT.value
+            )
+            self.plan.s3_bucket.update_meta_file_to_s3(
+                [[day, processed_at] for day in processed]
+            )
+            if lost.is_set():
+                # the dates are safe to repeat, the commit above stands
+                self._logger.warning(f"Lease of shard {name} was lost while processing")
+            self.plan.finish(name, self.leases.owner, results)
+        return results
@@ -0,0 +1,288 @@
+""" Declarative transform stages configured from epl_config.yml """
+from itertools import groupby
+
+import pandas as pd
+
+from epl.common.constants import (MetricCounters, MetricStages,
+                                  TransformStageTypes)
+from epl.common.dtypes import DtypeCompaction
+from epl.common.metrics import Metrics
+
+# stage types to stage classes, extended with register_stage
+STAGES = {}
+
+# transform applied when no stages are configured
+DEFAULT_TRANSFORMS = [
+    {
+        "type": TransformStageTypes.DERIVE.value,
+        "name": "is_processed",
+        "column": "Is processed",
+        "expr": "True",
+    }
+]
+
+
+def register_stage(stage_type: str):
+    """
+    Class decorator adding a stage class to the registry under its type
+    :param stage_type: value of the type key in the stage configuration
+    """
+
+    def _register(cls):
+        cls.stage_type = stage_type
+        STAGES[stage_type] = cls
+        return cls
+
+    return _register
+
+
+class TransformStage:
+    """
+    Base class of the transform stages, a stage works on whole columns and
+    returns the transformed dataframe
+    :param name: name the timing of the stage is recorded under
+    """
+
+    stage_type = None
+    # the stage works on each row on its own, so it can run file by file
+    row_local = True
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def apply(self, df: pd.DataFrame):
+        raise NotImplementedError
+
+    def run(self, df: pd.DataFrame, metrics: Metrics):
+        """
+        Applies the stage, stages with counters record them in metrics
+        """
+
+        return self.apply(df)
+
+
+@register_stage(TransformStageTypes.CAST.value)
+class CastStage(TransformStage):
+    """
+    Casts columns to pandas dtypes, e.g. int16, float32, category or string
+    :param columns: dict of column name to dtype
+    """
+
+    def __init__(self, name: str, columns: dict):
+        super().__init__(name)
+        self.columns = columns
+
+    def apply(self, df: pd.DataFrame):
+        return df.astype(self.columns)
+
+
+@register_stage(TransformStageTypes.DERIVE.value)
+class DeriveStage(TransformStage):
+    """
+    Adds or replaces a column with a vectorized expression of other columns,
+    e.g. FTHG + FTAG, evaluated with DataFrame.eval
+    :param column: name of the derived column
+    :param expr: expression computing the column
+    """
+
+    def __init__(self, name: str, column: str, expr: str):
+        super().__init__(name)
+        self.column = column
+        self.expr = expr
+
+    def apply(self, df: pd.DataFrame):
+        df[self.column] = df.eval(self.expr)
+        return df
+
+
+@register_stage(TransformStageTypes.FILTER.value)
+class FilterStage(TransformStage):
+    """
+    Keeps the rows matching a vectorized boolean expression, e.g. FTHG >= 0
+    :param expr: expression selecting the rows to keep
+    """
+
+    def __init__(self, name: str, expr: str):
+        super().__init__(name)
+        self.expr = expr
+
+    def mask(self, df: pd.DataFrame):
+        """
+        Returns the boolean mask of the rows to keep
+        """
+
+        return df.eval(self.expr)
+
+    def apply(self, df: pd.DataFrame):
+        return df.loc[self.mask(df)].reset_index(drop=True)
+
+
+@register_stage(TransformStageTypes.DEDUP.value)
+class DedupStage(TransformStage):
+    """
+    Drops duplicated rows, in streaming mode only within a chunk
+    :param subset: columns identifying a duplicate, None uses every column
+    :param keep: first or last row of the duplicates is kept
+    """
+
+    row_local = False
+
+    def __init__(self, name: str, subset: list = None, keep: str = "first"):
+        super().__init__(name)
+        self.subset = subset
+        self.keep = keep
+
+    def apply(self, df: pd.DataFrame):
+        return df.drop_duplicates(subset=self.subset, keep=self.keep, ignore_index=True)
+
+
+@register_stage(TransformStageTypes.RENAME.value)
+class RenameStage(TransformStage):
+    """
+    Renames columns
+    :param columns: dict of old column name to new column name
+    """
+
+    def __init__(self, name: str, columns: dict):
+        super().__init__(name)
+        self.columns = columns
+
+    def apply(self, df: pd.DataFrame):
+        return df.rename(columns=self.columns)
+
+
+@register_stage(TransformStageTypes.COMPACT.value)
+class CompactDtypesStage(TransformStage):
+    """
+    Converts columns to memory efficient dtypes with the same values, e.g.
+    repeated names to categoricals and integers to the smallest type holding
+    them. Expressions of later stages are evaluated in the smaller dtypes
+    :param columns: dict of column to kind: category, string or downcast
+    :param auto: choose the kind of the columns that are not configured
+    :param max_category_ratio: highest share of distinct values of a string
+    column made categorical
+    """
+
+    # the dtypes are chosen from the values of every row, files compacted one
+    # at a time would get different categories and widths
+    row_local = False
+
+    def __init__(
+        self,
+        name: str,
+        columns: dict = None,
+        auto: bool = True,
+        max_category_ratio: float = 0.5,
+    ):
+        super().__init__(name)
+        self.compaction = DtypeCompaction(columns, auto, max_category_ratio)
+
+    def apply(self, df: pd.DataFrame):
+        return self.compaction.apply(df)[0]
+
+    def run(self, df: pd.DataFrame, metrics: Metrics):
+        df, report = self.compaction.apply(df)
+        metrics.incr(
+            MetricCounters.MEMORY_SAVED.value,
+            report["bytes_before"] - report["bytes_after"],
+        )
+        return df
+
+
+class FusedCastStage(TransformStage):
+    """
+    Consecutive casts applied with a single astype call
+    """
+
+    def __init__(self, stages: list):
+        super().__init__("+".join(stage.name for stage in stages))
+        self.columns = {}
+        for stage in stages:
+            self.columns.update(stage.columns)
+
+    def apply(self, df: pd.DataFrame):
+        return df.astype(self.columns)
+
+
+class FusedFilterStage(TransformStage):
+    """
+    Consecutive filters combined into one mask so the rows are selected once
+    """
+
+    def __init__(self, stages: list):
+        super().__init__("+".join(stage.name for stage in stages))
+        self.stages = stages
+
+    def apply(self, df: pd.DataFrame):
+        mask = self.stages[0].mask(df)
+        for stage in self.stages[1:]:
+            mask &= stage.mask(df)
+        return df.loc[mask].reset_index(drop=True)
+
+
+# stage classes whose consecutive stages are fused into one pass
+FUSED_STAGES = {CastStage: FusedCastStage, FilterStage: FusedFilterStage}
+
+
+class TransformPipeline:
+    """
+    Runs the configured stages in order on a dataframe. Runs of consecutive
+    casts or filters are fused into one pass over the columns, the timing
+    of each stage, or fused run of stages, is recorded as transform.<name>
+    :param stages: list of TransformStage
+    """
+
+    def __init__(self, stages: list):
+        self.stages = stages
+        self.steps = []
+        for stage_class, group in groupby(stages, key=type):
+            group = list(group)
+            if stage_class in FUSED_STAGES and len(group) > 1:
+                self.steps.append(FUSED_STAGES[stage_class](group))
+            else:
+                self.steps.extend(group)
+
+    @property
+    def row_local(self):
+        """
+        True when every stage can run on the files of a day one at a time
+        """
+
+        return all(stage.row_local for stage in self.stages)
+
+    @classmethod
+    def from_config(cls, config: list = None):
+        """
+        Builds the pipeline from the transforms section of the config
+        :param config: list of dicts with the stage type, an optional name
+        and the options of the stage, None uses DEFAULT_TRANSFORMS
+
+        returns:
+          pipeline: TransformPipeline
+        """
+
+        stages = []
+        for position, options in enumerate(config or DEFAULT_TRANSFORMS):
+            options = dict(options)
+            stage_type = options.pop("type")
+            if stage_type not in STAGES:
+                raise ValueError(f"Unsupported transform stage {stage_type}")
+            name = options.pop("name", f"{stage_type}_{position}")
+            stages.append(STAGES[stage_type](name, **options))
+        return cls(stages)
+
+    def run(self, df: pd.DataFrame, metrics: Metrics = None):
+        """
+        Applies every stage to the dataframe
+        :param df: input dataframe
+        :param metrics: Metrics recording the timing of every stage
+
+        returns:
+          df: transformed dataframe
+        """
+
+        metrics = metrics or Metrics()
+        for step in self.steps:
+            with metrics.timer(f"{MetricStages.TRANSFORM.value}.{step.name}"):
+                df = step.run(df, metrics)
+        return df
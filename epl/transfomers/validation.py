@@ -0,0 +1,435 @@
+""" Schema contract and data quality gate of the source files """
+import json
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+
+from epl.common.constants import ValidationChecks
+from epl.common.readers import combine
+from epl.common.s3 import S3BucketConnector
+from epl.common.schema import arrow_type
+
+# dtype families of the contract and the pandas check of each
+DTYPE_FAMILIES = {
+    "integer": pd.api.types.is_integer_dtype,
+    "float": pd.api.types.is_float_dtype,
+    "numeric": pd.api.types.is_numeric_dtype,
+    "bool": pd.api.types.is_bool_dtype,
+    "string": pd.api.types.is_string_dtype,
+    "datetime": pd.api.types.is_datetime64_any_dtype,
+}
+
+
+def dtype_family(data_type: pa.DataType):
+    """
+    Returns the dtype family of an arrow type declared in the schema
+    :param data_type: pyarrow DataType
+
+    returns:
+      family: key of DTYPE_FAMILIES or None for types without a family
+    """
+
+    if pa.types.is_boolean(data_type):
+        return "bool"
+    if pa.types.is_integer(data_type):
+        return "integer"
+    if pa.types.is_floating(data_type):
+        return "float"
+    if pa.types.is_string(data_type) or pa.types.is_large_string(data_type):
+        return "string"
+    if pa.types.is_timestamp(data_type):
+        return "datetime"
+    return None
+
+
+class SchemaContract:
+    """
+    Checks a parsed source file against the expected columns, dtypes, null
+    ratios, value ranges, allowed values and unique keys. Every check works
+    on whole columns, so a file costs a few vectorized passes
+    :param required_columns: columns every file must have
+    :param dtypes: dict of column to dtype family, see DTYPE_FAMILIES
+    :param max_null_ratio: dict of column to highest allowed share of nulls
+    :param ranges: dict of column to [min, max], None leaves a side open
+    :param values: dict of column to list of allowed values
+    :param unique: columns identifying a row, duplicates fail the file
+    :param allow_extra_columns: False fails files with undeclared columns
+    """
+
+    def __init__(
+        self,
+        required_columns: list = None,
+        dtypes: dict = None,
+        max_null_ratio: dict = None,
+        ranges: dict = None,
+        values: dict = None,
+        unique: list = None,
+        allow_extra_columns: bool = True,
+    ):
+        self.required_columns = required_columns or []
+        self.dtypes = dtypes or {}
+        self.max_null_ratio = max_null_ratio or {}
+        self.ranges = ranges or {}
+        self.values = values or {}
+        self.unique = unique or []
+        self.allow_extra_columns = allow_extra_columns
+        for column, family in self.dtypes.items():
+            if family not in DTYPE_FAMILIES:
+                raise ValueError(f"Unsupported dtype {family} of column {column}")
+
+    @classmethod
+    def from_config(cls, config: dict, schema: dict = None):
+        """
+        Builds the contract from the validation section of the config, the
+        dtypes default to the families of the types declared in the schema
+        :param config: validation section of the config
+        :param schema: dict of column name to arrow type name
+
+        returns:
+          contract: SchemaContract
+        """
+
+        dtypes = config.get("dtypes")
+        if dtypes is None:
+            dtypes = {}
+            for column, type_name in (schema or {}).items():
+                family = dtype_family(arrow_type(type_name))
+                if family is not None:
+                    dtypes[column] = family
+        return cls(
+            required_columns=config.get("required_columns"),
+            dtypes=dtypes,
+            max_null_ratio=config.get("max_null_ratio"),
+            ranges=config.get("ranges"),
+            values=config.get("values"),
+            unique=config.get("unique"),
+            allow_extra_columns=config.get("allow_extra_columns", True),
+        )
+
+    def check(self, df: pd.DataFrame):
+        """
+        Runs every check on a parsed file
+
+        :param df: parsed source file
+
+        returns:
+          failures: list of dicts of the failed check and its details, empty
+          when the file passes
+        """
+
+        failures = self.check_columns(df)
+        columns = set(df.columns)
+        if len(df):
+            present = [column for column in self.max_null_ratio if column in columns]
+            ratios = df[present].isna().mean()
+            for column in present:
+                if ratios[column] > self.max_null_ratio[column]:
+                    failures.append(
+                        {
+                            "check": ValidationChecks.NULL_RATIO.value,
+                            "column": column,
+                            "ratio": float(ratios[column]),
+                            "max": self.max_null_ratio[column],
+                        }
+                    )
+        for check, column, mask in self._row_masks(df):
+            self._count(failures, check, column, mask)
+        return failures
+
+    def check_rows(self, df: pd.DataFrame):
+        """
+        Runs the checks row by row on data combined from many files, e.g. the
+        compacted files of a date, so a failing row fails only itself. Nulls
+        fail the rows of columns allowing no nulls, higher null ratios are
+        not checked. The column checks still fail every row
+
+        :param df: combined source files
+
+        returns:
+          failures: list of dicts of the failed check and its details
+          mask: boolean Series of the failing rows
+        """
+
+        failures = self.check_columns(df)
+        if failures:
+            return failures, pd.Series(True, index=df.index)
+        masks = [
+            (ValidationChecks.NULL_RATIO, column, df[column].isna())
+            for column, ratio in self.max_null_ratio.items()
+            if column in df.columns and ratio == 0
+        ]
+        masks.extend(self._row_masks(df))
+        failing = pd.Series(False, index=df.index)
+        for check, column, mask in masks:
+            self._count(failures, check, column, mask)
+            failing |= mask
+        return failures, failing
+
+    def check_columns(self, df: pd.DataFrame):
+        """
+        Runs the checks of the columns and dtypes
+
+        :param df: parsed source file
+
+        returns:
+          failures: list of dicts of the failed check and its details
+        """
+
+        failures = []
+        columns = set(df.columns)
+        for column in self.required_columns:
+            if column not in columns:
+                failures.append(
+                    {"check": ValidationChecks.MISSING_COLUMN.value, "column": column}
+                )
+        if not self.allow_extra_columns:
+            declared = set(self.required_columns) | set(self.dtypes)
+            for column in df.columns:
+                if column not in declared:
+                    failures.append(
+                        {"check": ValidationChecks.EXTRA_COLUMN.value, "column": column}
+                    )
+
+        for column, family in self.dtypes.items():
+            if column in columns and not DTYPE_FAMILIES[family](df[column].dtype):
+                failures.append(
+                    {
+                        "check": ValidationChecks.DTYPE.value,
+                        "column": column,
+                        "expected": family,
+                        "actual": str(df[column].dtype),
+                    }
+                )
+        return failures
+
+    def _row_masks(self, df: pd.DataFrame):
+        """
+        Helper function returning the check, column and mask of the failing
+        rows of the range, value and unique key checks
+        """
+
+        columns = set(df.columns)
+        masks = []
+        for column, (low, high) in self.ranges.items():
+            if column not in columns or not pd.api.types.is_numeric_dtype(df[column]):
+                continue
+            outside = pd.Series(False, index=df.index)
+            if low is not None:
+                outside |= (df[column] < low).fillna(False)
+            if high is not None:
+                outside |= (df[column] > high).fillna(False)
+            masks.append((ValidationChecks.RANGE, column, outside))
+
+        for column, allowed in self.values.items():
+            if column in columns:
+                outside = df[column].notna() & ~df[column].isin(allowed)
+                masks.append((ValidationChecks.VALUES, column, outside))
+
+        if self.unique and set(self.unique) <= columns:
+            duplicated = df.duplicated(subset=self.unique)
+            masks.append((ValidationChecks.DUPLICATE_KEY, self.unique, duplicated))
+        return masks
+
+    @staticmethod
+    def _count(failures: list, check: ValidationChecks, column, mask: pd.Series):
+        """
+        Helper function for self.check() recording the rows failing a check
+        """
+
+        rows = int(mask.sum())
+        if rows:
+            failures.append({"check": check.value, "column": column, "rows": rows})
+
+
+class QualityGate:
+    """
+    Reads the source files of a date one by one, on the download threads,
+    and checks each against the contract, compacted files are checked row
+    by row. Files that fail to parse or fail a
+    check are left out of the output of the date and copied, with their
+    failures, to a quarantine prefix of the target bucket. The source files
+    are not changed. A compact report of every date is written next to it
+    :param src_bucket: S3BucketConnector of the source files
+    :param trg_bucket: S3BucketConnector of the quarantine and the reports
+    :param contract: SchemaContract of the source files
+    :param quarantine_prefix: prefix of the quarantined files
+    :param report_prefix: prefix of the validation reports
+    """
+
+    def __init__(
+        self,
+        src_bucket: S3BucketConnector,
+        trg_bucket: S3BucketConnector,
+        contract: SchemaContract,
+        quarantine_prefix: str = "quarantine",
+        report_prefix: str = "validation",
+    ):
+        self.src_bucket = src_bucket
+        self.trg_bucket = trg_bucket
+        self.contract = contract
+        self.quarantine_prefix = quarantine_prefix
+        self.report_prefix = report_prefix
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger(__name__)
+
+    def __getstate__(self):
+        """
+        The lock is not pickled, a process pool worker gets its own
+        """
+
+        state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_report(day: str):
+        """
+        Returns an empty report of a date
+        """
+
+        return {"date": day, "files": 0, "passed": 0, "rows": 0, "quarantined": {}}
+
+    def read(self, day: str, key_list: list, report: dict, reader=None):
+        """
+        Reads and checks the source files of a date
+
+        :param day: date, format: yyyy-mm-dd
+        :param key_list: list of source file keys
+        :param report: report of the date, updated with the checked files
+        :param reader: function reading a list of keys into a DataFrame,
+        defaults to reading csv files from the source bucket
+
+        returns:
+          data_frame: Pandas DataFrame of the files that passed
+        """
+
+        reader = reader or self.src_bucket.read_csv_list_combine_convert_to_df
+
+        def _read(key):
+            try:
+                df = reader([key])
+            except ValueError as error:
+                # parser errors, e.g. a value not matching its declared type
+                return (
+                    key,
+                    None,
+                    [{"check": ValidationChecks.PARSE.value, "detail": str(error)}],
+                )
+            return key, df, self.contract.check(df)
+
+        key_list = key_list or []
+        with ThreadPoolExecutor(max_workers=self.src_bucket.max_workers) as pool:
+            results = list(pool.map(_read, key_list))
+
+        frames = []
+        for key, df, failures in results:
+            if failures:
+                self.quarantine(day, key, failures)
+            else:
+                frames.append(df)
+            with self._lock:
+                report["files"] += 1
+                if failures:
+                    report["quarantined"][key] = failures
+                else:
+                    report["passed"] += 1
+                    report["rows"] += len(df)
+        return combine(frames)
+
+    def read_rows(self, day: str, key_list: list, report: dict, reader=None):
+        """
+        Reads and checks inputs of a date combining many source files, such
+        as its compacted files, row by row. Their source files were checked
+        one by one when they were compacted, so a failing row is quarantined
+        on its own instead of the whole input. Inputs failing a column check
+        are quarantined as a whole
+
+        :param day: date, format: yyyy-mm-dd
+        :param key_list: list of the combined input keys
+        :param report: report of the date, updated with the checked rows
+        :param reader: function reading a list of keys into a DataFrame,
+        defaults to reading parquet files from the source bucket
+
+        returns:
+          data_frame: Pandas DataFrame of the rows that passed
+        """
+
+        reader = reader or self.src_bucket.read_parquet_list_combine_convert_to_df
+        key_list = key_list or []
+        df = reader(key_list)
+        failures, failing = self.contract.check_rows(df)
+        with self._lock:
+            report["files"] += len(key_list)
+        if len(df) and failing.all():
+            for key in key_list:
+                self.quarantine(day, key, failures)
+            with self._lock:
+                report["quarantined"].update({key: failures for key in key_list})
+            return df.iloc[:0]
+
+        rows = df.loc[failing]
+        if len(rows):
+            stem = posixpath.splitext(posixpath.basename(key_list[0]))[0]
+            name = f"rows-{stem}.csv"
+            self._logger.warning(
+                f"{len(rows)} rows of {day} failed validation and are "
+                f"quarantined: {failures}"
+            )
+            self._write_quarantine(
+                day,
+                name,
+                rows.to_csv(index=False),
+                {"source": key_list, "failures": failures},
+            )
+        df = df.loc[~failing].reset_index(drop=True)
+        with self._lock:
+            report["passed"] += len(key_list)
+            report["rows"] += len(df)
+            if len(rows):
+                report["quarantined"][name] = failures
+        return df
+
+    def quarantine(self, day: str, key: str, failures: list):
+        """
+        Copies a failing source file and its failures to the quarantine prefix
+
+        :param day: date, format: yyyy-mm-dd
+        :param key: key of the source file
+        :param failures: list of the failed checks
+        """
+
+        self._logger.warning(f"{key} failed validation and is quarantined: {failures}")
+        self._write_quarantine(
+            day,
+            posixpath.basename(key),
+            self.src_bucket.read_object(key),
+            {"source": key, "failures": failures},
+        )
+
+    def _write_quarantine(self, day: str, name: str, body, errors: dict):
+        """
+        Helper function writing a quarantined body and its failures
+        """
+
+        target = f"{self.quarantine_prefix}/date={day}/{name}"
+        if body is not None:
+            self.trg_bucket.write_object(body, target)
+        self.trg_bucket.write_object(json.dumps(errors), f"{target}.errors.json")
+
+    def write_report(self, report: dict):
+        """
+        Writes the report of a date
+
+        :param report: report returned by self.new_report() and filled by self.read()
+        """
+
+        key = f"{self.report_prefix}/date={report['date']}.json"
+        return self.trg_bucket.write_object(json.dumps(report), key)
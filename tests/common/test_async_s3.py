@@ -0,0 +1,182 @@
+"""TestAsyncS3BucketConnectorMethods"""
+import json
+import os
+import unittest
+from io import BytesIO
+
+import boto3
+import pandas as pd
+
+from epl.common.async_s3 import AsyncS3BucketConnector, get_session
+from epl.transfomers.async_executor import AsyncETLExecutor
+
+try:
+    from moto.server import ThreadedMotoServer
+except ImportError:  # moto server mode needs flask
+    ThreadedMotoServer = None
+
+
+@unittest.skipIf(
+    get_session is None or ThreadedMotoServer is None,
+    "requires aiobotocore and moto server mode",
+)
+class TestAsyncS3BucketConnectorMethods(unittest.IsolatedAsyncioTestCase):
+    """
+    Testing the AsyncS3BucketConnector and AsyncETLExecutor classes against
+    moto in server mode, the asyncio client can not be mocked in process
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Starting the moto server
+        """
+        cls.server = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+        cls.server.start()
+        host, port = cls.server._server.server_address
+        cls.s3_endpoint_url = f"http://{host}:{port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Stopping the moto server
+        """
+        cls.server.stop()
+
+    def setUp(self):
+        """
+        Setting up the environment
+        """
+        # Defining the class arguments
+        self.s3_access_key = "AWS_ACCESS_KEY_ID"
+        self.s3_secret_key = "AWS_SECRET_ACCESS_KEY"
+        self.s3_src_bucket_name = "test-src-bucket"
+        self.s3_trg_bucket_name = "test-trg-bucket"
+        # Creating s3 access keys as environment variables
+        os.environ[self.s3_access_key] = "KEY1"
+        os.environ[self.s3_secret_key] = "KEY2"
+        os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+        # moto does not decode the aws-chunked checksum framing of parts
+        os.environ["AWS_REQUEST_CHECKSUM_CALCULATION"] = "when_required"
+        # Creating the buckets on the moto server
+        self.s3 = boto3.resource(service_name="s3", endpoint_url=self.s3_endpoint_url)
+        for bucket in [self.s3_src_bucket_name, self.s3_trg_bucket_name]:
+            self.s3.create_bucket(Bucket=bucket)
+        self.src_bucket = self.s3.Bucket(self.s3_src_bucket_name)
+        self.trg_bucket = self.s3.Bucket(self.s3_trg_bucket_name)
+
+    def tearDown(self):
+        """
+        Executing after unittests
+        """
+        # emptying the moto server
+        for bucket in [self.src_bucket, self.trg_bucket]:
+            bucket.objects.all().delete()
+            bucket.delete()
+
+    def connector(self, bucket: str, **kwargs):
+        """
+        Returns an AsyncS3BucketConnector of the moto server
+        """
+        return AsyncS3BucketConnector(
+            self.s3_access_key,
+            self.s3_secret_key,
+            bucket,
+            endpoint_url=self.s3_endpoint_url,
+            **kwargs,
+        )
+
+    async def test_list_and_read_csv_files_in_key_order(self):
+        """
+        Tests the folders are listed and files are combined in key order
+        """
+        # Test init
+        self.src_bucket.put_object(Key="football-2023-03-18/")
+        keys = [f"football-2023-03-18/data{i:02}.csv" for i in range(12)]
+        for i, key in enumerate(keys):
+            self.src_bucket.put_object(Body=f"col1\n{i}", Key=key)
+        self.src_bucket.put_object(Body="col1\n1", Key="football-2023-03-19/a.csv")
+
+        async with self.connector(self.s3_src_bucket_name, max_workers=4) as conn:
+            # Method execution
+            folders = await conn.list_folders()
+            key_list = await conn.list_files_in_prefix("2023-03-18")
+            df = await conn.read_csv_list_combine_convert_to_df(key_list)
+            missing = await conn.list_files_in_prefix("2023-03-20")
+
+        # Tests after method execution
+        self.assertEqual(folders, ["2023-03-18", "2023-03-19"])
+        self.assertEqual(key_list, keys)
+        self.assertEqual(df["col1"].tolist(), list(range(12)))
+        self.assertIsNone(missing)
+
+    async def test_write_df_to_s3_multipart(self):
+        """
+        Tests a body larger than one part is uploaded in parallel parts
+        """
+        # Test init
+        df = pd.DataFrame({"col1": range(800000), "col2": "abcdefgh"})
+
+        async with self.connector(self.s3_trg_bucket_name, upload_workers=3) as conn:
+            # Method execution
+            result = await conn.write_df_to_s3(df, "data/out", "csv")
+
+        # Tests after method execution
+        self.assertTrue(result)
+        body = self.trg_bucket.Object(key="data/out.csv").get()["Body"].read()
+        self.assertGreater(len(body), conn.part_size)
+        self.assertEqual(len(pd.read_csv(BytesIO(body))), 800000)
+        # two parts of at least part_size and the completion of the upload
+        self.assertEqual(conn.metrics.snapshot()["stages"]["upload"]["calls"], 3)
+        # the csv is serialized in chunks instead of one body
+        self.assertEqual(conn.metrics.snapshot()["stages"]["serialize"]["calls"], 9)
+
+    async def test_update_meta_file_to_s3(self):
+        """
+        Tests processed folders move the watermark in the meta state
+        """
+        # Test init
+        for day in ["2023-03-18", "2023-03-19", "2023-03-20"]:
+            self.src_bucket.put_object(Key=f"football-{day}/")
+
+        async with self.connector(self.s3_src_bucket_name) as conn:
+            # Method execution
+            await conn.update_meta_file_to_s3(
+                [["2023-03-18", "2023-03-21"], ["2023-03-20", "2023-03-21"]]
+            )
+            pending = await conn.list_folders()
+
+        # Tests after method execution
+        state = json.loads(
+            self.src_bucket.Object(key="meta/state.json").get()["Body"].read()
+        )
+        self.assertEqual(state, {"watermark": "2023-03-20", "gaps": ["2023-03-19"]})
+        self.assertEqual(pending, ["2023-03-19"])
+
+    async def test_executor_transform_dates_tracks_failures(self):
+        """
+        Tests the dates run on one event loop and a failing date is reported
+        """
+        # Test init
+        self.src_bucket.put_object(Body="col1\n1", Key="football-2023-03-18/a.csv")
+        self.src_bucket.put_object(Body="", Key="football-2023-03-19/a.csv")
+
+        async with self.connector(self.s3_src_bucket_name) as src:
+            async with self.connector(self.s3_trg_bucket_name) as trg:
+                # Method execution
+                results = await AsyncETLExecutor(src, trg).transform_dates(
+                    ["2023-03-18", "2023-03-19"], max_dates=2
+                )
+
+        # Tests after method execution
+        self.assertEqual(results, {"2023-03-18": True, "2023-03-19": False})
+        df = pd.read_csv(
+            self.trg_bucket.Object(key="data/processed-data-2023-03-18.csv").get()[
+                "Body"
+            ]
+        )
+        self.assertTrue(df["Is processed"].all())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""TestObjectCacheMethods"""
+import pickle
+import tempfile
+import unittest
+
+import pyarrow as pa
+
+from epl.common.cache import ObjectCache
+
+
+class TestObjectCacheMethods(unittest.TestCase):
+    """
+    Testing the ObjectCache class
+    """
+
+    def setUp(self):
+        """
+        Setting up the environment
+        """
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.table = pa.table({"col1": list(range(1000))})
+
+    def tearDown(self):
+        """
+        Executing after unittests
+        """
+        self.cache_dir.cleanup()
+
+    def test_get_and_put(self):
+        """
+        Tests an entry is only returned for the same key and ETag
+        """
+        # Test init
+        cache = ObjectCache(self.cache_dir.name)
+
+        # Method execution
+        cache.put("a.csv", '"etag1"', self.table)
+
+        # Tests after method execution
+        self.assertTrue(cache.get("a.csv", '"etag1"').equals(self.table))
+        self.assertIsNone(cache.get("a.csv", '"etag2"'))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        """
+        Tests the cache stays below its size by evicting the oldest entry
+        """
+        # Test init
+        cache = ObjectCache(self.cache_dir.name)
+        cache.put("a.csv", "1", self.table)
+        entry_size = cache.stats()["bytes"]
+        cache.max_bytes = entry_size * 2
+
+        # Method execution
+        cache.put("b.csv", "1", self.table)
+        cache.get("a.csv", "1")
+        cache.put("c.csv", "1", self.table)
+
+        # Tests after method execution
+        self.assertEqual(cache.stats()["entries"], 2)
+        self.assertIsNone(cache.get("b.csv", "1"))
+        self.assertIsNotNone(cache.get("a.csv", "1"))
+
+    def test_entries_survive_restart_and_pickling(self):
+        """
+        Tests a new cache on the same directory finds earlier entries
+        """
+        # Test init
+        ObjectCache(self.cache_dir.name).put("a.csv", "1", self.table)
+
+        # Method execution
+        cache = pickle.loads(pickle.dumps(ObjectCache(self.cache_dir.name)))
+
+        # Tests after method execution
+        self.assertIsNotNone(cache.get("a.csv", "1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""TestClientFactory"""
+import os
+import unittest
+from unittest.mock import patch
+
+from epl.common.client_factory import clear_clients, get_s3_client
+from epl.common.s3 import S3BucketConnector
+
+
+class TestClientFactory(unittest.TestCase):
+    """
+    Testing the shared S3 client factory
+    """
+
+    def setUp(self):
+        """
+        Setting up the environment
+        """
+        self.s3_access_key = "AWS_ACCESS_KEY_ID"
+        self.s3_secret_key = "AWS_SECRET_ACCESS_KEY"
+        os.environ[self.s3_access_key] = "KEY1"
+        os.environ[self.s3_secret_key] = "KEY2"
+        clear_clients()
+
+    def tearDown(self):
+        """
+        Executing after unittests
+        """
+        clear_clients()
+
+    def test_connectors_share_client(self):
+        """
+        Tests source and target connectors reuse one pooled client
+        """
+
+        # Method execution
+        src = S3BucketConnector(
+            self.s3_access_key, self.s3_secret_key, "src", max_pool_connections=32
+        )
+        trg = S3BucketConnector(
+            self.s3_access_key, self.s3_secret_key, "trg", max_pool_connections=32
+        )
+
+        # Tests after method execution
+        self.assertIs(src._client, trg._client)
+        self.assertEqual(src._client.meta.config.max_pool_connections, 32)
+        self.assertEqual(src._client.meta.config.retries["mode"], "adaptive")
+
+    def test_different_settings_get_own_client(self):
+        """
+        Tests a custom endpoint gets its own client
+        """
+
+        # Method execution
+        default = get_s3_client(self.s3_access_key, self.s3_secret_key)
+        local = get_s3_client(
+            self.s3_access_key,
+            self.s3_secret_key,
+            endpoint_url="http://localhost:5000",
+        )
+
+        # Tests after method execution
+        self.assertIsNot(default, local)
+        self.assertEqual(local.meta.endpoint_url, "http://localhost:5000")
+
+    def test_forked_process_gets_own_client(self):
+        """
+        Tests a forked child does not reuse the client, and the sockets, of
+        its parent
+        """
+
+        # Method execution
+        parent = get_s3_client(self.s3_access_key, self.s3_secret_key)
+        with patch("epl.common.client_factory.os.getpid", return_value=-1):
+            child = get_s3_client(self.s3_access_key, self.s3_secret_key)
+
+        # Tests after method execution
+        self.assertIsNot(parent, child)
+        self.assertIs(parent, get_s3_client(self.s3_access_key, self.s3_secret_key))
+
+
+if __name__ == "__main__":
+    unittest.main()
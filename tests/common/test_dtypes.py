@@ -0,0 +1,77 @@
+"""TestDtypeCompaction"""
+import unittest
+
+import pandas as pd
+import pyarrow as pa
+
+from epl.common.dtypes import DtypeCompaction
+from epl.common.schema import apply_schema
+
+
+class TestDtypeCompaction(unittest.TestCase):
+    """
+    Testing the DtypeCompaction class
+    """
+
+    def setUp(self):
+        """
+        Setting up the test data
+        """
+        rows = 200
+        self.df = pd.DataFrame(
+            {
+                "HomeTeam": pd.Series(
+                    ["Arsenal", "Chelsea"] * (rows // 2), dtype=object
+                ),
+                "MatchId": pd.Series([f"m{i}" for i in range(rows)], dtype=object),
+                "FTHG": [i % 5 for i in range(rows)],
+                "B365H": [1.5, 2.25] * (rows // 2),
+                "AvgH": [1.0 / (i + 3) for i in range(rows)],
+                "Is processed": [True] * rows,
+            }
+        )
+
+    def test_auto_compaction_keeps_values(self):
+        """
+        Tests the chosen dtypes use less memory and write the same csv and parquet
+        """
+        # Method execution
+        df, report = DtypeCompaction().apply(self.df)
+
+        # Tests after method execution
+        self.assertEqual(
+            report["columns"],
+            {
+                "HomeTeam": "category",
+                "MatchId": "string",
+                "FTHG": "int8",
+                "B365H": "float32",
+            },
+        )
+        self.assertLess(report["bytes_after"], report["bytes_before"] / 2)
+        self.assertEqual(df.to_csv(index=False), self.df.to_csv(index=False))
+        compacted = apply_schema(pa.Table.from_pandas(df, preserve_index=False))
+        plain = apply_schema(pa.Table.from_pandas(self.df, preserve_index=False))
+        self.assertTrue(compacted.schema.equals(plain.schema))
+        self.assertTrue(compacted.equals(plain))
+
+    def test_configured_columns(self):
+        """
+        Tests only the configured columns are converted and unknown kinds fail
+        """
+        # Test init
+        compaction = DtypeCompaction({"MatchId": "category"}, auto=False)
+
+        # Method execution
+        df, report = compaction.apply(self.df)
+
+        # Tests after method execution
+        self.assertEqual(list(report["columns"]), ["MatchId"])
+        self.assertIsInstance(df["MatchId"].dtype, pd.CategoricalDtype)
+        self.assertEqual(df["FTHG"].dtype, self.df["FTHG"].dtype)
+        with self.assertRaises(ValueError):
+            DtypeCompaction({"FTHG": "int4"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+"""TestLeaseStoreMethods"""
+import json
+import os
+import time
+import unittest
+from unittest.mock import patch
+
+import boto3
+from moto import mock_s3
+
+from epl.common.leases import LeaseStore
+from epl.common.s3 import S3BucketConnector
+
+
+class TestLeaseStoreMethods(unittest.TestCase):
+    """
+    Testing the LeaseStore class
+    """
+
+    def setUp(self):
+        """
+        Setting up the environment
+        """
+        # mocking s3 connection start
+        self.mock_s3 = mock_s3()
+        self.mock_s3.start()
+        # Defining the class arguments
+        self.s3_access_key = "AWS_ACCESS_KEY_ID"
+        self.s3_secret_key = "AWS_SECRET_ACCESS_KEY"
+        self.s3_endpoint_url = "https://s3.eu-central-1.amazonaws.com"
+        self.s3_bucket_name = "test-bucket"
+        # Creating s3 access keys as environment variables
+        os.environ[self.s3_access_key] = "KEY1"
+        os.environ[self.s3_secret_key] = "KEY2"
+        # Creating a bucket on the mocked s3
+        self.s3 = boto3.resource(service_name="s3", endpoint_url=self.s3_endpoint_url)
+        self.s3.create_bucket(
+            Bucket=self.s3_bucket_name,
+            CreateBucketConfiguration={"LocationConstraint": "eu-central-1"},
+        )
+        self.s3_bucket = self.s3.Bucket(self.s3_bucket_name)
+        # Creating a testing instance
+        self.s3_bucket_conn = S3BucketConnector(
+            self.s3_access_key, self.s3_secret_key, self.s3_bucket_name
+        )
+
+    def tearDown(self):
+        """
+        Executing after unittests
+        """
+        # mocking s3 connection stop
+        self.mock_s3.stop()
+
+    def test_lease_is_exclusive_until_it_expires(self):
+        """
+        Tests a held lease is refused to other owners, taken over once expired
+        and lost by the earlier owner
+        """
+        # Test init
+        first = LeaseStore(self.s3_bucket_conn, lease_seconds=60, owner="first")
+        second = LeaseStore(self.s3_bucket_conn, lease_seconds=60, owner="second")
+        name = "2023-03-18_2023-03-19"
+
+        # Method execution
+        taken = first.acquire(name)
+        refused = not second.acquire(name)
+        lease_key = "leases/locks/2023-03-18_2023-03-19.json"
+        self.s3_bucket.put_object(
+            Body=json.dumps({"owner": "first", "expires_at": time.time() - 1}),
+            Key=lease_key,
+        )
+        taken_over = second.acquire(name)
+        lost = not first.renew(name)
+        first.release(name)
+        kept = second.holder(name)[0]["owner"]
+        second.release(name)
+
+        # Tests after method execution
+        self.assertTrue(taken)
+        self.assertTrue(refused)
+        self.assertTrue(taken_over)
+        self.assertTrue(lost)
+        self.assertEqual(kept, "second")
+        self.assertEqual(second.holder(name), (None, None))
+
+    def test_heartbeat_renews_the_lease(self):
+        """
+        Tests the heartbeat moves the expiry forward while the block runs
+        """
+        # Test init
+        leases = LeaseStore(self.s3_bucket_conn, lease_seconds=0.6, owner="worker")
+        leases.acquire("shard")
+        expires_at = leases.holder("shard")[0]["expires_at"]
+
+        # Method execution
+        with leases.heartbeat("shard", interval=0.1) as lost:
+            time.sleep(1)
+            renewed = leases.holder("shard")[0]
+
+        # Tests after method execution
+        self.assertFalse(lost.is_set())
+        self.assertGreater(renewed["expires_at"], expires_at + 0.3)
+        self.assertFalse(leases.expired(renewed))
+
+    def test_lease_writes_keep_the_date_index(self):
+        """
+        Tests taking and releasing a lease keeps the listing of the dated
+        folders, while writing to a dated folder lists the bucket again
+        """
+        # Test init
+        self.s3_bucket.put_object(Body="a", Key="football-2023-03-18/a.csv")
+        leases = LeaseStore(self.s3_bucket_conn, lease_seconds=60, owner="worker")
+        self.s3_bucket_conn.list_files_in_prefix("2023-03-18")
+
+        # Method execution
+        with patch.object(
+            self.s3_bucket_conn, "_paginate", wraps=self.s3_bucket_conn._paginate
+        ) as paginate:
+            leases.acquire("2023-03-18_2023-03-19")
+            leases.release("2023-03-18_2023-03-19")
+            self.s3_bucket_conn.list_files_in_prefix("2023-03-18")
+            kept = paginate.call_count
+            self.s3_bucket_conn.write_object("b", "football-2023-03-18/b.csv")
+            relisted = self.s3_bucket_conn.list_files_in_prefix("2023-03-18")
+
+        # Tests after method execution
+        self.assertEqual(kept, 0)
+        self.assertEqual(paginate.call_count, 1)
+        self.assertEqual(
+            relisted, ["football-2023-03-18/a.csv", "football-2023-03-18/b.csv"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+"""TestMetaProcessMethods"""
+import os
+import unittest
+
+import boto3
+from moto import mock_s3
+
+from epl.common.meta_process import MetaProcess
+from epl.common.meta_store import MetaStore
+from epl.common.s3 import S3BucketConnector
+
+
+class TestMetaProcessMethods(unittest.TestCase):
+    """
+    Testing the MetaProcess class
+    """
+
+    def setUp(self):
+        """
+        Setting up the environment
+        """
+        # mocking s3 connection start
+        self.mock_s3 = mock_s3()
+        self.mock_s3.start()
+        # Defining the class arguments
+        self.s3_access_key = "AWS_ACCESS_KEY_ID"
+        self.s3_secret_key = "AWS_SECRET_ACCESS_KEY"
+        self.s3_endpoint_url = "https://s3.eu-central-1.amazonaws.com"
+        self.s3_bucket_name = "test-bucket"
+        # Creating s3 access keys as environment variables
+        os.environ[self.s3_access_key] = "KEY1"
+        os.environ[self.s3_secret_key] = "KEY2"
+        # Creating a bucket on the mocked s3
+        self.s3 = boto3.resource(service_name="s3", endpoint_url=self.s3_endpoint_url)
+        self.s3.create_bucket(
+            Bucket=self.s3_bucket_name,
+            CreateBucketConfiguration={"LocationConstraint": "eu-central-1"},
+        )
+        self.s3_bucket = self.s3.Bucket(self.s3_bucket_name)
+        # Creating a testing instance
+        self.s3_bucket_conn = S3BucketConnector(
+            self.s3_access_key, self.s3_secret_key, self.s3_bucket_name
+        )
+        self.meta_process = MetaProcess(self.s3_bucket_conn)
+        # source folders with one file per day
+        for day in ["2023-03-16", "2023-03-17", "2023-03-18", "2023-03-19"]:
+            self.s3_bucket.put_object(Key=f"football-{day}/")
+            self.s3_bucket.put_object(Body="col1\n1", Key=f"football-{day}/a.csv")
+
+    def tearDown(self):
+        """
+        Executing after unittests
+        """
+        # mocking s3 connection stop
+        self.mock_s3.stop()
+
+    def test_execution_list_date_range(self):
+        """
+        Tests processed dates are skipped unless forced and the range is inclusive
+        """
+        # Test init
+        MetaStore(self.s3_bucket_conn).commit([["2023-03-17", "x"]])
+
+        # Method execution
+        pending = self.meta_process.execution_list(
+            tgr_date="2023-03-18", from_date="2023-03-17"
+        )
+        forced = self.meta_process.execution_list(
+            tgr_date="2023-03-18", from_date="2023-03-17", force=True
+        )
+        today = self.meta_process.execution_list()
+
+        # Tests after method execution
+        self.assertEqual(pending, ["2023-03-18"])
+        self.assertEqual(forced, ["2023-03-17", "2023-03-18"])
+        self.assertEqual(today, ["2023-03-16", "2023-03-18", "2023-03-19"])
+
+    def test_plan_sizes_from_listing(self):
+        """
+        Tests the plan counts the objects and bytes of every date
+        """
+        # Test init
+        self.s3_bucket.put_object(Body="col1\n22", Key="football-2023-03-18/b.csv")
+
+        # Method execution
+        plan = self.meta_process.plan(["2023-03-17", "2023-03-18"])
+
+        # Tests after method execution
+        self.assertEqual(
+            plan,
+            [
+                {"date": "2023-03-17", "objects": 1, "bytes": 6},
+                {"date": "2023-03-18", "objects": 2, "bytes": 13},
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+"""TestMetaStoreMethods"""
+import json
+import os
+import unittest
+from unittest.mock import patch
+
+import boto3
+from botocore.exceptions import ClientError
+from moto import mock_s3
+
+from epl.common.meta_store import MetaStore
+from epl.common.s3 import S3BucketConnector
+
+
+class TestMetaStoreMethods(unittest.TestCase):
+    """
+    Testing the MetaStore class
+    """
+
+    def setUp(self):
+        """
+        Setting up the environment
+        """
+        # mocking s3 connection start
+        self.mock_s3 = mock_s3()
+        self.mock_s3.start()
+        # Defining the class arguments
+        self.s3_access_key = "AWS_ACCESS_KEY_ID"
+        self.s3_secret_key = "AWS_SECRET_ACCESS_KEY"
+        self.s3_endpoint_url = "https://s3.eu-central-1.amazonaws.com"
+        self.s3_bucket_name = "test-bucket"
+        # Creating s3 access keys as environment variables
+        os.environ[self.s3_access_key] = "KEY1"
+        os.environ[self.s3_secret_key] = "KEY2"
+        # Creating a bucket on the mocked s3
+        self.s3 = boto3.resource(service_name="s3", endpoint_url=self.s3_endpoint_url)
+        self.s3.create_bucket(
+            Bucket=self.s3_bucket_name,
+            CreateBucketConfiguration={"LocationConstraint": "eu-central-1"},
+        )
+        self.s3_bucket = self.s3.Bucket(self.s3_bucket_name)
+        # Creating a testing instance
+        self.s3_bucket_conn = S3BucketConnector(
+            self.s3_access_key, self.s3_secret_key, self.s3_bucket_name
+        )
+        self.meta_store = MetaStore(self.s3_bucket_conn)
+        # source folders
+        for day in ["2023-03-16", "2023-03-17", "2023-03-18", "2023-03-19"]:
+            self.s3_bucket.put_object(Key=f"football-{day}/")
+
+    def tearDown(self):
+        """
+        Executing after unittests
+        """
+        # mocking s3 connection stop
+        self.mock_s3.stop()
+
+    def test_load_state_bootstraps_from_legacy_file(self):
+        """
+        Tests unprocessed folders before the legacy watermark become gaps
+        """
+        # Test init
+        csv_content = "folder,Processed date\n2023-03-16,x\n2023-03-18,x"
+        self.s3_bucket.put_object(Body=csv_content, Key="processed_data.csv")
+
+        # Method execution
+        state = self.meta_store.load_state()
+
+        # Tests after method execution
+        self.assertEqual(state, {"watermark": "2023-03-18", "gaps": ["2023-03-17"]})
+        self.assertEqual(
+            self.s3_bucket_conn.list_folders(), ["2023-03-17", "2023-03-19"]
+        )
+
+    def test_load_state_without_meta_data(self):
+        """
+        Tests every folder is pending when no meta data exists
+        """
+
+        # Method execution
+        list_result = self.s3_bucket_conn.list_folders()
+
+        # Tests after method execution
+        self.assertEqual(len(list_result), 4)
+
+    def test_commit_moves_watermark_and_keeps_gaps(self):
+        """
+        Tests folders skipped by a run stay pending after the watermark moves
+        """
+
+        # Method execution
+        self.meta_store.commit([["2023-03-16", "x"], ["2023-03-18", "x"]])
+        first = self.s3_bucket_conn.list_folders()
+        self.meta_store.commit([["2023-03-17", "x"]])
+        second = self.s3_bucket_conn.list_folders()
+
+        # Tests after method execution
+        state = json.loads(
+            self.s3_bucket.Object(key="meta/state.json").get().get("Body").read()
+        )
+        logs = list(self.s3_bucket.objects.filter(Prefix="meta/processed/"))
+        self.assertEqual(first, ["2023-03-17", "2023-03-19"])
+        self.assertEqual(second, ["2023-03-19"])
+        self.assertEqual(state, {"watermark": "2023-03-18", "gaps": []})
+        self.assertEqual(len(logs), 2)
+
+    def test_commit_records_survive_a_lost_state_write(self):
+        """
+        Tests dates committed by a run stay done when a concurrent run
+        overwrites the state without them
+        """
+        # Test init
+        self.meta_store.commit([["2023-03-16", "x"]])
+        stale = self.s3_bucket.Object(key="meta/state.json").get().get("Body").read()
+        self.meta_store.commit([["2023-03-17", "x"]])
+        # the other run wins with the state it computed before the second commit
+        self.s3_bucket.put_object(Body=stale, Key="meta/state.json")
+
+        # Method execution
+        pending = self.s3_bucket_conn.list_folders()
+        self.meta_store.commit([["2023-03-19", "x"]])
+
+        # Tests after method execution
+        state = json.loads(
+            self.s3_bucket.Object(key="meta/state.json").get().get("Body").read()
+        )
+        records = list(self.s3_bucket.objects.filter(Prefix="meta/commits/"))
+        self.assertEqual(pending, ["2023-03-18", "2023-03-19"])
+        self.assertEqual(state, {"watermark": "2023-03-19", "gaps": ["2023-03-18"]})
+        # the record of 2023-03-16 was folded into the state the second commit read
+        self.assertEqual(len(records), 2)
+
+    def test_commit_removes_folded_records(self):
+        """
+        Tests the records folded into the state a commit read are removed, so
+        the records listed do not grow with the history
+        """
+
+        # Method execution
+        for day in ["2023-03-16", "2023-03-17", "2023-03-18"]:
+            self.meta_store.commit([[day, "x"]])
+
+        # Tests after method execution
+        records = [
+            obj.key for obj in self.s3_bucket.objects.filter(Prefix="meta/commits/")
+        ]
+        self.assertEqual(records, ["meta/commits/date=2023-03-18.json"])
+        self.assertEqual(self.s3_bucket_conn.list_folders(), ["2023-03-19"])
+
+    def test_commit_retries_a_conflicting_state_write(self):
+        """
+        Tests the state write is conditioned on the ETag it was read with and
+        is retried after a conflict
+        """
+        # Test init
+        self.meta_store.commit([["2023-03-16", "x"]])
+        etag = self.s3_bucket.Object(key="meta/state.json").e_tag
+        client = self.s3_bucket_conn._client
+        put_object = client.put_object
+        calls = []
+
+        def _put_object(**kwargs):
+            if kwargs["Key"] == "meta/state.json":
+                calls.append(kwargs)
+                if len(calls) == 1:
+                    raise ClientError(
+                        {"Error": {"Code": "PreconditionFailed"}}, "PutObject"
+                    )
+            return put_object(**kwargs)
+
+        # Method execution
+        with patch.object(client, "put_object", side_effect=_put_object), patch(
+            "epl.common.meta_store.time.sleep"
+        ):
+            result = self.meta_store.commit([["2023-03-17", "x"]])
+
+        # Tests after method execution
+        state = json.loads(
+            self.s3_bucket.Object(key="meta/state.json").get().get("Body").read()
+        )
+        self.assertTrue(result)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual([call["IfMatch"] for call in calls], [etag, etag])
+        self.assertEqual(state, {"watermark": "2023-03-17", "gaps": []})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+"""TestMetricsMethods"""
+import json
+import os
+import pickle
+import tempfile
+import unittest
+
+from epl.common.metrics import (InMemoryRecorder, JsonLogExporter, Metrics,
+                                PrometheusTextfileExporter)
+
+
+class TestMetricsMethods(unittest.TestCase):
+    """
+    Testing the Metrics class and its exporters
+    """
+
+    def setUp(self):
+        """
+        Setting up the environment
+        """
+        self.recorder = InMemoryRecorder()
+        self.metrics = Metrics([self.recorder])
+
+    def test_timer_and_counters(self):
+        """
+        Tests timings are summed per stage and counters are added up
+        """
+        # Method execution
+        for _ in range(2):
+            with self.metrics.timer("download"):
+                pass
+        with self.assertRaises(ValueError):
+            with self.metrics.timer("parse"):
+                raise ValueError("bad file")
+        self.metrics.incr("rows_read", 10)
+        self.metrics.incr("rows_read", 5)
+        self.metrics.incr("retries")
+        snapshot = self.metrics.export()
+
+        # Tests after method execution
+        self.assertEqual(self.recorder.last, snapshot)
+        self.assertEqual(snapshot["stages"]["download"]["calls"], 2)
+        self.assertEqual(snapshot["stages"]["parse"]["calls"], 1)
+        self.assertEqual(snapshot["counters"], {"rows_read": 15, "retries": 1})
+
+    def test_reset_and_pickle(self):
+        """
+        Tests reset clears the values and a pickled copy starts empty
+        """
+        # Test init
+        self.metrics.incr("rows_read", 10)
+
+        # Method execution
+        copy = pickle.loads(pickle.dumps(self.metrics))
+        self.metrics.reset()
+
+        # Tests after method execution
+        self.assertEqual(self.metrics.snapshot(), {"stages": {}, "counters": {}})
+        self.assertEqual(copy.snapshot(), {"stages": {}, "counters": {}})
+        self.assertEqual(len(copy.exporters), 1)
+
+    def test_json_log_exporter(self):
+        """
+        Tests one JSON line is logged per stage plus one for the counters
+        """
+        # Test init
+        self.metrics.record("upload", 0.5)
+        self.metrics.incr("bytes_uploaded", 100)
+        exporter = JsonLogExporter("epl.test.metrics")
+
+        # Method execution
+        with self.assertLogs("epl.test.metrics", level="INFO") as logs:
+            exporter.export(self.metrics.snapshot())
+
+        # Tests after method execution
+        lines = [json.loads(record.getMessage()) for record in logs.records]
+        self.assertEqual(
+            lines,
+            [
+                {
+                    "metric": "stage",
+                    "stage": "upload",
+                    "seconds": 0.5,
+                    "calls": 1,
+                    "max_seconds": 0.5,
+                },
+                {"metric": "counters", "bytes_uploaded": 100},
+            ],
+        )
+
+    def test_prometheus_textfile_exporter(self):
+        """
+        Tests the textfile holds a sample per stage and counter
+        """
+        # Test init
+        self.metrics.record("download", 1.5)
+        self.metrics.incr("objects_downloaded", 3)
+        directory = tempfile.TemporaryDirectory()
+        path = os.path.join(directory.name, "metrics", "epl.prom")
+
+        # Method execution
+        PrometheusTextfileExporter(path).export(self.metrics.snapshot())
+
+        # Tests after method execution
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertIn('epl_stage_seconds{stage="download"} 1.5', lines)
+        self.assertIn('epl_stage_calls{stage="download"} 1', lines)
+        self.assertIn("epl_objects_downloaded 3", lines)
+        self.assertEqual(os.listdir(os.path.dirname(path)), ["epl.prom"])
+        directory.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""TestS3MultipartWriterMethods"""
+import os
+import unittest
+from unittest.mock import patch
+
+import boto3
+from botocore.exceptions import ClientError
+from moto import mock_s3
+
+from epl.common.multipart import MIN_PART_SIZE, S3MultipartWriter
+
+
+class TestS3MultipartWriterMethods(unittest.TestCase):
+    """
+    Testing the S3MultipartWriter class
+    """
+
+    def setUp(self):
+        """
+        Setting up the environment
+        """
+        # mocking s3 connection start
+        self.mock_s3 = mock_s3()
+        self.mock_s3.start()
+        # Defining the class arguments
+        self.s3_endpoint_url = "https://s3.eu-central-1.amazonaws.com"
+        self.s3_bucket_name = "test-bucket"
+        os.environ["AWS_ACCESS_KEY_ID"] = "KEY1"
+        os.environ["AWS_SECRET_ACCESS_KEY"] = "KEY2"
+        # moto does not decode the aws-chunked checksum framing of upload_part
+        os.environ["AWS_REQUEST_CHECKSUM_CALCULATION"] = "when_required"
+        # Creating a bucket on the mocked s3
+        self.s3 = boto3.resource(service_name="s3", endpoint_url=self.s3_endpoint_url)
+        self.s3.create_bucket(
+            Bucket=self.s3_bucket_name,
+            CreateBucketConfiguration={"LocationConstraint": "eu-central-1"},
+        )
+        self.s3_bucket = self.s3.Bucket(self.s3_bucket_name)
+        self.client = self.s3.meta.client
+
+    def tearDown(self):
+        """
+        Executing after unittests
+        """
+        # mocking s3 connection stop
+        self.mock_s3.stop()
+
+    def test_write_uploads_full_parts(self):
+        """
+        Tests the payload is uploaded in parts and reassembled in order
+        """
+        # Test init
+        payload = b"".join(bytes([i]) * (MIN_PART_SIZE // 2) for i in range(5))
+
+        # Method execution
+        with S3MultipartWriter(self.client, self.s3_bucket_name, "out.bin") as writer:
+            for start in range(0, len(payload), 1024 * 1024):
+                writer.write(payload[start : start + 1024 * 1024])
+
+        # Tests after method execution
+        body = self.s3_bucket.Object(key="out.bin").get().get("Body").read()
+        self.assertEqual(len(writer._parts), 3)
+        self.assertEqual(body, payload)
+
+    def test_small_write_uses_single_put(self):
+        """
+        Tests an output smaller than one part is written without multipart upload
+        """
+
+        # Method execution
+        with S3MultipartWriter(self.client, self.s3_bucket_name, "out.csv") as writer:
+            writer.write("col1\n1\n")
+
+        # Tests after method execution
+        body = self.s3_bucket.Object(key="out.csv").get().get("Body").read()
+        self.assertIsNone(writer._upload_id)
+        self.assertEqual(body, b"col1\n1\n")
+
+    def test_error_aborts_upload(self):
+        """
+        Tests a failing writer leaves neither an object nor open uploads
+        """
+
+        # Method execution
+        with self.assertRaises(ValueError):
+            with S3MultipartWriter(
+                self.client, self.s3_bucket_name, "out.bin"
+            ) as writer:
+                writer.write(b"a" * (MIN_PART_SIZE + 1))
+                raise ValueError("failed")
+
+        # Tests after method execution
+        uploads = self.client.list_multipart_uploads(Bucket=self.s3_bucket_name)
+        self.assertEqual(list(self.s3_bucket.objects.all()), [])
+        self.assertEqual(uploads.get("Uploads", []), [])
+
+    def test_parallel_part_uploads_keep_part_order(self):
+        """
+        Tests parts uploaded at the same time are completed in order
+        """
+        # Test init
+        payload = b"".join(bytes([i]) * MIN_PART_SIZE for i in range(4)) + b"end"
+
+        # Method execution
+        with S3MultipartWriter(
+            self.client, self.s3_bucket_name, "out.bin", max_workers=3
+        ) as writer:
+            writer.write(payload)
+
+        # Tests after method execution
+        body = self.s3_bucket.Object(key="out.bin").get().get("Body").read()
+        self.assertEqual(len(writer._parts), 5)
+        self.assertEqual(body, payload)
+
+    def test_failed_part_aborts_upload(self):
+        """
+        Tests a failing part upload aborts the upload and raises
+        """
+        # Test init
+        error = ClientError({"Error": {"Code": "InternalError"}}, "UploadPart")
+
+        # Method execution
+        with patch.object(self.client, "upload_part", side_effect=error):
+            with self.assertRaises(ClientError):
+                with S3MultipartWriter(
+                    self.client, self.s3_bucket_name, "out.bin", max_workers=2
+                ) as writer:
+                    writer.write(b"a" * MIN_PART_SIZE * 3)
+
+        # Tests after method execution
+        uploads = self.client.list_multipart_uploads(Bucket=self.s3_bucket_name)
+        self.assertTrue(writer.closed)
+        self.assertEqual(list(self.s3_bucket.objects.all()), [])
+        self.assertEqual(uploads.get("Uploads", []), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
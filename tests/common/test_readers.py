@@ -0,0 +1,127 @@
+"""TestReaders"""
+import unittest
+
+import pyarrow as pa
+
+from epl.common.custom_exceptions import WrongFormatException
+from epl.common.readers import combine, read_csv_bytes
+
+
+class TestReaders(unittest.TestCase):
+    """
+    Testing the csv reader engines
+    """
+
+    def setUp(self):
+        """
+        Setting up the test data
+        """
+        self.body = b"HomeTeam;FTHG;Referee\nArsenal;2;M Dean\nChelsea;1;M Oliver"
+        self.schema = {"FTHG": "int16", "Referee": "string", "Is processed": "bool"}
+
+    def test_engines_read_declared_types(self):
+        """
+        Tests every engine returns the same data with the declared types
+        """
+        for engine in ["pandas-c", "pandas-pyarrow", "pyarrow"]:
+            # Method execution
+            data = read_csv_bytes(self.body, engine, sep=";", schema=self.schema)
+            df = combine([data, data])
+
+            # Tests after method execution
+            self.assertEqual(df["HomeTeam"].tolist(), ["Arsenal", "Chelsea"] * 2)
+            self.assertEqual(df["FTHG"].tolist(), [2, 1, 2, 1])
+            self.assertIn("int16", str(df["FTHG"].dtype).lower())
+
+    def test_engines_read_blank_cells_and_rows(self):
+        """
+        Tests a blank cell of a declared integer column is read as null and
+        a trailing row of blank cells is dropped by every engine
+        """
+        # Test init
+        body = b"HomeTeam;FTHG;Referee\nArsenal;;M Dean\nChelsea;1;M Oliver\n;;\n"
+
+        for engine in ["pandas-c", "pandas-pyarrow", "pyarrow"]:
+            # Method execution
+            df = combine([read_csv_bytes(body, engine, sep=";", schema=self.schema)])
+
+            # Tests after method execution
+            self.assertEqual(df["HomeTeam"].tolist(), ["Arsenal", "Chelsea"])
+            self.assertTrue(df["FTHG"].isna().tolist()[0])
+            self.assertEqual(df["FTHG"].tolist()[1], 1)
+            self.assertIn("int16", str(df["FTHG"].dtype).lower())
+
+    def test_engines_keep_declared_strings(self):
+        """
+        Tests declared string columns holding values that look like times or
+        numbers are kept as written by every engine
+        """
+        # Test init
+        body = (
+            b"HomeTeam;Time;Referee;FTHG\nArsenal;15:00;007;2\nChelsea;17:30;M Oliver;1"
+        )
+        schema = {"Time": "string", "Referee": "string", "FTHG": "int64"}
+
+        # Method execution
+        values = {
+            engine: combine([read_csv_bytes(body, engine, sep=";", schema=schema)])
+            .astype(str)
+            .values.tolist()
+            for engine in ["pandas-c", "pandas-pyarrow", "pyarrow"]
+        }
+
+        # Tests after method execution
+        self.assertEqual(
+            values["pandas-c"],
+            [["Arsenal", "15:00", "007", "2"], ["Chelsea", "17:30", "M Oliver", "1"]],
+        )
+        self.assertEqual(values["pandas-pyarrow"], values["pandas-c"])
+        self.assertEqual(values["pyarrow"], values["pandas-c"])
+
+    def test_engines_combine_files_of_mixed_types(self):
+        """
+        Tests an undeclared column read as numbers in one file and as strings
+        in another is combined by every engine
+        """
+        # Test init
+        bodies = [
+            b"HomeTeam;Attendance\nArsenal;60000",
+            b"HomeTeam;Attendance\nLeeds;unknown",
+        ]
+
+        for engine in ["pandas-c", "pandas-pyarrow", "pyarrow"]:
+            # Method execution
+            df = combine([read_csv_bytes(body, engine, sep=";") for body in bodies])
+
+            # Tests after method execution
+            self.assertEqual(df["HomeTeam"].tolist(), ["Arsenal", "Leeds"])
+            self.assertEqual(df["Attendance"].tolist(), [60000, "unknown"])
+
+    def test_pyarrow_engine_returns_arrow_table(self):
+        """
+        Tests the pyarrow engine skips pandas until the combine step
+        """
+
+        # Method execution
+        data = read_csv_bytes(self.body, "pyarrow", sep=";", schema=self.schema)
+
+        # Tests after method execution
+        self.assertIsInstance(data, pa.Table)
+        self.assertEqual(data.schema.field("FTHG").type, pa.int16())
+
+    def test_unknown_engine(self):
+        """
+        Tests an unsupported engine raises WrongFormatException
+        """
+        with self.assertRaises(WrongFormatException):
+            read_csv_bytes(self.body, "polars")
+
+    def test_combine_no_files(self):
+        """
+        Tests combining no files returns an empty dataframe
+        """
+        self.assertTrue(combine([]).empty)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,12 +1,26 @@
 """TestS3BucketConnectorMethods"""
+import datetime
+import json
+import multiprocessing
 import os
+import pickle
+import tempfile
 import unittest
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from unittest.mock import ANY, patch
 
 import boto3
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from botocore.exceptions import ClientError
 from moto import mock_s3
 
-from epl.common.s3 import S3BucketConnector
+from epl.common.cache import ObjectCache
+from epl.common.metrics import InMemoryRecorder, Metrics
+from epl.common.s3 import S3BucketConnector, _init_parse_worker
+from epl.transfomers.stages import TransformPipeline
 
 
 class TestS3BucketConnectorMethods(unittest.TestCase):
@@ -106,6 +120,85 @@ class TestS3BucketConnectorMethods(unittest.TestCase):
             }
         )
 
+    def test_date_index_lists_each_folder_once(self):
+        """
+        Tests the date index maps dated folders to their files and is
+        reused for every date without listing the bucket again
+        """
+        # Test init
+        self.s3_bucket.put_object(Key="football-2023-03-18/")
+        self.s3_bucket.put_object(Body="col1", Key="football-2023-03-18/a.csv")
+        self.s3_bucket.put_object(Body="col1", Key="football-2023-03-19/b.csv")
+        self.s3_bucket.put_object(Body="col1", Key="reports/c.csv")
+        self.s3_bucket.put_object(Body="col1", Key="processed_data.csv")
+
+        # Method execution
+        with patch.object(
+            self.s3_bucket_conn, "_paginate", wraps=self.s3_bucket_conn._paginate
+        ) as paginate:
+            index = self.s3_bucket_conn.date_index()
+            self.s3_bucket_conn.list_files_in_prefix("2023-03-18")
+            self.s3_bucket_conn.list_files_in_prefix("2023-03-19")
+
+        # Tests after method execution
+        self.assertEqual(
+            index,
+            {
+                "2023-03-18": ["football-2023-03-18/a.csv"],
+                "2023-03-19": ["football-2023-03-19/b.csv"],
+            },
+        )
+        # one delimiter listing plus one listing per folder
+        self.assertEqual(paginate.call_count, 3)
+
+    def test_listing_a_date_scales_with_the_date(self):
+        """
+        Tests listing the files of one date lists only its folder, whatever
+        the number of older folders, and a write lists that folder again
+        """
+        # Test init
+        for day in range(300):
+            date = (datetime.date(2020, 1, 1) + datetime.timedelta(day)).isoformat()
+            self.s3_bucket.put_object(Body="col1", Key=f"football-{date}/a.csv")
+        client = self.s3_bucket_conn._client
+
+        # Method execution
+        with patch.object(
+            client, "list_objects_v2", wraps=client.list_objects_v2
+        ) as list_objects:
+            files = self.s3_bucket_conn.list_files_in_prefix("2020-05-05")
+            self.s3_bucket_conn.etag("football-2020-05-05/a.csv")
+            first = list_objects.call_count
+            self.s3_bucket_conn.write_object("col1", "football-2020-05-06/b.csv")
+            self.s3_bucket_conn.list_files_in_prefix("2020-05-05")
+            self.s3_bucket_conn.list_files_in_prefix("2020-05-06")
+
+        # Tests after method execution
+        self.assertEqual(files, ["football-2020-05-05/a.csv"])
+        # one delimiter listing and one listing of the folder
+        self.assertEqual(first, 2)
+        self.assertEqual(list_objects.call_count, 3)
+
+    def test_list_keys_and_etag(self):
+        """
+        Tests keys are listed under a prefix and ETags are returned from the
+        date index or a HEAD request
+        """
+        # Test init
+        self.s3_bucket.put_object(Body="a", Key="prefix-2023-03-18/a.csv")
+        self.s3_bucket.put_object(Body="b", Key="meta/state.json")
+
+        # Method execution
+        keys = self.s3_bucket_conn.list_keys("prefix-2023-03-18/")
+        dated = self.s3_bucket_conn.etag("prefix-2023-03-18/a.csv")
+        other = self.s3_bucket_conn.etag("meta/state.json")
+
+        # Tests after method execution
+        self.assertEqual(keys, ["prefix-2023-03-18/a.csv"])
+        self.assertEqual(dated, self.s3_bucket.Object("prefix-2023-03-18/a.csv").e_tag)
+        self.assertEqual(other, self.s3_bucket.Object("meta/state.json").e_tag)
+        self.assertIsNone(self.s3_bucket_conn.etag("meta/missing.json"))
+
     def test_to_list_all_folders_requiring_processing(self):
         """
         Test folders against processed_data.csv file to see
@@ -209,6 +302,194 @@ class TestS3BucketConnectorMethods(unittest.TestCase):
             Delete={"Objects": [{"Key": prefix}, {"Key": key1}, {"Key": key2}]}
         )
 
+    def test_to_read_in_csv_files_concurrently_keeps_key_order(self):
+        """
+        Test concurrent download returns the files in input key order
+        """
+        # Test init
+        keys = [f"prefix-2023-03-18/data{i}.csv" for i in range(20)]
+        for i, key in enumerate(keys):
+            self.s3_bucket.put_object(Body=f"col1\n{i}", Key=key)
+
+        # Method execution
+        list_result = self.s3_bucket_conn.read_csv_list_combine_convert_to_df(
+            keys, max_workers=8
+        )
+
+        # Tests after method execution
+        self.assertEqual(list_result["col1"].tolist(), list(range(20)))
+
+    def test_to_read_in_csv_files_with_pyarrow_engine(self):
+        """
+        Test the pyarrow engine combines the files with the declared schema
+        """
+        # Test init
+        keys = [f"prefix-2023-03-18/data{i}.csv" for i in range(3)]
+        for i, key in enumerate(keys):
+            self.s3_bucket.put_object(Body=f"col1,col2\n{i},a", Key=key)
+        self.s3_bucket_conn.schema = {"col1": "int8"}
+
+        # Method execution
+        list_result = self.s3_bucket_conn.read_csv_list_combine_convert_to_df(
+            keys, max_workers=2, engine="pyarrow"
+        )
+
+        # Tests after method execution
+        self.assertEqual(list_result["col1"].tolist(), [0, 1, 2])
+        # integers are read as nullable integers as with the pandas-c engine
+        self.assertEqual(str(list_result["col1"].dtype), "Int8")
+
+    def test_to_read_in_csv_files_from_cache(self):
+        """
+        Test cached objects are not downloaded again until their ETag changes
+        """
+        # Test init
+        key1 = "prefix-2023-03-18/data1.csv"
+        key2 = "prefix-2023-03-18/data2.csv"
+        self.s3_bucket.put_object(Body="col1\n1", Key=key1)
+        self.s3_bucket.put_object(Body="col1\n2", Key=key2)
+        cache_dir = tempfile.TemporaryDirectory()
+        self.s3_bucket_conn.cache = ObjectCache(cache_dir.name)
+        client = self.s3_bucket_conn._client
+        keys = self.s3_bucket_conn.list_files_in_prefix("2023-03-18")
+
+        # Method execution
+        with patch.object(client, "get_object", wraps=client.get_object) as get:
+            first = self.s3_bucket_conn.read_csv_list_combine_convert_to_df(keys)
+            second = self.s3_bucket_conn.read_csv_list_combine_convert_to_df(keys)
+            self.s3_bucket.put_object(Body="col1\n3", Key=key2)
+            # a new run lists the bucket again and sees the new ETag
+            self.s3_bucket_conn.date_index(refresh=True)
+            third = self.s3_bucket_conn.read_csv_list_combine_convert_to_df(keys)
+
+        # Tests after method execution
+        self.assertEqual(first["col1"].tolist(), [1, 2])
+        self.assertEqual(second["col1"].tolist(), [1, 2])
+        self.assertEqual(third["col1"].tolist(), [1, 3])
+        self.assertEqual(get.call_count, 3)
+        self.assertEqual(
+            self.s3_bucket_conn.cache_stats(),
+            {"hits": 3, "misses": 3, "entries": 3, "bytes": ANY},
+        )
+        cache_dir.cleanup()
+
+    def test_to_read_in_csv_files_retries_transient_errors(self):
+        """
+        Test a throttled download is retried and then succeeds
+        """
+        # Test init
+        key = "prefix-2023-03-18/data1.csv"
+        self.s3_bucket.put_object(Body="col1\n1", Key=key)
+        client = self.s3_bucket_conn._client
+        error = ClientError({"Error": {"Code": "SlowDown"}}, "GetObject")
+        response = client.get_object(Bucket=self.s3_bucket_name, Key=key)
+        self.s3_bucket_conn.backoff = 0
+
+        # Method execution
+        with patch.object(
+            client, "get_object", side_effect=[error, response]
+        ) as get_object:
+            list_result = self.s3_bucket_conn.read_csv_list_combine_convert_to_df([key])
+
+        # Tests after method execution
+        self.assertEqual(get_object.call_count, 2)
+        self.assertEqual(list_result.shape[0], 1)
+
+    def test_to_read_in_csv_files_in_parse_worker_processes(self):
+        """
+        Test worker processes parse and transform the files in key order and
+        their metrics are merged into the connector
+        """
+        # Test init
+        keys = [f"prefix-2023-03-18/data{i}.csv" for i in range(6)]
+        for i, key in enumerate(keys):
+            self.s3_bucket.put_object(Body=f"col1\n{i}", Key=key)
+        self.s3_bucket_conn.parse_workers = 2
+        # forked workers share the mocked bucket, the connector spawns them
+        self.s3_bucket_conn._parse_pool = ProcessPoolExecutor(
+            max_workers=2,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_parse_worker,
+            initargs=(self.s3_bucket_conn,),
+        )
+        transform = TransformPipeline.from_config(
+            [{"type": "filter", "expr": "col1 % 2 == 0"}]
+        )
+
+        # Method execution
+        list_result = self.s3_bucket_conn.read_csv_list_combine_convert_to_df(
+            keys, transform=transform
+        )
+        self.s3_bucket_conn.close()
+
+        # Tests after method execution
+        self.assertEqual(list_result["col1"].tolist(), [0, 2, 4])
+        snapshot = self.s3_bucket_conn.metrics.snapshot()
+        self.assertEqual(snapshot["counters"]["objects_downloaded"], 6)
+        self.assertEqual(snapshot["stages"]["parse"]["calls"], 6)
+        self.assertIsNone(self.s3_bucket_conn._parse_pool)
+
+    def test_to_read_in_csv_files_of_mixed_types_in_parse_worker_processes(self):
+        """
+        Test files with integer and decimal values of one column combine into
+        floats in the parse worker processes as in the download threads
+        """
+        # Test init
+        keys = ["prefix-2023-03-18/data0.csv", "prefix-2023-03-18/data1.csv"]
+        self.s3_bucket.put_object(Body="odds\n2", Key=keys[0])
+        self.s3_bucket.put_object(Body="odds\n2.5", Key=keys[1])
+        self.s3_bucket_conn.parse_workers = 2
+        # forked workers share the mocked bucket, the connector spawns them
+        self.s3_bucket_conn._parse_pool = ProcessPoolExecutor(
+            max_workers=2,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_parse_worker,
+            initargs=(self.s3_bucket_conn,),
+        )
+
+        # Method execution
+        list_result = self.s3_bucket_conn.read_csv_list_combine_convert_to_df(keys)
+        self.s3_bucket_conn.close()
+
+        # Tests after method execution
+        self.assertEqual(list_result["odds"].tolist(), [2.0, 2.5])
+        self.assertEqual(str(list_result["odds"].dtype), "float64")
+
+    def test_read_and_write_record_metrics(self):
+        """
+        Test the connector records stage timings and counters of a read and write
+        """
+        # Test init
+        keys = [f"prefix-2023-03-18/data{i}.csv" for i in range(3)]
+        for i, key in enumerate(keys):
+            self.s3_bucket.put_object(Body=f"col1\n{i}", Key=key)
+        recorder = InMemoryRecorder()
+        self.s3_bucket_conn.metrics = Metrics([recorder])
+
+        # Method execution
+        df = self.s3_bucket_conn.read_csv_list_combine_convert_to_df(
+            self.s3_bucket_conn.list_files_in_prefix("2023-03-18")
+        )
+        self.s3_bucket_conn.write_df_to_s3(df, "data/out", "csv")
+        self.s3_bucket_conn.metrics.export()
+
+        # Tests after method execution
+        stages = recorder.last["stages"]
+        for stage in ["list", "download", "parse", "combine", "serialize", "upload"]:
+            self.assertIn(stage, stages)
+        self.assertEqual(stages["download"]["calls"], 3)
+        self.assertEqual(
+            recorder.last["counters"],
+            {
+                "objects_downloaded": 3,
+                "bytes_downloaded": 18,
+                "rows_read": 3,
+                "rows_written": 3,
+                "objects_uploaded": 1,
+                "bytes_uploaded": 11,
+            },
+        )
+
     def test_write_df_to_s3_format_csv(self):
         """
         Test reads in df converts to csv and saves to bucket
@@ -251,9 +532,111 @@ class TestS3BucketConnectorMethods(unittest.TestCase):
         key = "prefix-2023-03-20/data1"
         self.s3_bucket_conn.write_df_to_s3(df, key, "parquet")
 
+    def test_write_parquet_dataset_partition(self):
+        """
+        Test writes a partition in part files with the declared schema and
+        removes part files left by an earlier write
+        """
+
+        # Init data
+        prefix = "data/date=2023-03-20"
+        self.s3_bucket.put_object(Body="old", Key=f"{prefix}/part-9.parquet")
+        df = pd.DataFrame({"Header1": ["val1", "val2", "val3"], "Header2": [1, 2, 3]})
+
+        # Method execution
+        keys = self.s3_bucket_conn.write_parquet_dataset(
+            df,
+            prefix,
+            schema={"Header2": "int16"},
+            compression="zstd",
+            rows_per_file=2,
+        )
+
+        # Tests after method execution
+        stored = [obj.key for obj in self.s3_bucket.objects.filter(Prefix=prefix)]
+        body = self.s3_bucket.Object(key=keys[0]).get().get("Body").read()
+        parquet_file = pq.ParquetFile(BytesIO(body))
+        self.assertEqual(keys, [f"{prefix}/part-0.parquet", f"{prefix}/part-1.parquet"])
+        self.assertEqual(sorted(stored), [f"{prefix}/_manifest.json"] + keys)
+        self.assertEqual(self.s3_bucket_conn.read_manifest(prefix), {"files": keys})
+        self.assertEqual(parquet_file.schema_arrow.field("Header2").type, pa.int16())
+        self.assertEqual(
+            parquet_file.metadata.row_group(0).column(0).compression, "ZSTD"
+        )
+        self.assertEqual(parquet_file.metadata.num_rows, 2)
+
+    def test_read_filtered_parquet_skips_row_groups_and_columns(self):
+        """
+        Test a filtered read of a parquet output downloads only the needed
+        column chunks of the matching row groups
+        """
+
+        # Init data
+        rows = 40000
+        teams = ["Arsenal", "Chelsea", "Everton", "Leeds"]
+        df = pd.DataFrame(
+            {
+                "HomeTeam": [teams[i * len(teams) // rows] for i in range(rows)],
+                "FTHG": [i % 5 for i in range(rows)],
+                "Referee": [f"Referee {i}" for i in range(rows)],
+            }
+        )
+        buffer = BytesIO()
+        pq.write_table(
+            pa.Table.from_pandas(df, preserve_index=False),
+            buffer,
+            row_group_size=rows // len(teams),
+        )
+        key = "data/date=2023-03-18/part-0.parquet"
+        self.s3_bucket.put_object(Body=buffer.getvalue(), Key=key)
+        filters = [("HomeTeam", "=", "Chelsea"), ("FTHG", ">=", 4)]
+
+        # Method execution
+        result = self.s3_bucket_conn.read_filtered(
+            [key], columns=["HomeTeam", "FTHG"], filters=filters
+        )
+
+        # Tests after method execution
+        counters = self.s3_bucket_conn.metrics.snapshot()["counters"]
+        expected = df[(df["HomeTeam"] == "Chelsea") & (df["FTHG"] >= 4)]
+        self.assertEqual(result.columns.tolist(), ["HomeTeam", "FTHG"])
+        self.assertEqual(result["FTHG"].tolist(), expected["FTHG"].tolist())
+        self.assertEqual(set(result["HomeTeam"]), {"Chelsea"})
+        self.assertLess(counters["bytes_downloaded"], len(buffer.getvalue()) / 4)
+        with self.assertRaises(ValueError):
+            self.s3_bucket_conn.read_filtered([key], filters=[("FTHG", "~", 1)])
+
+    def test_read_filtered_csv_streams_matching_rows(self):
+        """
+        Test a filtered read of a csv output keeps the matching rows of every
+        chunk and the same rows whichever filter form is used
+        """
+
+        # Init data
+        key = "data/processed-data-2023-03-18.csv"
+        csv_content = (
+            "HomeTeam,AwayTeam,FTHG\nArsenal,Leeds,2\nChelsea,Everton,1\n"
+            "Leeds,Chelsea,0\nEverton,Arsenal,3\n"
+        )
+        self.s3_bucket.put_object(Body=csv_content, Key=key)
+
+        # Method execution
+        result = self.s3_bucket_conn.read_filtered(
+            [key],
+            columns=["HomeTeam", "FTHG"],
+            filters=[[("HomeTeam", "in", ["Arsenal", "Leeds"])], [("FTHG", ">", 2)]],
+            chunksize=1,
+        )
+
+        # Tests after method execution
+        self.assertEqual(result.columns.tolist(), ["HomeTeam", "FTHG"])
+        self.assertEqual(result["HomeTeam"].tolist(), ["Arsenal", "Leeds", "Everton"])
+        self.assertEqual(result["FTHG"].tolist(), [2, 0, 3])
+
     def test_update_meta_file(self):
         """
-        Test reads in update meta file by date and updates
+        Test update meta file records the processed dates without
+        rewriting the legacy processed_data.csv
         """
 
         # Init data
@@ -274,12 +657,29 @@ class TestS3BucketConnectorMethods(unittest.TestCase):
 
         self.s3_bucket_conn.update_meta_file_to_s3(processed_date_list)
 
-        csv_file = self.s3_bucket.Object(key="processed_data.csv").get().get("Body")
+        state = json.loads(
+            self.s3_bucket.Object(key="meta/state.json").get().get("Body").read()
+        )
+        log_keys = [
+            obj.key for obj in self.s3_bucket.objects.filter(Prefix="meta/processed/")
+        ]
+        df = pd.read_csv(self.s3_bucket.Object(key=log_keys[0]).get().get("Body"))
+
+        # Tests after method execution
+        self.assertEqual(state, {"watermark": "2023-03-19", "gaps": []})
+        self.assertEqual(len(log_keys), 1)
+        self.assertEqual(df.shape[0], 2)
 
-        df = pd.read_csv(csv_file)
+    def test_connector_can_be_pickled(self):
+        """
+        Tests the connector survives pickling for use in a process pool
+        """
+
+        # Method execution
+        conn = pickle.loads(pickle.dumps(self.s3_bucket_conn))
 
         # Tests after method execution
-        self.assertEqual(df.shape[0], 3)
+        self.assertEqual(conn.bucket_name, self.s3_bucket_name)
 
 
 if __name__ == "__main__":
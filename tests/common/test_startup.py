@@ -0,0 +1,131 @@
+"""TestStartup"""
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+import yaml
+
+# root of the repository, app.py is run from there
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# data libraries a no-op run must not import
+HEAVY_MODULES = ("pandas", "pyarrow")
+
+
+class TestStartup(unittest.TestCase):
+    """
+    Testing the entry point only imports the data libraries when there is work
+    """
+
+    def run_python(self, code: str):
+        """
+        Runs code in a fresh interpreter and returns the lines it printed
+        """
+        result = subprocess.run(
+            [sys.executable, "-c", textwrap.dedent(code)],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            env={
+                **os.environ,
+                "AWS_ACCESS_KEY_ID": "KEY1",
+                "AWS_SECRET_ACCESS_KEY": "KEY2",
+                "AWS_DEFAULT_REGION": "eu-central-1",
+            },
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return result.stdout.splitlines()
+
+    def test_import_app_loads_no_data_library(self):
+        """
+        Tests importing the entry point leaves out boto3, pandas and pyarrow
+        """
+        # Method execution
+        lines = self.run_python("""
+            import sys
+            import app
+            print(sorted(m for m in ("boto3", "pandas", "pyarrow") if m in sys.modules))
+            """)
+
+        # Tests after method execution
+        self.assertEqual(lines[-1], "[]")
+
+    def test_run_with_nothing_to_do_only_lists(self):
+        """
+        Tests a run finding every folder processed stops after the listing
+        without importing pandas or pyarrow
+        """
+        # Test init
+        with open(os.path.join(ROOT, "config", "epl_config.yml")) as f:
+            config = yaml.safe_load(f)
+        config["logging"] = {"version": 1}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_path = os.path.join(tmp_dir, "config.yml")
+            with open(config_path, "w") as f:
+                yaml.safe_dump(config, f)
+
+            # Method execution
+            lines = self.run_python(f"""
+                import sys
+                import boto3
+                from moto import mock_s3
+                import app
+                with mock_s3():
+                    s3 = boto3.resource("s3")
+                    bucket = s3.create_bucket(
+                        Bucket="{config['s3']['src_bucket']}",
+                        CreateBucketConfiguration={{"LocationConstraint": "eu-central-1"}},
+                    )
+                    bucket.put_object(Key="football-2023-03-18/a.csv", Body="a,b")
+                    bucket.put_object(
+                        Key="meta/state.json",
+                        Body='{{"watermark": "2023-03-18", "gaps": []}}',
+                    )
+                    app.main(["--config", "{config_path}"])
+                print(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules))
+                """)
+
+        # Tests after method execution
+        self.assertEqual(lines[-1], "[]")
+
+    def test_async_executor_rejects_skipped_features(self):
+        """
+        Tests a run with the async executor and validation enabled stops
+        before touching the buckets
+        """
+        # Test init
+        with open(os.path.join(ROOT, "config", "epl_config.yml")) as f:
+            config = yaml.safe_load(f)
+        config["execution"]["executor"] = "async"
+        config["validation"]["enabled"] = True
+
+        import app
+
+        # Method execution
+        with self.assertRaisesRegex(ValueError, "validation"):
+            app.run(config, app.parse_args([]), ["2023-03-18"], app.Metrics())
+
+        # Tests after method execution
+        config["validation"]["enabled"] = False
+        config["checkpoints"]["enabled"] = True
+        config["compaction"]["enabled"] = True
+        with self.assertRaisesRegex(ValueError, "checkpoints, compaction"):
+            app.run(config, app.parse_args([]), ["2023-03-18"], app.Metrics())
+
+    def test_worker_rejects_compact_and_plan(self):
+        """
+        Tests --worker, which has no date range, can not be combined with
+        --compact or --plan
+        """
+        import app
+
+        for options in (["--worker", "--compact"], ["--worker", "--plan"]):
+            with self.assertRaises(SystemExit):
+                app.parse_args(options)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,231 @@
+"""TestTeamAggregatesMethods"""
+import os
+import unittest
+from unittest.mock import patch
+
+import boto3
+import pandas as pd
+from botocore.exceptions import ClientError
+from moto import mock_s3
+
+from epl.common.s3 import S3BucketConnector
+from epl.transfomers.aggregates import TeamAggregates
+from epl.transfomers.epl_transformer import ETLExecutor
+
+
+def matches(rows: list):
+    """
+    Returns a match DataFrame of HomeTeam, AwayTeam, FTHG, FTAG, FTR rows
+    """
+
+    return pd.DataFrame(rows, columns=["HomeTeam", "AwayTeam", "FTHG", "FTAG", "FTR"])
+
+
+class TestTeamAggregatesMethods(unittest.TestCase):
+    """
+    Testing the TeamAggregates class
+    """
+
+    def setUp(self):
+        """
+        Setting up the environment
+        """
+        # mocking s3 connection start
+        self.mock_s3 = mock_s3()
+        self.mock_s3.start()
+        # Defining the class arguments
+        self.s3_access_key = "AWS_ACCESS_KEY_ID"
+        self.s3_secret_key = "AWS_SECRET_ACCESS_KEY"
+        self.s3_endpoint_url = "https://s3.eu-central-1.amazonaws.com"
+        self.s3_src_bucket_name = "test-src-bucket"
+        self.s3_trg_bucket_name = "test-trg-bucket"
+        # Creating s3 access keys as environment variables
+        os.environ[self.s3_access_key] = "KEY1"
+        os.environ[self.s3_secret_key] = "KEY2"
+        # Creating the buckets on the mocked s3
+        self.s3 = boto3.resource(service_name="s3", endpoint_url=self.s3_endpoint_url)
+        for bucket in [self.s3_src_bucket_name, self.s3_trg_bucket_name]:
+            self.s3.create_bucket(
+                Bucket=bucket,
+                CreateBucketConfiguration={"LocationConstraint": "eu-central-1"},
+            )
+        self.src_bucket = self.s3.Bucket(self.s3_src_bucket_name)
+        self.trg_bucket = self.s3.Bucket(self.s3_trg_bucket_name)
+        # Creating testing instances
+        self.s3_bucket_src = S3BucketConnector(
+            self.s3_access_key, self.s3_secret_key, self.s3_src_bucket_name
+        )
+        self.s3_bucket_trg = S3BucketConnector(
+            self.s3_access_key, self.s3_secret_key, self.s3_trg_bucket_name
+        )
+        self.aggregates = TeamAggregates(self.s3_bucket_trg, form_length=2)
+
+    def tearDown(self):
+        """
+        Executing after unittests
+        """
+        # mocking s3 connection stop
+        self.mock_s3.stop()
+
+    def test_partial(self):
+        """
+        Tests the statistics of a date are computed per team
+        """
+        # Method execution
+        partial = self.aggregates.partial(
+            matches(
+                [["Arsenal", "Chelsea", 2, 1, "H"], ["Everton", "Arsenal", 1, 1, "D"]]
+            )
+        )
+
+        # Tests after method execution
+        self.assertEqual(partial.loc["Arsenal"].tolist(), [2, 1, 1, 0, 3, 2, 4, "WD"])
+        self.assertEqual(partial.loc["Chelsea"].tolist(), [1, 0, 0, 1, 1, 2, 0, "L"])
+
+    def test_merge_adds_new_dates_and_replaces_reprocessed_ones(self):
+        """
+        Tests the totals only merge new partials and a reprocessed date
+        replaces its earlier partial
+        """
+        # Test init
+        days = {
+            "2023-03-18": [["Arsenal", "Chelsea", 2, 0, "H"]],
+            "2023-03-19": [["Chelsea", "Arsenal", 1, 0, "H"]],
+            "2023-03-20": [["Arsenal", "Everton", 1, 1, "D"]],
+        }
+        for day, rows in days.items():
+            self.aggregates.write_partial(day, self.aggregates.partial(matches(rows)))
+
+        # Method execution
+        self.aggregates.merge(list(days))
+        unchanged = self.aggregates.merge(list(days))
+        # Everton did not play on the 20th after all
+        self.aggregates.write_partial(
+            "2023-03-20", self.aggregates.partial(matches([]))
+        )
+        self.aggregates.merge(["2023-03-20"])
+        totals, applied = self.aggregates.read_totals("2022")
+
+        # Tests after method execution
+        self.assertIsNone(unchanged)
+        self.assertEqual(list(totals.index), ["Arsenal", "Chelsea"])
+        self.assertEqual(
+            totals.loc["Arsenal", ["played", "points", "goals_for"]].tolist(),
+            [2, 3, 2],
+        )
+        # the form window is refilled from the partial of the 18th
+        self.assertEqual(totals.loc["Arsenal", "form"], "WL")
+        self.assertEqual(
+            totals.loc["Arsenal", "form_dates"], ["2023-03-18", "2023-03-19"]
+        )
+        partial_keys = [
+            obj.key
+            for obj in self.trg_bucket.objects.filter(
+                Prefix="aggregates/partials/date=2023-03-20/"
+            )
+        ]
+        self.assertEqual(partial_keys, [applied["2023-03-20"]])
+
+    def test_merge_catches_up_dates_of_a_failed_merge(self):
+        """
+        Tests the partial of a date whose merge failed is merged by the next
+        merge of its season
+        """
+        # Test init
+        for day, rows in {
+            "2023-03-18": [["Arsenal", "Chelsea", 2, 0, "H"]],
+            "2023-03-19": [["Chelsea", "Arsenal", 1, 0, "H"]],
+        }.items():
+            self.aggregates.write_partial(day, self.aggregates.partial(matches(rows)))
+
+        # Method execution
+        with patch.object(
+            self.aggregates, "_write_totals", side_effect=ClientError({}, "PutObject")
+        ):
+            with self.assertRaises(ClientError):
+                self.aggregates.merge(["2023-03-18"])
+        self.aggregates.merge(["2023-03-19"])
+        totals, applied = self.aggregates.read_totals("2022")
+
+        # Tests after method execution
+        self.assertEqual(sorted(applied), ["2023-03-18", "2023-03-19"])
+        self.assertEqual(totals.loc["Arsenal", ["played", "points"]].tolist(), [2, 3])
+
+    def test_merge_keeps_seasons_apart_and_retries_conflicts(self):
+        """
+        Tests dates of two seasons update their own totals, and a totals
+        write finding the totals changed is merged again from a new read
+        """
+        # Test init
+        days = {
+            "2023-05-28": [["Arsenal", "Wolves", 5, 0, "H"]],
+            "2023-08-12": [["Arsenal", "Forest", 2, 1, "H"]],
+        }
+        for day, rows in days.items():
+            self.aggregates.write_partial(day, self.aggregates.partial(matches(rows)))
+        client = self.s3_bucket_trg._client
+        put_object = client.put_object
+        calls = []
+
+        def _put_object(**kwargs):
+            if kwargs["Key"].endswith("team_stats.parquet"):
+                calls.append(kwargs)
+                if len(calls) == 1:
+                    raise ClientError(
+                        {"Error": {"Code": "PreconditionFailed"}}, "PutObject"
+                    )
+            return put_object(**kwargs)
+
+        # Method execution
+        with patch.object(client, "put_object", side_effect=_put_object), patch(
+            "epl.transfomers.aggregates.time.sleep"
+        ):
+            written = self.aggregates.merge(list(days))
+        last, _ = self.aggregates.read_totals("2022")
+        current, _ = self.aggregates.read_totals("2023")
+
+        # Tests after method execution
+        self.assertEqual(sorted(written), ["2022", "2023"])
+        self.assertEqual(
+            [call["Key"] for call in calls],
+            [
+                "aggregates/season=2022/team_stats.parquet",
+                "aggregates/season=2022/team_stats.parquet",
+                "aggregates/season=2023/team_stats.parquet",
+            ],
+        )
+        self.assertTrue(all(call["IfNoneMatch"] == "*" for call in calls))
+        self.assertEqual(last.loc["Arsenal", "goals_for"], 5)
+        self.assertEqual(current.loc["Arsenal", "goals_for"], 2)
+        self.assertNotIn("Wolves", current.index)
+
+    def test_executor_writes_partials(self):
+        """
+        Tests in memory and streaming transforms write the same partial
+        """
+        # Test init
+        self.src_bucket.put_object(Key="football-2023-03-18/")
+        self.src_bucket.put_object(
+            Body="HomeTeam,AwayTeam,FTHG,FTAG,FTR\nArsenal,Chelsea,2,0,H\n"
+            "Everton,Arsenal,0,1,A\n",
+            Key="football-2023-03-18/a.csv",
+        )
+
+        for chunksize in [None, 1]:
+            # Method execution
+            ETLExecutor(
+                self.s3_bucket_src,
+                self.s3_bucket_trg,
+                chunksize=chunksize,
+                aggregates=self.aggregates,
+            ).transform("2023-03-18")
+            self.aggregates.merge(["2023-03-18"])
+            totals, _ = self.aggregates.read_totals("2022")
+
+            # Tests after method execution
+            self.assertEqual(totals.loc["Arsenal", "points"], 6)
+            self.assertEqual(totals.loc["Arsenal", "form"], "WW")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+"""TestCompactorMethods"""
+import os
+import unittest
+from io import BytesIO
+from unittest.mock import patch
+
+import boto3
+import pandas as pd
+from moto import mock_s3
+
+from epl.common.s3 import S3BucketConnector
+from epl.transfomers.compaction import Compactor
+from epl.transfomers.epl_transformer import ETLExecutor
+
+
+class TestCompactorMethods(unittest.TestCase):
+    """
+    Testing the Compactor class
+    """
+
+    def setUp(self):
+        """
+        Setting up the environment
+        """
+        # mocking s3 connection start
+        self.mock_s3 = mock_s3()
+        self.mock_s3.start()
+        # Defining the class arguments
+        self.s3_access_key = "AWS_ACCESS_KEY_ID"
+        self.s3_secret_key = "AWS_SECRET_ACCESS_KEY"
+        self.s3_endpoint_url = "https://s3.eu-central-1.amazonaws.com"
+        self.s3_src_bucket_name = "test-src-bucket"
+        self.s3_trg_bucket_name = "test-trg-bucket"
+        # Creating s3 access keys as environment variables
+        os.environ[self.s3_access_key] = "KEY1"
+        os.environ[self.s3_secret_key] = "KEY2"
+        # Creating the buckets on the mocked s3
+        self.s3 = boto3.resource(service_name="s3", endpoint_url=self.s3_endpoint_url)
+        for bucket in [self.s3_src_bucket_name, self.s3_trg_bucket_name]:
+            self.s3.create_bucket(
+                Bucket=bucket,
+                CreateBucketConfiguration={"LocationConstraint": "eu-central-1"},
+            )
+        self.src_bucket = self.s3.Bucket(self.s3_src_bucket_name)
+        self.trg_bucket = self.s3.Bucket(self.s3_trg_bucket_name)
+        # Creating testing instances
+        self.s3_bucket_src = S3BucketConnector(
+            self.s3_access_key, self.s3_secret_key, self.s3_src_bucket_name
+        )
+        self.s3_bucket_trg = S3BucketConnector(
+            self.s3_access_key, self.s3_secret_key, self.s3_trg_bucket_name
+        )
+        # source folder of many small files
+        self.src_bucket.put_object(Key="football-2023-03-18/")
+        for number in range(3):
+            self.src_bucket.put_object(
+                Body=f"col1,col2\n{number},{number * 2}",
+                Key=f"football-2023-03-18/{number}.csv",
+            )
+
+    def tearDown(self):
+        """
+        Executing after unittests
+        """
+        # mocking s3 connection stop
+        self.mock_s3.stop()
+
+    def test_compact_source_is_read_while_up_to_date(self):
+        """
+        Tests the compacted files replace the csv files of a date with the
+        same output until the folder changes
+        """
+        # Test init
+        compactor = Compactor(self.s3_bucket_src)
+        key = "data/processed-data-2023-03-18.csv"
+        ETLExecutor(self.s3_bucket_src, self.s3_bucket_trg).transform("2023-03-18")
+        expected = self.trg_bucket.Object(key=key).get().get("Body").read()
+
+        # Method execution
+        keys = compactor.compact_source("2023-03-18")
+        again = compactor.compact_source("2023-03-18")
+        read = self.s3_bucket_src.read_csv_list_combine_convert_to_df
+        with patch.object(
+            self.s3_bucket_src, "read_csv_list_combine_convert_to_df", wraps=read
+        ) as reader:
+            ETLExecutor(
+                self.s3_bucket_src, self.s3_bucket_trg, compactor=compactor
+            ).transform("2023-03-18")
+        compacted = self.trg_bucket.Object(key=key).get().get("Body").read()
+        self.src_bucket.put_object(
+            Body="col1,col2\n3,6", Key="football-2023-03-18/3.csv"
+        )
+        self.s3_bucket_src.date_index(refresh=True)
+
+        # Tests after method execution
+        manifest = self.s3_bucket_src.read_manifest("compacted/date=2023-03-18")
+        self.assertEqual(len(keys), 1)
+        self.assertIsNone(again)
+        self.assertEqual(manifest["files"], keys)
+        self.assertEqual(manifest["rows"], 3)
+        self.assertEqual(len(manifest["sources"]), 3)
+        reader.assert_not_called()
+        self.assertEqual(compacted, expected)
+        self.assertIsNone(compactor.compacted_files("2023-03-18"))
+
+    def test_compact_partition_replaces_parts(self):
+        """
+        Tests the parts of an output partition are merged and the older parts
+        are removed once the manifest is written
+        """
+        # Test init
+        prefix = "data/date=2023-03-18"
+        ETLExecutor(
+            self.s3_bucket_src,
+            self.s3_bucket_trg,
+            file_format="parquet",
+            parquet_options={"rows_per_file": 1},
+        ).transform("2023-03-18")
+        parts = self.s3_bucket_trg.read_manifest(prefix)["files"]
+
+        # Method execution
+        keys = Compactor(self.s3_bucket_trg).compact_partition(prefix)
+
+        # Tests after method execution
+        stored = sorted(
+            obj.key for obj in self.trg_bucket.objects.filter(Prefix=prefix)
+        )
+        df = pd.read_parquet(
+            BytesIO(self.trg_bucket.Object(key=keys[0]).get().get("Body").read())
+        )
+        self.assertEqual(len(parts), 3)
+        self.assertEqual(len(keys), 1)
+        self.assertEqual(stored, [f"{prefix}/_manifest.json"] + keys)
+        self.assertEqual(df["col1"].tolist(), [0, 1, 2])
+        self.assertTrue(df["Is processed"].all())
+
+
+if __name__ == "__main__":
+    unittest.main()
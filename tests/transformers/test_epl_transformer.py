@@ -0,0 +1,361 @@
+"""TestETLExecutorMethods"""
+import os
+import pickle
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from unittest.mock import patch
+
+import boto3
+import pandas as pd
+from moto import mock_s3
+
+from epl.common.checkpoints import CheckpointStore
+from epl.common.metrics import Metrics
+from epl.common.s3 import S3BucketConnector
+from epl.transfomers.epl_transformer import ETLExecutor
+
+
+class PicklingPoolExecutor(ThreadPoolExecutor):
+    """
+    Thread pool sending the arguments through pickle like a process pool, so
+    the workers still see the mocked s3
+    """
+
+    def __init__(self, max_workers=None, mp_context=None):
+        super().__init__(max_workers=max_workers)
+
+    def submit(self, fn, *args):
+        return super().submit(fn, *pickle.loads(pickle.dumps(args)))
+
+
+class TestETLExecutorMethods(unittest.TestCase):
+    """
+    Testing the ETLExecutor class
+    """
+
+    def setUp(self):
+        """
+        Setting up the environment
+        """
+        # mocking s3 connection start
+        self.mock_s3 = mock_s3()
+        self.mock_s3.start()
+        # Defining the class arguments
+        self.s3_access_key = "AWS_ACCESS_KEY_ID"
+        self.s3_secret_key = "AWS_SECRET_ACCESS_KEY"
+        self.s3_endpoint_url = "https://s3.eu-central-1.amazonaws.com"
+        self.s3_src_bucket_name = "test-src-bucket"
+        self.s3_trg_bucket_name = "test-trg-bucket"
+        # Creating s3 access keys as environment variables
+        os.environ[self.s3_access_key] = "KEY1"
+        os.environ[self.s3_secret_key] = "KEY2"
+        # Creating the buckets on the mocked s3
+        self.s3 = boto3.resource(service_name="s3", endpoint_url=self.s3_endpoint_url)
+        for bucket in [self.s3_src_bucket_name, self.s3_trg_bucket_name]:
+            self.s3.create_bucket(
+                Bucket=bucket,
+                CreateBucketConfiguration={"LocationConstraint": "eu-central-1"},
+            )
+        self.src_bucket = self.s3.Bucket(self.s3_src_bucket_name)
+        self.trg_bucket = self.s3.Bucket(self.s3_trg_bucket_name)
+        # Creating testing instances
+        self.s3_bucket_src = S3BucketConnector(
+            self.s3_access_key, self.s3_secret_key, self.s3_src_bucket_name
+        )
+        self.s3_bucket_trg = S3BucketConnector(
+            self.s3_access_key, self.s3_secret_key, self.s3_trg_bucket_name
+        )
+
+    def tearDown(self):
+        """
+        Executing after unittests
+        """
+        # mocking s3 connection stop
+        self.mock_s3.stop()
+
+    def test_transform_dates_parallel_tracks_failures(self):
+        """
+        Tests a failing date is reported without stopping the other dates
+        """
+        # Test init
+        csv_content = "col1,col2\n1,2"
+        self.src_bucket.put_object(Key="football-2023-03-18/")
+        self.src_bucket.put_object(Body=csv_content, Key="football-2023-03-18/a.csv")
+        self.src_bucket.put_object(Key="football-2023-03-19/")
+        self.src_bucket.put_object(Body="", Key="football-2023-03-19/a.csv")
+        self.src_bucket.put_object(Key="football-2023-03-20/")
+        self.src_bucket.put_object(Body=csv_content, Key="football-2023-03-20/a.csv")
+
+        # Method execution
+        results = ETLExecutor(self.s3_bucket_src, self.s3_bucket_trg).transform_dates(
+            ["2023-03-18", "2023-03-19", "2023-03-20"], max_workers=3
+        )
+
+        # Tests after method execution
+        self.assertEqual(
+            results, {"2023-03-18": True, "2023-03-19": False, "2023-03-20": True}
+        )
+        keys = sorted(obj.key for obj in self.trg_bucket.objects.all())
+        self.assertEqual(
+            keys,
+            [
+                "data/processed-data-2023-03-18.csv",
+                "data/processed-data-2023-03-20.csv",
+            ],
+        )
+        df = pd.read_csv(self.trg_bucket.Object(key=keys[0]).get().get("Body"))
+        self.assertTrue(df["Is processed"].all())
+
+    def test_transform_dates_process_pool_merges_worker_metrics(self):
+        """
+        Tests the metrics recorded by the worker processes are added to the
+        metrics of the parent
+        """
+        # Test init
+        metrics = Metrics()
+        s3_bucket_src = S3BucketConnector(
+            self.s3_access_key,
+            self.s3_secret_key,
+            self.s3_src_bucket_name,
+            metrics=metrics,
+        )
+        s3_bucket_trg = S3BucketConnector(
+            self.s3_access_key,
+            self.s3_secret_key,
+            self.s3_trg_bucket_name,
+            metrics=metrics,
+        )
+        for day in ["2023-03-18", "2023-03-19"]:
+            self.src_bucket.put_object(Key=f"football-{day}/")
+            self.src_bucket.put_object(
+                Body="col1,col2\n1,2\n3,4", Key=f"football-{day}/a.csv"
+            )
+
+        # Method execution
+        with patch(
+            "epl.transfomers.epl_transformer.ProcessPoolExecutor", PicklingPoolExecutor
+        ):
+            results = ETLExecutor(s3_bucket_src, s3_bucket_trg).transform_dates(
+                ["2023-03-18", "2023-03-19"], max_workers=2, executor_type="process"
+            )
+
+        # Tests after method execution
+        snapshot = metrics.snapshot()
+        self.assertEqual(results, {"2023-03-18": True, "2023-03-19": True})
+        self.assertEqual(snapshot["stages"]["transform"]["calls"], 2)
+        # the source and target share one metrics, each row is counted once
+        self.assertEqual(snapshot["counters"]["rows_read"], 4)
+        self.assertEqual(snapshot["counters"]["rows_written"], 4)
+
+    def test_transform_streaming_matches_in_memory_output(self):
+        """
+        Tests the chunked transform writes the same rows as the in memory one
+        """
+        # Test init
+        self.src_bucket.put_object(Key="football-2023-03-18/")
+        self.src_bucket.put_object(
+            Body="col1,col2\n1,2\n3,4\n5,6", Key="football-2023-03-18/a.csv"
+        )
+        self.src_bucket.put_object(
+            Body="col1,col2\n7,8", Key="football-2023-03-18/b.csv"
+        )
+        key = "data/processed-data-2023-03-18.csv"
+
+        # Method execution
+        ETLExecutor(self.s3_bucket_src, self.s3_bucket_trg).transform("2023-03-18")
+        expected = self.trg_bucket.Object(key=key).get().get("Body").read()
+        self.trg_bucket.Object(key=key).delete()
+        ETLExecutor(self.s3_bucket_src, self.s3_bucket_trg, chunksize=2).transform(
+            "2023-03-18"
+        )
+        streamed = self.trg_bucket.Object(key=key).get().get("Body").read()
+
+        # Tests after method execution
+        self.assertEqual(streamed, expected)
+
+    def test_transform_streaming_falls_back_for_whole_date_stages(self):
+        """
+        Tests a chunksize is not used when a stage such as dedup needs the
+        whole date, duplicates across chunks and files are removed
+        """
+        # Test init
+        self.src_bucket.put_object(Key="football-2023-03-18/")
+        self.src_bucket.put_object(
+            Body="col1,col2\n1,2\n1,2\n3,4", Key="football-2023-03-18/a.csv"
+        )
+        self.src_bucket.put_object(
+            Body="col1,col2\n3,4", Key="football-2023-03-18/b.csv"
+        )
+        transforms = [{"type": "dedup", "subset": ["col1"]}]
+
+        # Method execution
+        ETLExecutor(
+            self.s3_bucket_src,
+            self.s3_bucket_trg,
+            chunksize=1,
+            transforms=transforms,
+        ).transform("2023-03-18")
+
+        # Tests after method execution
+        df = pd.read_csv(
+            self.trg_bucket.Object(key="data/processed-data-2023-03-18.csv")
+            .get()
+            .get("Body")
+        )
+        self.assertEqual(df["col1"].tolist(), [1, 3])
+
+    def test_transform_parquet_partition(self):
+        """
+        Tests parquet output is written partitioned by date in both the in
+        memory and the streaming mode
+        """
+        # Test init
+        self.src_bucket.put_object(Key="football-2023-03-18/")
+        self.src_bucket.put_object(
+            Body="col1,col2\n1,2\n3,4", Key="football-2023-03-18/a.csv"
+        )
+        key = "data/date=2023-03-18/part-0.parquet"
+
+        for chunksize in [None, 1]:
+            # Method execution
+            ETLExecutor(
+                self.s3_bucket_src,
+                self.s3_bucket_trg,
+                chunksize=chunksize,
+                file_format="parquet",
+                schema={"col1": "int32"},
+            ).transform("2023-03-18")
+
+            # Tests after method execution
+            df = pd.read_parquet(
+                BytesIO(self.trg_bucket.Object(key=key).get().get("Body").read())
+            )
+            self.assertEqual(df["col1"].tolist(), [1, 3])
+            self.assertEqual(str(df["col1"].dtype), "int32")
+            self.assertTrue(df["Is processed"].all())
+
+    def test_transform_checkpointed_resumes_unfinished_objects(self):
+        """
+        Tests a restarted date only reads the source objects that did not
+        finish and writes the same csv as a whole date transform
+        """
+        # Test init
+        self.src_bucket.put_object(Key="football-2023-03-18/")
+        self.src_bucket.put_object(
+            Body="col1,col2\n1,2\n3,4", Key="football-2023-03-18/a.csv"
+        )
+        self.src_bucket.put_object(Body="", Key="football-2023-03-18/b.csv")
+        key = "data/processed-data-2023-03-18.csv"
+        executor = ETLExecutor(
+            self.s3_bucket_src,
+            self.s3_bucket_trg,
+            checkpoints=CheckpointStore(self.s3_bucket_trg),
+        )
+
+        # Method execution
+        with self.assertRaises(Exception):
+            executor.transform("2023-03-18")
+        manifest = executor.checkpoints.load("2023-03-18")
+        self.src_bucket.put_object(
+            Body="col1,col2\n5,6", Key="football-2023-03-18/b.csv"
+        )
+        read = self.s3_bucket_src.read_csv_list_combine_convert_to_df
+        with patch.object(
+            self.s3_bucket_src, "read_csv_list_combine_convert_to_df", wraps=read
+        ) as reader:
+            executor.transform("2023-03-18")
+        resumed = self.trg_bucket.Object(key=key).get().get("Body").read()
+        ETLExecutor(self.s3_bucket_src, self.s3_bucket_trg).transform("2023-03-18")
+        expected = self.trg_bucket.Object(key=key).get().get("Body").read()
+
+        # Tests after method execution
+        self.assertEqual(list(manifest), ["football-2023-03-18/a.csv"])
+        self.assertEqual(manifest["football-2023-03-18/a.csv"]["rows"], 2)
+        reader.assert_called_once_with(["football-2023-03-18/b.csv"], transform=None)
+        self.assertEqual(resumed, expected)
+        self.assertEqual(
+            list(self.trg_bucket.objects.filter(Prefix="checkpoints/")), []
+        )
+
+    def test_transform_checkpointed_redoes_replaced_objects(self):
+        """
+        Tests a source object replaced after its checkpoint was written is
+        read again by the restarted date
+        """
+        # Test init
+        self.src_bucket.put_object(Key="football-2023-03-18/")
+        self.src_bucket.put_object(
+            Body="col1,col2\n1,2", Key="football-2023-03-18/a.csv"
+        )
+        self.src_bucket.put_object(Body="", Key="football-2023-03-18/b.csv")
+        executor = ETLExecutor(
+            self.s3_bucket_src,
+            self.s3_bucket_trg,
+            checkpoints=CheckpointStore(self.s3_bucket_trg),
+        )
+
+        # Method execution
+        with self.assertRaises(Exception):
+            executor.transform("2023-03-18")
+        manifest = executor.checkpoints.load("2023-03-18")
+        self.src_bucket.put_object(
+            Body="col1,col2\n7,8", Key="football-2023-03-18/a.csv"
+        )
+        self.src_bucket.put_object(
+            Body="col1,col2\n5,6", Key="football-2023-03-18/b.csv"
+        )
+        # the restarted run lists the bucket again
+        self.s3_bucket_src.date_index(refresh=True)
+        executor.transform("2023-03-18")
+
+        # Tests after method execution
+        df = pd.read_csv(
+            self.trg_bucket.Object(key="data/processed-data-2023-03-18.csv")
+            .get()
+            .get("Body")
+        )
+        self.assertIn("etag", manifest["football-2023-03-18/a.csv"])
+        self.assertEqual(df["col1"].tolist(), [7, 5])
+
+    def test_transform_checkpointed_parquet_parts(self):
+        """
+        Tests parquet output gets one part per source object and older parts
+        of the date are removed
+        """
+        # Test init
+        self.src_bucket.put_object(Key="football-2023-03-18/")
+        for name, body in [("a", "col1\n1\n2"), ("b", "col1\n3")]:
+            self.src_bucket.put_object(Body=body, Key=f"football-2023-03-18/{name}.csv")
+        self.trg_bucket.put_object(Body=b"", Key="data/date=2023-03-18/part-0.parquet")
+
+        # Method execution
+        ETLExecutor(
+            self.s3_bucket_src,
+            self.s3_bucket_trg,
+            file_format="parquet",
+            checkpoints=CheckpointStore(self.s3_bucket_trg),
+        ).transform("2023-03-18")
+
+        # Tests after method execution
+        keys = self.s3_bucket_trg.read_manifest("data/date=2023-03-18")["files"]
+        stored = [obj.key for obj in self.trg_bucket.objects.filter(Prefix="data/")]
+        expected = sorted(
+            f"data/date=2023-03-18/{CheckpointStore.part_name(key)}"
+            for key in ["football-2023-03-18/a.csv", "football-2023-03-18/b.csv"]
+        )
+        rows = [
+            pd.read_parquet(
+                BytesIO(self.trg_bucket.Object(key=key).get().get("Body").read())
+            )["col1"].tolist()
+            for key in keys
+        ]
+        self.assertEqual(sorted(keys), expected)
+        self.assertEqual(
+            sorted(stored), ["data/date=2023-03-18/_manifest.json"] + expected
+        )
+        self.assertEqual(sorted(rows), [[1, 2], [3]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,227 @@
+"""TestShardedRunMethods"""
+import json
+import multiprocessing
+import os
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+import boto3
+
+from epl.common.leases import LeaseStore
+from epl.common.meta_store import MetaStore
+from epl.common.s3 import S3BucketConnector
+from epl.transfomers.epl_transformer import ETLExecutor
+from epl.transfomers.sharding import ShardPlan, ShardWorker
+
+try:
+    from moto.server import ThreadedMotoServer
+except ImportError:  # moto server mode needs flask
+    ThreadedMotoServer = None
+
+
+def run_worker(endpoint_url: str, src_bucket: str, trg_bucket: str, owner: str):
+    """
+    Runs a shard worker in a process of its own, as on a separate machine
+    """
+    src = S3BucketConnector(
+        "AWS_ACCESS_KEY_ID",
+        "AWS_SECRET_ACCESS_KEY",
+        src_bucket,
+        endpoint_url=endpoint_url,
+    )
+    trg = S3BucketConnector(
+        "AWS_ACCESS_KEY_ID",
+        "AWS_SECRET_ACCESS_KEY",
+        trg_bucket,
+        endpoint_url=endpoint_url,
+    )
+    worker = ShardWorker(
+        ShardPlan(src),
+        LeaseStore(src, lease_seconds=30, owner=owner),
+        ETLExecutor(src, trg),
+        heartbeat_seconds=1,
+        poll_seconds=0.2,
+    )
+    return worker.run()
+
+
+@unittest.skipIf(ThreadedMotoServer is None, "requires moto server mode")
+class TestShardedRunMethods(unittest.TestCase):
+    """
+    Testing the ShardPlan and ShardWorker classes with several worker
+    processes against moto in server mode, the in process mock is not
+    shared between processes
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Starting the moto server
+        """
+        cls.server = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+        cls.server.start()
+        host, port = cls.server._server.server_address
+        cls.s3_endpoint_url = f"http://{host}:{port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Stopping the moto server
+        """
+        cls.server.stop()
+
+    def setUp(self):
+        """
+        Setting up the environment
+        """
+        # Defining the class arguments
+        self.s3_access_key = "AWS_ACCESS_KEY_ID"
+        self.s3_secret_key = "AWS_SECRET_ACCESS_KEY"
+        self.s3_src_bucket_name = "test-src-bucket"
+        self.s3_trg_bucket_name = "test-trg-bucket"
+        # Creating s3 access keys as environment variables, inherited by workers
+        os.environ[self.s3_access_key] = "KEY1"
+        os.environ[self.s3_secret_key] = "KEY2"
+        os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+        # Creating the buckets on the moto server
+        self.s3 = boto3.resource(service_name="s3", endpoint_url=self.s3_endpoint_url)
+        for bucket in [self.s3_src_bucket_name, self.s3_trg_bucket_name]:
+            self.s3.create_bucket(Bucket=bucket)
+        self.src_bucket = self.s3.Bucket(self.s3_src_bucket_name)
+        self.trg_bucket = self.s3.Bucket(self.s3_trg_bucket_name)
+        # Creating testing instance
+        self.s3_bucket_src = S3BucketConnector(
+            self.s3_access_key,
+            self.s3_secret_key,
+            self.s3_src_bucket_name,
+            endpoint_url=self.s3_endpoint_url,
+        )
+
+    def tearDown(self):
+        """
+        Executing after unittests
+        """
+        # emptying the moto server
+        for bucket in [self.src_bucket, self.trg_bucket]:
+            bucket.objects.all().delete()
+            bucket.delete()
+
+    def test_split_into_date_range_shards(self):
+        """
+        Tests the dates are split into shards of consecutive dates
+        """
+        # Method execution
+        shards = ShardPlan.split(["2023-03-20", "2023-03-18", "2023-03-19"], 2)
+
+        # Tests after method execution
+        self.assertEqual(
+            shards,
+            {
+                "2023-03-18_2023-03-19": ["2023-03-18", "2023-03-19"],
+                "2023-03-20_2023-03-20": ["2023-03-20"],
+            },
+        )
+        with self.assertRaises(ValueError):
+            ShardPlan.split(["2023-03-18"], 0)
+
+    def test_workers_process_every_shard_once_leased(self):
+        """
+        Tests several worker processes share the shards, take over the shard
+        of a crashed worker once its lease expires and commit every date
+        """
+        # Test init
+        days = [f"2023-03-{day}" for day in range(10, 16)]
+        for day in days:
+            self.src_bucket.put_object(
+                Body=f"HomeTeam,FTHG\nArsenal,{day[-1]}", Key=f"football-{day}/a.csv"
+            )
+        plan = ShardPlan(self.s3_bucket_src)
+        shards = plan.publish(days, 2)
+        # lease of a worker that crashed without releasing it
+        self.src_bucket.put_object(
+            Body=json.dumps({"owner": "crashed", "expires_at": time.time() - 1}),
+            Key="leases/locks/2023-03-10_2023-03-11.json",
+        )
+
+        # Method execution
+        with ProcessPoolExecutor(
+            max_workers=3, mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            futures = [
+                pool.submit(
+                    run_worker,
+                    self.s3_endpoint_url,
+                    self.s3_src_bucket_name,
+                    self.s3_trg_bucket_name,
+                    f"worker-{number}",
+                )
+                for number in range(3)
+            ]
+            results = {}
+            for future in futures:
+                results.update(future.result())
+
+        # Tests after method execution
+        outputs = sorted(obj.key for obj in self.trg_bucket.objects.all())
+        done = [
+            json.loads(
+                self.src_bucket.Object(key=plan.done_key(name)).get()["Body"].read()
+            )
+            for name in shards
+        ]
+        self.assertEqual(results, {day: True for day in days})
+        self.assertEqual(outputs, [f"data/processed-data-{day}.csv" for day in days])
+        self.assertEqual(MetaStore(self.s3_bucket_src).pending(days), [])
+        self.assertEqual(plan.pending(), [])
+        self.assertTrue(all(marker["owner"].startswith("worker-") for marker in done))
+        self.assertEqual(
+            [key.key for key in self.src_bucket.objects.filter(Prefix="leases/locks/")],
+            [],
+        )
+
+    def test_aggregates_lease_renewed_while_merging(self):
+        """
+        Tests the aggregates lease is renewed by heartbeats during a merge
+        lasting longer than the lease and released afterwards
+        """
+        # Test init
+        day = "2023-03-10"
+        self.src_bucket.put_object(
+            Body="HomeTeam,FTHG\nArsenal,1", Key=f"football-{day}/a.csv"
+        )
+        trg = S3BucketConnector(
+            self.s3_access_key,
+            self.s3_secret_key,
+            self.s3_trg_bucket_name,
+            endpoint_url=self.s3_endpoint_url,
+        )
+        plan = ShardPlan(self.s3_bucket_src)
+        plan.publish([day], 1)
+        leases = LeaseStore(self.s3_bucket_src, lease_seconds=1, owner="worker-0")
+        held = []
+
+        class SlowAggregates:
+            def merge(self, days):
+                time.sleep(2)
+                lease, _ = leases.holder("aggregates")
+                held.append(lease is not None and not leases.expired(lease))
+
+        # Method execution
+        results = ShardWorker(
+            plan,
+            leases,
+            ETLExecutor(self.s3_bucket_src, trg),
+            aggregates=SlowAggregates(),
+            heartbeat_seconds=0.2,
+            poll_seconds=0.2,
+        ).run()
+
+        # Tests after method execution
+        self.assertEqual(results, {day: True})
+        self.assertEqual(held, [True])
+        self.assertEqual(leases.holder("aggregates"), (None, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
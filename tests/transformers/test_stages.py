@@ -0,0 +1,113 @@
+"""TestTransformPipelineMethods"""
+import unittest
+
+import pandas as pd
+
+from epl.common.metrics import Metrics
+from epl.transfomers.stages import (FusedCastStage, FusedFilterStage,
+                                    RenameStage, TransformPipeline)
+
+
+class TestTransformPipelineMethods(unittest.TestCase):
+    """
+    Testing the TransformPipeline class
+    """
+
+    def setUp(self):
+        """
+        Setting up the environment
+        """
+        self.df = pd.DataFrame(
+            {
+                "HomeTeam": ["Arsenal", "Chelsea", "Chelsea", "Everton"],
+                "FTHG": [2, 1, 1, 0],
+                "FTAG": [0, 1, 1, 3],
+            }
+        )
+
+    def test_default_pipeline_adds_is_processed(self):
+        """
+        Tests the default stages add the Is processed column
+        """
+        # Method execution
+        df = TransformPipeline.from_config().run(self.df)
+
+        # Tests after method execution
+        self.assertEqual(df["Is processed"].tolist(), [True] * 4)
+
+    def test_configured_stages_are_fused_and_timed(self):
+        """
+        Tests every stage type and that consecutive casts and filters run as one
+        """
+        # Test init
+        pipeline = TransformPipeline.from_config(
+            [
+                {"type": "cast", "columns": {"FTHG": "int16"}},
+                {"type": "cast", "columns": {"FTAG": "int16"}},
+                {"type": "derive", "column": "Goals", "expr": "FTHG + FTAG"},
+                {"type": "filter", "name": "scored", "expr": "Goals > 0"},
+                {
+                    "type": "filter",
+                    "name": "not_arsenal",
+                    "expr": "HomeTeam != 'Arsenal'",
+                },
+                {"type": "dedup", "subset": ["HomeTeam"]},
+                {"type": "rename", "columns": {"HomeTeam": "Team"}},
+            ]
+        )
+        metrics = Metrics()
+
+        # Method execution
+        df = pipeline.run(self.df, metrics)
+
+        # Tests after method execution
+        self.assertEqual(len(pipeline.steps), 5)
+        self.assertIsInstance(pipeline.steps[0], FusedCastStage)
+        self.assertIsInstance(pipeline.steps[2], FusedFilterStage)
+        self.assertIsInstance(pipeline.steps[4], RenameStage)
+        self.assertEqual(df["Team"].tolist(), ["Chelsea", "Everton"])
+        self.assertEqual(df["Goals"].tolist(), [2, 3])
+        self.assertEqual(str(df["FTHG"].dtype), "int16")
+        self.assertEqual(
+            sorted(metrics.snapshot()["stages"]),
+            [
+                "transform.cast_0+cast_1",
+                "transform.dedup_5",
+                "transform.derive_2",
+                "transform.rename_6",
+                "transform.scored+not_arsenal",
+            ],
+        )
+
+    def test_compact_stage_counts_memory_saved(self):
+        """
+        Tests the compact stage converts columns, records the bytes saved and
+        needs the whole date
+        """
+        # Test init
+        pipeline = TransformPipeline.from_config(
+            [{"type": "compact", "name": "compact_dtypes"}]
+        )
+        metrics = Metrics()
+
+        # Method execution
+        df = pipeline.run(self.df, metrics)
+
+        # Tests after method execution
+        self.assertEqual(str(df["FTHG"].dtype), "int8")
+        self.assertEqual(df["HomeTeam"].tolist(), self.df["HomeTeam"].tolist())
+        self.assertGreater(metrics.snapshot()["counters"]["memory_saved_bytes"], 0)
+        # dtypes depend on every row, so files are not compacted one at a time
+        self.assertFalse(pipeline.row_local)
+
+    def test_unknown_stage_type(self):
+        """
+        Tests an unknown stage type is rejected
+        """
+        # Tests after method execution
+        with self.assertRaises(ValueError):
+            TransformPipeline.from_config([{"type": "pivot"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,296 @@
+"""TestValidationMethods"""
+import json
+import os
+import unittest
+
+import boto3
+import pandas as pd
+from moto import mock_s3
+
+from epl.common.s3 import S3BucketConnector
+from epl.transfomers.compaction import Compactor
+from epl.transfomers.epl_transformer import ETLExecutor
+from epl.transfomers.validation import QualityGate, SchemaContract
+
+HEADER = "Date,HomeTeam,AwayTeam,FTHG,FTAG,FTR"
+
+
+class TestValidationMethods(unittest.TestCase):
+    """
+    Testing the SchemaContract and QualityGate classes
+    """
+
+    def setUp(self):
+        """
+        Setting up the environment
+        """
+        # mocking s3 connection start
+        self.mock_s3 = mock_s3()
+        self.mock_s3.start()
+        # Defining the class arguments
+        self.s3_access_key = "AWS_ACCESS_KEY_ID"
+        self.s3_secret_key = "AWS_SECRET_ACCESS_KEY"
+        self.s3_endpoint_url = "https://s3.eu-central-1.amazonaws.com"
+        self.s3_src_bucket_name = "test-src-bucket"
+        self.s3_trg_bucket_name = "test-trg-bucket"
+        # Creating s3 access keys as environment variables
+        os.environ[self.s3_access_key] = "KEY1"
+        os.environ[self.s3_secret_key] = "KEY2"
+        # Creating the buckets on the mocked s3
+        self.s3 = boto3.resource(service_name="s3", endpoint_url=self.s3_endpoint_url)
+        for bucket in [self.s3_src_bucket_name, self.s3_trg_bucket_name]:
+            self.s3.create_bucket(
+                Bucket=bucket,
+                CreateBucketConfiguration={"LocationConstraint": "eu-central-1"},
+            )
+        self.src_bucket = self.s3.Bucket(self.s3_src_bucket_name)
+        self.trg_bucket = self.s3.Bucket(self.s3_trg_bucket_name)
+        # Creating testing instances
+        self.schema = {"FTHG": "int64", "FTAG": "int64", "FTR": "string"}
+        self.s3_bucket_src = S3BucketConnector(
+            self.s3_access_key,
+            self.s3_secret_key,
+            self.s3_src_bucket_name,
+            schema=self.schema,
+        )
+        self.s3_bucket_trg = S3BucketConnector(
+            self.s3_access_key, self.s3_secret_key, self.s3_trg_bucket_name
+        )
+        self.contract = SchemaContract.from_config(
+            {
+                "required_columns": ["HomeTeam", "AwayTeam", "FTHG", "FTAG", "FTR"],
+                "max_null_ratio": {"HomeTeam": 0.0},
+                "ranges": {"FTHG": [0, None], "FTAG": [0, None]},
+                "values": {"FTR": ["H", "D", "A"]},
+                "unique": ["Date", "HomeTeam", "AwayTeam"],
+            },
+            self.schema,
+        )
+
+    def tearDown(self):
+        """
+        Executing after unittests
+        """
+        # mocking s3 connection stop
+        self.mock_s3.stop()
+
+    def test_check_reports_every_failed_check(self):
+        """
+        Tests each check of the contract on a file breaking all of them
+        """
+        # Test init
+        df = pd.DataFrame(
+            {
+                "Date": ["d1", "d1", "d2"],
+                "HomeTeam": ["Arsenal", "Arsenal", None],
+                "FTHG": [1, -1, 2],
+                "FTAG": ["0", "1", "2"],
+                "FTR": ["H", "X", None],
+            }
+        )
+
+        # Method execution
+        failures = self.contract.check(df)
+        passed = self.contract.check(
+            pd.DataFrame(
+                {
+                    "Date": ["d1"],
+                    "HomeTeam": ["Arsenal"],
+                    "AwayTeam": ["Chelsea"],
+                    "FTHG": [1],
+                    "FTAG": [0],
+                    "FTR": ["H"],
+                }
+            )
+        )
+
+        # Tests after method execution
+        self.assertEqual(
+            [(failure["check"], failure["column"]) for failure in failures],
+            [
+                ("missing_column", "AwayTeam"),
+                ("dtype", "FTAG"),
+                ("null_ratio", "HomeTeam"),
+                ("range", "FTHG"),
+                ("values", "FTR"),
+            ],
+        )
+        self.assertEqual(passed, [])
+
+    def test_gate_quarantines_failing_files(self):
+        """
+        Tests files failing to parse or failing a check are quarantined and
+        left out of the output of the date, also with a chunksize
+        """
+        # Test init
+        self.src_bucket.put_object(Key="football-2023-03-18/")
+        for name, row in [
+            ("good", "d1,Arsenal,Chelsea,1,0,H"),
+            ("values", "d1,Leeds,Fulham,1,0,X"),
+            ("parse", "d1,Spurs,Everton,one,0,H"),
+        ]:
+            self.src_bucket.put_object(
+                Body=f"{HEADER}\n{row}", Key=f"football-2023-03-18/{name}.csv"
+            )
+        gate = QualityGate(self.s3_bucket_src, self.s3_bucket_trg, self.contract)
+
+        # a chunksize is not used, the files are checked as a whole
+        for chunksize in [None, 1]:
+            # Method execution
+            ETLExecutor(
+                self.s3_bucket_src,
+                self.s3_bucket_trg,
+                chunksize=chunksize,
+                quality_gate=gate,
+            ).transform("2023-03-18")
+
+            # Tests after method execution
+            df = pd.read_csv(
+                self.trg_bucket.Object(key="data/processed-data-2023-03-18.csv")
+                .get()
+                .get("Body")
+            )
+            report = json.loads(
+                self.trg_bucket.Object(key="validation/date=2023-03-18.json")
+                .get()
+                .get("Body")
+                .read()
+            )
+            quarantined = sorted(
+                obj.key for obj in self.trg_bucket.objects.filter(Prefix="quarantine/")
+            )
+            self.assertEqual(df["HomeTeam"].tolist(), ["Arsenal"])
+            self.assertEqual(
+                (report["files"], report["passed"], report["rows"]), (3, 1, 1)
+            )
+            self.assertEqual(
+                {
+                    key: failures[0]["check"]
+                    for key, failures in report["quarantined"].items()
+                },
+                {
+                    "football-2023-03-18/parse.csv": "parse",
+                    "football-2023-03-18/values.csv": "values",
+                },
+            )
+            self.assertEqual(
+                quarantined,
+                [
+                    "quarantine/date=2023-03-18/parse.csv",
+                    "quarantine/date=2023-03-18/parse.csv.errors.json",
+                    "quarantine/date=2023-03-18/values.csv",
+                    "quarantine/date=2023-03-18/values.csv.errors.json",
+                ],
+            )
+
+    def test_compaction_checks_files_and_compacted_rows(self):
+        """
+        Tests compaction leaves out failing files and a compacted date is
+        checked row by row, so a failing row is quarantined on its own
+        """
+        # Test init
+        self.src_bucket.put_object(Key="football-2023-03-18/")
+        for name, row in [
+            ("good", "d1,Arsenal,Chelsea,1,0,H"),
+            ("second", "d1,Leeds,Fulham,1,0,D"),
+            ("values", "d1,Spurs,Everton,1,0,X"),
+        ]:
+            self.src_bucket.put_object(
+                Body=f"{HEADER}\n{row}", Key=f"football-2023-03-18/{name}.csv"
+            )
+        gate = QualityGate(self.s3_bucket_src, self.s3_bucket_trg, self.contract)
+        checked = Compactor(self.s3_bucket_src, quality_gate=gate)
+        unchecked = Compactor(self.s3_bucket_src, prefix="unchecked")
+
+        # Method execution
+        checked.compact_source("2023-03-18")
+        manifest = self.s3_bucket_src.read_manifest("compacted/date=2023-03-18")
+        unchecked.compact_source("2023-03-18")
+        ETLExecutor(
+            self.s3_bucket_src,
+            self.s3_bucket_trg,
+            compactor=unchecked,
+            quality_gate=gate,
+        ).transform("2023-03-18")
+
+        # Tests after method execution
+        df = pd.read_csv(
+            self.trg_bucket.Object(key="data/processed-data-2023-03-18.csv")
+            .get()
+            .get("Body")
+        )
+        report = json.loads(
+            self.trg_bucket.Object(key="validation/date=2023-03-18.json")
+            .get()
+            .get("Body")
+            .read()
+        )
+        quarantined = self.trg_bucket.objects.filter(Prefix="quarantine/")
+        self.assertEqual(manifest["rows"], 2)
+        self.assertEqual(
+            list(manifest["validation"]["quarantined"]),
+            ["football-2023-03-18/values.csv"],
+        )
+        self.assertEqual(df["HomeTeam"].tolist(), ["Arsenal", "Leeds"])
+        self.assertEqual((report["files"], report["passed"], report["rows"]), (1, 1, 2))
+        self.assertEqual(
+            [
+                failure["check"]
+                for failures in report["quarantined"].values()
+                for failure in failures
+            ],
+            ["values"],
+        )
+        # the rows are named after the compacted file, part-<run id>-0.parquet
+        self.assertRegex(
+            " ".join(sorted(obj.key for obj in quarantined)),
+            r"^quarantine/date=2023-03-18/rows-part-\w+-0\.csv "
+            r"quarantine/date=2023-03-18/rows-part-\w+-0\.csv\.errors\.json "
+            r"quarantine/date=2023-03-18/values\.csv "
+            r"quarantine/date=2023-03-18/values\.csv\.errors\.json$",
+        )
+
+    def test_compacted_read_reports_files_quarantined_by_compaction(self):
+        """
+        Tests a date read from compacted files built without a failing file
+        reports that file in the report of the run
+        """
+        # Test init
+        self.src_bucket.put_object(Key="football-2023-03-18/")
+        for name, row in [
+            ("good", "d1,Arsenal,Chelsea,1,0,H"),
+            ("second", "d1,Leeds,Fulham,1,0,D"),
+            ("values", "d1,Spurs,Everton,1,0,X"),
+        ]:
+            self.src_bucket.put_object(
+                Body=f"{HEADER}\n{row}", Key=f"football-2023-03-18/{name}.csv"
+            )
+        gate = QualityGate(self.s3_bucket_src, self.s3_bucket_trg, self.contract)
+        compactor = Compactor(self.s3_bucket_src, quality_gate=gate)
+        compactor.compact_source("2023-03-18")
+
+        # Method execution
+        with self.assertLogs("epl.transfomers.epl_transformer", "WARNING") as logs:
+            ETLExecutor(
+                self.s3_bucket_src,
+                self.s3_bucket_trg,
+                compactor=compactor,
+                quality_gate=gate,
+            ).transform("2023-03-18")
+
+        # Tests after method execution
+        report = json.loads(
+            self.trg_bucket.Object(key="validation/date=2023-03-18.json")
+            .get()
+            .get("Body")
+            .read()
+        )
+        self.assertEqual((report["files"], report["passed"], report["rows"]), (2, 1, 2))
+        self.assertEqual(
+            list(report["quarantined"]), ["football-2023-03-18/values.csv"]
+        )
+        self.assertIn("football-2023-03-18/values.csv", logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()